@@ -1,18 +1,36 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import Response
 
-from app.services.co2_service import get_co2_points_from_db, render_trend_svg
+from app.services.co2_service import TREND_RANGES, get_trend_svg, list_co2_aggregates
 
 router = APIRouter()
 
 
 @router.get("/api/co2/trend.svg")
-def co2_trend_svg() -> Response:
-    points = get_co2_points_from_db()
-    svg = render_trend_svg(points)
-    return Response(
-        content=svg,
-        media_type="image/svg+xml",
-        headers={"Cache-Control": "no-store"},
-    )
+def co2_trend_svg(request: Request, days: int = 7) -> Response:
+    if days not in TREND_RANGES:
+        raise HTTPException(status_code=400, detail=f"days must be one of {', '.join(map(str, TREND_RANGES))}")
+    trend = get_trend_svg(days)
+    use_gzip = "gzip" in (request.headers.get("accept-encoding") or "").lower()
+    etag = trend.etag_gz if use_gzip else trend.etag
+    headers = {
+        "Cache-Control": "public, max-age=300",
+        "ETag": etag,
+        "Vary": "Accept-Encoding",
+    }
+    inm = request.headers.get("if-none-match") or ""
+    if inm:
+        tags = {t.strip() for t in inm.split(",")}
+        if "*" in tags or trend.etag in tags or trend.etag_gz in tags:
+            return Response(status_code=304, headers=headers)
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=trend.svg_gz, media_type="image/svg+xml", headers=headers)
+    return Response(content=trend.svg, media_type="image/svg+xml", headers=headers)
 
+
+@router.get("/api/co2/aggregates")
+def co2_aggregates(period: str = "month", limit: int = 120) -> dict:
+    if period not in {"month", "year"}:
+        raise HTTPException(status_code=400, detail="period must be month or year")
+    return {"period": period, "rows": list_co2_aggregates(period=period, limit=min(int(limit), 1200))}
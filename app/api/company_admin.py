@@ -7,9 +7,10 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.middleware.admin_auth import admin_auth
 from app.models.company_carbon import Company, CompanyEmission, CompanyOffset
+from app.services import company_carbon_service
 
 
 router = APIRouter(tags=["company"], prefix="/api/admin")
@@ -45,7 +46,7 @@ class OffsetCreate(BaseModel):
 def list_companies(
     request: Request,
     limit: int = 200,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     _auth: None = Depends(admin_auth),
 ):
     rows = db.query(Company).order_by(Company.id.desc()).limit(int(limit)).all()
@@ -83,7 +84,7 @@ def create_company(
 def list_emissions(
     company_id: Optional[int] = None,
     limit: int = 200,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     _auth: None = Depends(admin_auth),
 ):
     q = db.query(CompanyEmission)
@@ -129,6 +130,8 @@ def create_emission(
         note=data.note,
     )
     db.add(r)
+    db.flush()
+    company_carbon_service.apply_emission(db, r)
     db.commit()
     db.refresh(r)
     return {"ok": True, "id": r.id}
@@ -138,7 +141,7 @@ def create_emission(
 def list_offsets(
     company_id: Optional[int] = None,
     limit: int = 200,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     _auth: None = Depends(admin_auth),
 ):
     q = db.query(CompanyOffset)
@@ -184,7 +187,80 @@ def create_offset(
         note=data.note,
     )
     db.add(r)
+    db.flush()
+    company_carbon_service.apply_offset(db, r)
     db.commit()
     db.refresh(r)
     return {"ok": True, "id": r.id}
 
+
+def _scopes_or_400(scopes: Optional[str]) -> tuple[int, ...]:
+    try:
+        return company_carbon_service.parse_scopes(scopes)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="scopes must be a subset of 1,2,3")
+
+
+def _range_or_400(start: Optional[date], end: Optional[date]) -> None:
+    if start and end and end < start:
+        raise HTTPException(status_code=400, detail="end must be >= start")
+
+
+@router.get("/carbon/summary")
+def carbon_summary(
+    company_id: Optional[int] = None,
+    granularity: str = "quarter",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    scopes: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    _auth: None = Depends(admin_auth),
+):
+    """按月 / 季 / 年 / 总计的 gross（所选 scope 之和）、offsets、net；不传 company_id 为所有企业合计。"""
+    if granularity not in company_carbon_service.GRANULARITIES:
+        raise HTTPException(status_code=400, detail="granularity must be month, quarter, year or total")
+    _range_or_400(start, end)
+    return company_carbon_service.carbon_periods(
+        db,
+        company_id=company_id,
+        granularity=granularity,
+        start=start,
+        end=end,
+        scopes=_scopes_or_400(scopes),
+    )
+
+
+@router.get("/carbon/companies")
+def carbon_by_company(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    scopes: Optional[str] = None,
+    order: str = "net",
+    limit: int = 100,
+    db: Session = Depends(get_read_db),
+    _auth: None = Depends(admin_auth),
+):
+    """时间范围内各企业合计，按 net / gross / offsets 倒序。"""
+    if order not in ("net", "gross", "offsets"):
+        raise HTTPException(status_code=400, detail="order must be net, gross or offsets")
+    _range_or_400(start, end)
+    rows = company_carbon_service.carbon_by_company(
+        db,
+        start=start,
+        end=end,
+        scopes=_scopes_or_400(scopes),
+        order=order,
+        limit=max(1, min(int(limit), 1000)),
+    )
+    return {"companies": rows}
+
+
+@router.post("/carbon/rollups/rebuild")
+def rebuild_carbon_rollups(
+    company_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    _auth: None = Depends(admin_auth),
+):
+    rows = company_carbon_service.rebuild_company_rollups(db, company_id=company_id)
+    return {"ok": True, "rows": rows}
+
@@ -1,7 +1,14 @@
 from fastapi import APIRouter
 
+from app.core.database import pool_status
+
 router = APIRouter()
 
 @router.get("/health")
 def health():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+
+@router.get("/health/db")
+def health_db():
+    return {"status": "ok", "pools": pool_status()}
\ No newline at end of file
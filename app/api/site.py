@@ -2,8 +2,6 @@
 import json
 import os
 import ipaddress
-from functools import lru_cache
-from pathlib import Path
 from urllib.parse import parse_qs
 from urllib.parse import urlparse
 
@@ -12,8 +10,8 @@ from fastapi.responses import HTMLResponse, Response, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv
-import httpx
 
+from app.core.static_assets import asset_url
 from site_i18n import TEXTS, detect_lang
 from gs_db import get_db as get_behavior_db
 from app.services.news_service import list_latest_news
@@ -35,6 +33,8 @@ templates.env.globals["GS_HOME_PROFILE_UI_IMAGE_URL"] = (os.getenv("GS_HOME_PROF
 templates.env.globals["GS_HOME_PIONEER_UI_IMAGE_URL"] = (os.getenv("GS_HOME_PIONEER_UI_IMAGE_URL") or "/static/ui/pioneer_ui.svg").strip()
 templates.env.globals["GS_HOME_ROADMAP_UI_IMAGE_URL"] = (os.getenv("GS_HOME_ROADMAP_UI_IMAGE_URL") or "/static/ui/roadmap_ui.svg").strip()
 templates.env.globals["GS_HOME_NEWS_UI_IMAGE_URL"] = (os.getenv("GS_HOME_NEWS_UI_IMAGE_URL") or "/static/ui/news_ui.svg").strip()
+# 静态资源地址（构建后的哈希文件名，见 app/core/static_assets.py）
+templates.env.globals["asset_url"] = asset_url
 
 site_router = APIRouter()
 
@@ -79,6 +79,8 @@ async def image_proxy(u: str = Query(..., min_length=8, max_length=2000)):
     host = parsed.hostname or ""
     if not _host_allowed(host):
         return Response(status_code=403, content="Host not allowed")
+    import httpx  # 只有图片代理用，启动时不导入
+
     async with httpx.AsyncClient(follow_redirects=True, timeout=8.0) as client:
         r = await client.get(u, headers={"User-Agent": "GreenSphere/1.0"})
     ct = (r.headers.get("content-type") or "").split(";")[0].strip().lower()
@@ -86,17 +88,6 @@ async def image_proxy(u: str = Query(..., min_length=8, max_length=2000)):
         return Response(status_code=404, content="Not an image")
     return Response(content=r.content, media_type=ct, headers={"Cache-Control": "public, max-age=86400"})
 
-@lru_cache(maxsize=1)
-def _asset_version() -> str:
-    override = (os.getenv("GS_ASSET_VERSION") or "").strip()
-    if override:
-        return override
-    try:
-        return str(int(Path("static/style_home.css").stat().st_mtime))
-    except Exception:
-        return "1"
-
-
 def _external_base_url(request: Request) -> str:
     override = (os.getenv("GS_PUBLIC_BASE_URL") or "").strip().rstrip("/")
     if override:
@@ -226,7 +217,6 @@ async def home(request: Request, lang: str | None = Query(default=None)):
             "seo": seo,
             "alternates": alternates,
             "news_items": news_items,
-            "asset_version": _asset_version(),
         },
     )
 
@@ -1,19 +1,18 @@
 from __future__ import annotations
 
-import csv
-from datetime import date, datetime
-from io import StringIO
+from datetime import date, datetime, timedelta
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, EmailStr, Field
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.models.waitlist import WaitlistSubscriber
+from app.services import export_service
 from app.services.monitor_service import notify_monitor
-from app.services.rate_limit_service import is_rate_limited, record_action
+from app.services.rate_limit_service import allow_action
 
 
 router = APIRouter(tags=["waitlist"])
@@ -42,11 +41,9 @@ def join_waitlist(
     client_ip = request.client.host if request.client else "unknown"
     action = "waitlist_submit"
 
-    if is_rate_limited(db, client_ip, action):
+    if not allow_action(client_ip, action):
         raise HTTPException(status_code=429, detail="Too many requests")
 
-    record_action(db, client_ip, action)
-
     existing = db.query(WaitlistSubscriber).filter_by(email=str(data.email)).first()
     if existing:
         return {"success": False, "message": "This email is already on the waitlist"}
@@ -77,7 +74,7 @@ def join_waitlist(
 
 
 @router.get("/waitlist")
-def list_waitlist(db: Session = Depends(get_db)):
+def list_waitlist(db: Session = Depends(get_read_db)):
     rows = (
         db.query(WaitlistSubscriber)
         .order_by(WaitlistSubscriber.created_at.desc())
@@ -99,7 +96,7 @@ def list_waitlist(db: Session = Depends(get_db)):
 
 
 @router.get("/waitlist/stats")
-def waitlist_stats(db: Session = Depends(get_db)):
+def waitlist_stats(db: Session = Depends(get_read_db)):
     total = db.query(WaitlistSubscriber).count()
     today = db.query(WaitlistSubscriber).filter(
         WaitlistSubscriber.created_at >= datetime.combine(date.today(), datetime.min.time())
@@ -109,18 +106,35 @@ def waitlist_stats(db: Session = Depends(get_db)):
 
 
 @router.get("/waitlist/export")
-def export_waitlist(db: Session = Depends(get_db)):
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["Email", "Region", "Role", "Phone", "Telegram", "Source", "Created At"])
-
-    rows = db.query(WaitlistSubscriber).order_by(WaitlistSubscriber.created_at.desc()).all()
-    for r in rows:
-        writer.writerow([r.email, r.region, r.role, r.phone, r.telegram, r.source, r.created_at])
-
-    output.seek(0)
-    return StreamingResponse(
-        output,
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=waitlist.csv"},
+def export_waitlist(
+    format: str = "csv",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    gzip: bool = False,
+):
+    """Stream the waitlist as CSV / NDJSON (optionally gzipped), filtered by created_at date."""
+    start_d, end_d = export_service.parse_date_range(start, end)
+
+    def make_stmt():
+        stmt = select(
+            WaitlistSubscriber.email,
+            WaitlistSubscriber.region,
+            WaitlistSubscriber.role,
+            WaitlistSubscriber.phone,
+            WaitlistSubscriber.telegram,
+            WaitlistSubscriber.source,
+            WaitlistSubscriber.created_at,
+        ).order_by(WaitlistSubscriber.created_at.desc())
+        if start_d:
+            stmt = stmt.where(WaitlistSubscriber.created_at >= datetime.combine(start_d, datetime.min.time()))
+        if end_d:
+            stmt = stmt.where(WaitlistSubscriber.created_at < datetime.combine(end_d + timedelta(days=1), datetime.min.time()))
+        return stmt
+
+    return export_service.export_response(
+        ["Email", "Region", "Role", "Phone", "Telegram", "Source", "Created At"],
+        export_service.iter_orm_rows(make_stmt),
+        fmt=format,
+        filename="waitlist",
+        gzip=gzip,
     )
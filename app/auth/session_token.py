@@ -0,0 +1,92 @@
+import base64, hashlib, hmac, json, os, time
+from fastapi import HTTPException
+
+# WebApp 会话令牌：init_user 验过 initData 后签发，之后每个请求只带 X-GS-Session，
+# 服务端做一次 HMAC 即可，不再解析 / 校验整段 initData。
+# 格式与后台管理会话相同：base64url(payload).base64url(hmac_sha256(payload))。
+
+
+def b64url_encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def b64url_decode(s: str) -> bytes:
+    pad = "=" * (-len(s) % 4)
+    return base64.urlsafe_b64decode((s + pad).encode("ascii"))
+
+
+def sign_token(secret: bytes, payload: dict) -> str:
+    payload_b64 = b64url_encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    sig = hmac.new(secret, payload_b64.encode("ascii"), hashlib.sha256).digest()
+    return f"{payload_b64}.{b64url_encode(sig)}"
+
+
+def read_token(secret: bytes, token: str) -> dict | None:
+    """签名正确且未过期时返回 payload，否则 None。"""
+    try:
+        payload_b64, sig_b64 = (token or "").split(".", 1)
+        expected = hmac.new(secret, payload_b64.encode("ascii"), hashlib.sha256).digest()
+    except (ValueError, UnicodeEncodeError):
+        return None
+    # 比较 bytes：compare_digest 遇到非 ASCII 的 str 会抛 TypeError
+    if not hmac.compare_digest(b64url_encode(expected).encode("ascii"), sig_b64.encode("utf-8", "surrogateescape")):
+        return None
+    try:
+        payload = json.loads(b64url_decode(payload_b64).decode("utf-8"))
+        exp = int(payload.get("exp") or 0)
+    except Exception:
+        return None
+    if exp <= int(time.time()):
+        return None
+    return payload
+
+
+def _session_secret() -> bytes | None:
+    raw = (os.getenv("GS_SESSION_SECRET") or "").strip()
+    if raw:
+        return raw.encode("utf-8")
+    # 没单独配置时从 bot token 派生，多 worker 之间一致
+    from app.auth.telegram_webapp import _get_bot_tokens
+
+    tokens = _get_bot_tokens()
+    if not tokens:
+        return None
+    return hmac.new(b"GreenSphereSession", "\n".join(tokens).encode("utf-8"), hashlib.sha256).digest()
+
+
+def session_ttl_seconds() -> int:
+    try:
+        return max(60, int((os.getenv("GS_SESSION_TTL_SECONDS") or "").strip() or 3600))
+    except ValueError:
+        return 3600
+
+
+_secret: bytes | None = None
+_secret_loaded = False
+
+
+def _get_secret() -> bytes | None:
+    global _secret, _secret_loaded
+    if not _secret_loaded:
+        _secret = _session_secret()
+        _secret_loaded = True
+    return _secret
+
+
+def make_session_token(user_id: int, lang: str | None = None, ttl_seconds: int | None = None) -> str | None:
+    """没有可用密钥（未配置 GS_SESSION_SECRET 也没有 bot token）时返回 None。"""
+    secret = _get_secret()
+    if secret is None:
+        return None
+    payload = {"u": int(user_id), "exp": int(time.time()) + int(ttl_seconds or session_ttl_seconds())}
+    if lang:
+        payload["l"] = lang
+    return sign_token(secret, payload)
+
+
+def verify_session_token(token: str) -> dict:
+    secret = _get_secret()
+    payload = read_token(secret, token) if secret is not None else None
+    if payload is None or "u" not in payload:
+        raise HTTPException(status_code=401, detail="Invalid or expired X-GS-Session")
+    return {"telegram_id": int(payload["u"]), "lang": payload.get("l")}
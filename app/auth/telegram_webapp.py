@@ -1,4 +1,5 @@
-import os, hmac, hashlib, urllib.parse
+import os, hmac, hashlib, json, threading, time, urllib.parse
+from collections import OrderedDict
 from fastapi import HTTPException
 
 def _get_bot_tokens() -> list[str]:
@@ -39,7 +40,51 @@ def _get_initdata_max_age_seconds() -> int:
     except Exception:
         return 0
 
-def verify_init_data(init_data: str, bot_token: str) -> dict:
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int((os.getenv(name) or "").strip() or default)
+    except ValueError:
+        return default
+
+
+def _derive_secret_key(bot_token: str) -> bytes:
+    return hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+
+
+# 各 bot token 派生出的 secret_key 只算一次（load_dotenv 之后第一次用到时，或启动时 warm_up）
+_keys_lock = threading.Lock()
+_secret_keys: list[bytes] | None = None
+_max_age_seconds = 0
+_last_match = 0
+
+# 已验证的 initData：按 hash 字段缓存解析结果，同一会话后续请求不再做 HMAC
+_cache_lock = threading.Lock()
+_verified: OrderedDict[str, tuple[float, str, dict]] = OrderedDict()
+_CACHE_SIZE = _env_int("TG_INITDATA_CACHE_SIZE", 10000)
+_CACHE_TTL_SECONDS = _env_int("TG_INITDATA_CACHE_TTL_SECONDS", 3600)
+
+
+def warm_up() -> int:
+    """读取 bot token 并派生 secret_key；返回可用 token 数。环境变量变化后可再次调用。"""
+    global _secret_keys, _max_age_seconds, _last_match
+    keys = [_derive_secret_key(t) for t in _get_bot_tokens()]
+    with _keys_lock:
+        _secret_keys = keys
+        _max_age_seconds = _get_initdata_max_age_seconds()
+        _last_match = 0
+    with _cache_lock:
+        _verified.clear()
+    return len(keys)
+
+
+def _get_secret_keys() -> list[bytes]:
+    if _secret_keys is None:
+        warm_up()
+    return _secret_keys or []
+
+
+def _split_init_data(init_data: str) -> tuple[dict, str, bytes]:
     init_data = (init_data or "").lstrip("?").strip()
     data = dict(urllib.parse.parse_qsl(init_data, strict_parsing=True))
     if "hash" not in data:
@@ -47,19 +92,18 @@ def verify_init_data(init_data: str, bot_token: str) -> dict:
 
     received_hash = data.pop("hash")
     pairs = [f"{k}={v}" for k, v in sorted(data.items())]
-    data_check_string = "\n".join(pairs)
+    return data, received_hash, "\n".join(pairs).encode()
 
-    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
-    calculated_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
 
-    if not hmac.compare_digest(calculated_hash, received_hash):
-        raise HTTPException(status_code=401, detail="initData signature invalid")
+def _hash_matches(secret_key: bytes, data_check_string: bytes, received_hash: str) -> bool:
+    calculated_hash = hmac.new(secret_key, data_check_string, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(calculated_hash, received_hash)
 
-    max_age = _get_initdata_max_age_seconds()
+
+def _check_age_and_decode(data: dict, max_age: int) -> dict:
     if max_age and "auth_date" in data:
         try:
             auth_date = int(data["auth_date"])
-            import time
             if int(time.time()) - auth_date > max_age:
                 raise HTTPException(status_code=401, detail="initData expired")
         except HTTPException:
@@ -69,7 +113,6 @@ def verify_init_data(init_data: str, bot_token: str) -> dict:
 
     # parse user JSON if present
     if "user" in data:
-        import json
         try:
             data["user"] = json.loads(data["user"])
         except Exception:
@@ -77,29 +120,84 @@ def verify_init_data(init_data: str, bot_token: str) -> dict:
 
     return data
 
-def parse_telegram_user_from_init_data(init_data: str) -> dict:
-    tokens = _get_bot_tokens()
-    if not tokens:
+
+def verify_init_data(init_data: str, bot_token: str) -> dict:
+    data, received_hash, data_check_string = _split_init_data(init_data)
+    if not _hash_matches(_derive_secret_key(bot_token), data_check_string, received_hash):
+        raise HTTPException(status_code=401, detail="initData signature invalid")
+    return _check_age_and_decode(data, _get_initdata_max_age_seconds())
+
+
+def _verify_with_cached_keys(init_data: str) -> tuple[dict, str]:
+    global _last_match
+    keys = _get_secret_keys()
+    if not keys:
         raise HTTPException(status_code=500, detail="Telegram bot token not set")
+    data, received_hash, data_check_string = _split_init_data(init_data)
+    # 上次匹配成功的 token 先试，多 bot 部署时通常一次命中
+    start = _last_match if _last_match < len(keys) else 0
+    for i in list(range(start, len(keys))) + list(range(0, start)):
+        if _hash_matches(keys[i], data_check_string, received_hash):
+            _last_match = i
+            return _check_age_and_decode(data, _max_age_seconds), received_hash
+    raise HTTPException(status_code=401, detail="initData signature invalid")
 
-    payload = None
-    for token in tokens:
+
+def _cache_get(received_hash: str, init_data: str) -> dict | None:
+    now = time.time()
+    with _cache_lock:
+        hit = _verified.get(received_hash)
+        if hit is None:
+            return None
+        expires_at, raw, user = hit
+        if expires_at <= now or raw != init_data:
+            if expires_at <= now:
+                del _verified[received_hash]
+            return None
+        _verified.move_to_end(received_hash)
+        return user
+
+
+def _cache_put(received_hash: str, init_data: str, user: dict, auth_date) -> None:
+    expires_at = time.time() + _CACHE_TTL_SECONDS
+    if _max_age_seconds:
         try:
-            payload = verify_init_data(init_data, token)
-            break
-        except HTTPException as e:
-            if e.status_code == 401 and e.detail == "initData signature invalid":
-                continue
-            raise
-    if payload is None:
-        raise HTTPException(status_code=401, detail="initData signature invalid")
+            expires_at = min(expires_at, int(auth_date) + _max_age_seconds)
+        except (TypeError, ValueError):
+            pass
+    with _cache_lock:
+        _verified[received_hash] = (expires_at, init_data, user)
+        _verified.move_to_end(received_hash)
+        while len(_verified) > _CACHE_SIZE:
+            _verified.popitem(last=False)
+
+
+def _cache_key(init_data: str) -> str:
+    # 只取 hash= 的值做键，不必完整解析；命中后还会比对原串
+    for part in (init_data or "").lstrip("?").strip().split("&"):
+        if part.startswith("hash="):
+            return part[5:]
+    return ""
+
+
+def parse_telegram_user_from_init_data(init_data: str) -> dict:
+    key = _cache_key(init_data)
+    if key and _CACHE_TTL_SECONDS > 0:
+        user = _cache_get(key, init_data)
+        if user is not None:
+            return dict(user)
+
+    payload, received_hash = _verify_with_cached_keys(init_data)
     user = payload.get("user")
     if not isinstance(user, dict) or "id" not in user:
         raise HTTPException(status_code=401, detail="initData missing user.id")
 
-    return {
+    result = {
         "telegram_id": int(user["id"]),
         "username": user.get("username"),
         "first_name": user.get("first_name"),
         "last_name": user.get("last_name"),
     }
+    if key == received_hash and _CACHE_TTL_SECONDS > 0:
+        _cache_put(received_hash, init_data, result, payload.get("auth_date"))
+    return dict(result)
@@ -13,10 +13,15 @@ Examples:
 from __future__ import annotations
 
 import os
+import threading
+import time
+import warnings
 from pathlib import Path
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import Delete, Insert, UniqueConstraint, Update, create_engine, event, inspect, text
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.pool import QueuePool
 
 
 def _default_sqlite_url() -> str:
@@ -26,23 +31,170 @@ def _default_sqlite_url() -> str:
     return f"sqlite:///{(data_dir / 'greensphere.db').as_posix()}"
 
 
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int((os.getenv(name) or "").strip() or default)
+    except ValueError:
+        return default
+
+
 DATABASE_URL = os.getenv("DATABASE_URL") or _default_sqlite_url()
+# 可选只读副本：配置后只读的 GET 接口（get_read_db）从这里查
+DATABASE_READ_URL = (os.getenv("DATABASE_READ_URL") or "").strip()
+
+
+class PoolStats:
+    """连接池计数，由 pool 事件更新；/health/db 输出。"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.wait_ms_max = 0.0
+        self.wait_ms_total = 0.0
+
+    def on_connect(self, *args) -> None:
+        with self._lock:
+            self.connects += 1
+
+    def on_checkout(self, *args) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def on_checkin(self, *args) -> None:
+        with self._lock:
+            self.checkins += 1
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def on_invalidate(self, *args) -> None:
+        with self._lock:
+            self.invalidations += 1
+
+    def on_wait(self, ms: float, timed_out: bool) -> None:
+        with self._lock:
+            self.wait_ms_total += ms
+            self.wait_ms_max = max(self.wait_ms_max, ms)
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            data = {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "checked_out": self.checked_out,
+                "peak_checked_out": self.peak_checked_out,
+                "wait_ms_max": round(self.wait_ms_max, 2),
+                "wait_ms_avg": round(self.wait_ms_total / self.checkouts, 3) if self.checkouts else 0.0,
+            }
+        data["pool"] = pool.__class__.__name__
+        if isinstance(pool, QueuePool):
+            data.update(size=pool.size(), overflow=pool.overflow(), idle=pool.checkedin())
+        return data
+
+
+class _TimedQueuePool(QueuePool):
+    """QueuePool 本身没有“等连接”的事件：在 connect() 外面计时，顺带数超时次数。"""
+
+    stats: PoolStats | None = None
+
+    def connect(self):
+        t0 = time.perf_counter()
+        timed_out = False
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            if self.stats is not None:
+                self.stats.on_wait((time.perf_counter() - t0) * 1000, timed_out)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return url.startswith("sqlite") and (url.rstrip("/").endswith(":memory:") or url in {"sqlite://", "sqlite:///"})
+
+
+def _engine_kwargs(url: str, prefix: str) -> dict:
+    kwargs: dict = {"pool_pre_ping": True}
+    if url.startswith("sqlite"):
+        # Needed for SQLite when used in multithreaded ASGI servers
+        kwargs["connect_args"] = {"check_same_thread": False}
+        if _is_memory_sqlite(url):
+            return kwargs
+    kwargs.update(
+        poolclass=_TimedQueuePool,
+        pool_size=_env_int(f"{prefix}_POOL_SIZE", 5),
+        max_overflow=_env_int(f"{prefix}_MAX_OVERFLOW", 10),
+        pool_timeout=_env_int(f"{prefix}_POOL_TIMEOUT", 30),
+        # MySQL 默认 8 小时（wait_timeout）断开空闲连接，提前回收
+        pool_recycle=_env_int(f"{prefix}_POOL_RECYCLE", 3600 if url.startswith("mysql") else -1),
+    )
+    return kwargs
+
+
+def _sqlite_pragmas(dbapi_conn, _record) -> None:
+    cur = dbapi_conn.cursor()
+    try:
+        cur.execute("PRAGMA journal_mode=WAL;")
+        cur.execute("PRAGMA synchronous=NORMAL;")
+        cur.execute(f"PRAGMA busy_timeout={_env_int('DB_SQLITE_BUSY_TIMEOUT_MS', 5000)};")
+    finally:
+        cur.close()
+
+
+_pool_stats: dict[str, tuple] = {}
 
 
-connect_args = {}
-if DATABASE_URL.startswith("sqlite"):
-    # Needed for SQLite when used in multithreaded ASGI servers
-    connect_args = {"check_same_thread": False}
+def make_engine(url: str, *, name: str = "primary", prefix: str = "DB"):
+    """按环境变量建引擎：连接池参数、SQLite PRAGMA、连接池事件计数。"""
+    eng = create_engine(url, **_engine_kwargs(url, prefix))
+    if url.startswith("sqlite") and not _is_memory_sqlite(url):
+        event.listen(eng, "connect", _sqlite_pragmas)
+    stats = PoolStats(name)
+    event.listen(eng.pool, "connect", stats.on_connect)
+    event.listen(eng.pool, "checkout", stats.on_checkout)
+    event.listen(eng.pool, "checkin", stats.on_checkin)
+    event.listen(eng.pool, "invalidate", stats.on_invalidate)
+    if isinstance(eng.pool, _TimedQueuePool):
+        eng.pool.stats = stats
+    _pool_stats[name] = (eng, stats)
+    return eng
 
 
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    connect_args=connect_args,
-)
+engine = make_engine(DATABASE_URL)
+read_engine = make_engine(DATABASE_READ_URL, name="replica", prefix="DB_READ") if DATABASE_READ_URL else engine
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+class ReadSession(Session):
+    """查询走只读副本；flush 和 INSERT / UPDATE / DELETE 仍然回主库。"""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or isinstance(clause, (Insert, Update, Delete)):
+            return engine
+        return read_engine
+
+
+ReadSessionLocal = sessionmaker(class_=ReadSession, autocommit=False, autoflush=False)
+
 Base = declarative_base()
 
 
@@ -53,3 +205,98 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    """只读接口用：配置了 DATABASE_READ_URL 时查询走副本（可能有复制延迟），否则等同 get_db。"""
+    db = ReadSessionLocal() if read_engine is not engine else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def pool_status() -> dict:
+    return {name: stats.snapshot(eng.pool) for name, (eng, stats) in _pool_stats.items()}
+
+
+def add_missing_columns(bind, table: str, columns: dict[str, str]) -> list[str]:
+    """create_all 不会给已有表加列：缺哪列就 ALTER TABLE ADD COLUMN，返回新加的列名。"""
+    insp = inspect(bind)
+    if not insp.has_table(table):
+        return []
+    existing = {c["name"] for c in insp.get_columns(table)}
+    added = []
+    with bind.begin() as conn:
+        for name, ddl in columns.items():
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                added.append(name)
+    return added
+
+
+def add_missing_indexes(bind, *tables: str) -> list[str]:
+    """create_all 只在建表时建索引：已有表上模型新声明的索引 / 具名唯一约束补建，返回新建的索引名。
+
+    唯一约束补成同名唯一索引；老数据里已有重复行时建不出来，告警后跳过，清完重复数据再 GS_SCHEMA_FORCE=1 重启。
+    """
+    insp = inspect(bind)
+    added = []
+    for table in tables:
+        if not insp.has_table(table):
+            continue
+        existing = {ix["name"] for ix in insp.get_indexes(table)}
+        existing |= {uc["name"] for uc in insp.get_unique_constraints(table)}
+        meta = Base.metadata.tables[table]
+        for index in meta.indexes:
+            if index.name not in existing:
+                index.create(bind)
+                added.append(index.name)
+        for uc in meta.constraints:
+            if not isinstance(uc, UniqueConstraint) or not uc.name or uc.name in existing:
+                continue
+            # 直接写 DDL：往 metadata 里挂一个 Index 的话，新库 create_all 会把约束和索引各建一遍
+            q = bind.dialect.identifier_preparer.quote
+            ddl = f"CREATE UNIQUE INDEX {q(uc.name)} ON {q(table)} ({', '.join(q(c.name) for c in uc.columns)})"
+            try:
+                with bind.begin() as conn:
+                    conn.execute(text(ddl))
+            except IntegrityError as e:
+                warnings.warn(f"{table}: cannot add unique index {uc.name}, duplicate rows exist ({e.orig})")
+                continue
+            added.append(uc.name)
+    return added
+
+
+# ORM 表结构版本：新增模型 / 列 / 索引（create_all、add_missing_columns、add_missing_indexes 负责的变更）时 +1，
+# 老库下次启动会重跑一遍建表补列；版本一致时启动只查一行 schema_meta
+SCHEMA_VERSION = 3
+
+
+def schema_force_requested() -> bool:
+    return (os.getenv("GS_SCHEMA_FORCE") or "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def schema_version(bind, name: str = "orm") -> int:
+    """schema_meta 里记录的版本；表不存在时返回 0。"""
+    try:
+        with bind.connect() as conn:
+            row = conn.execute(text("SELECT version FROM schema_meta WHERE name = :name"), {"name": name}).first()
+    except SQLAlchemyError:
+        return 0
+    return int(row[0]) if row else 0
+
+
+def set_schema_version(bind, version: int, name: str = "orm") -> None:
+    with bind.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS schema_meta ("
+                "name VARCHAR(64) PRIMARY KEY, version INTEGER NOT NULL, updated_at VARCHAR(32) NOT NULL)"
+            )
+        )
+        conn.execute(text("DELETE FROM schema_meta WHERE name = :name"), {"name": name})
+        conn.execute(
+            text("INSERT INTO schema_meta (name, version, updated_at) VALUES (:name, :version, :updated_at)"),
+            {"name": name, "version": int(version), "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime())},
+        )
@@ -0,0 +1,47 @@
+"""JSON 响应：装了 orjson 就用 orjson 序列化，否则退回标准库 json（输出格式和 starlette 的 JSONResponse 一致）。
+
+create_app 把 FastJSONResponse 设为默认响应类。handler 返回 dict 时 FastAPI 仍会先过一遍
+jsonable_encoder；返回大块数据的接口直接 `return FastJSONResponse(payload)`，连这一步也省掉——
+payload 里只放 dict / list / str / int / float / bool / None / date / datetime，其余类型走 jsonable_encoder 兜底。
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:  # orjson 为可选依赖
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    return jsonable_encoder(obj)
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+else:
+
+    def dumps(content: Any) -> bytes:
+        return json.dumps(
+            content,
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(",", ":"),
+            default=_default,
+        ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
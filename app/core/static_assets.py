@@ -0,0 +1,132 @@
+"""静态资源：带内容哈希的文件名 + 预压缩（scripts/build_static.py 生成）。
+
+构建产物在 static/dist/ 下：
+  dist/style.<hash>.css、dist/style.<hash>.css.gz、dist/style.<hash>.css.br、dist/manifest.json
+manifest 把源路径（"style.css"、"ui/hero_ui.svg"）映射到带哈希的路径。模板里用 asset_url('style.css')；
+没构建过（本地开发）就退回 /static/style.css?v=<mtime>。重新构建后 `python gs_coord.py publish assets` 让各 worker 重新读 manifest。
+
+PrecompressedStaticFiles 按 Accept-Encoding 挑 .br / .gz 旁路文件直接发出（不再现场压缩），
+带哈希的文件名内容永不变，给一年 immutable 缓存。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from mimetypes import guess_type
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from gs_coord import cached_until
+
+STATIC_DIR = "static"
+DIST_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+# 构建时生成哈希副本 + 预压缩的类型（图片本身已压缩，不处理）
+COMPRESSIBLE_SUFFIXES = (".css", ".js", ".svg")
+HASH_LEN = 12
+
+_HASHED_NAME = re.compile(r"\.[0-9a-f]{%d}\.[A-Za-z0-9]+$" % HASH_LEN)
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def manifest_path(static_dir: str = STATIC_DIR) -> str:
+    return os.path.join(static_dir, DIST_DIR, MANIFEST_NAME)
+
+
+@cached_until("assets")
+def load_manifest() -> dict[str, str]:
+    try:
+        with open(manifest_path(), encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+@cached_until("assets", maxsize=256)
+def _mtime_version(rel: str) -> str:
+    override = (os.getenv("GS_ASSET_VERSION") or "").strip()
+    if override:
+        return override
+    try:
+        return str(int(os.stat(os.path.join(STATIC_DIR, rel)).st_mtime))
+    except OSError:
+        return "1"
+
+
+def asset_url(path: str) -> str:
+    """'style.css' / '/static/style.css' -> 构建后的哈希地址；外链和非 /static 路径原样返回。"""
+    v = (path or "").strip()
+    if not v or v.startswith(("http://", "https://", "//", "data:")):
+        return v
+    if v.startswith("/static/"):
+        rel = v[len("/static/"):]
+    elif v.startswith("/"):
+        return v
+    else:
+        rel = v
+    rel = rel.split("?", 1)[0]
+    hashed = load_manifest().get(rel)
+    if hashed:
+        return f"/static/{hashed}"
+    return f"/static/{rel}?v={_mtime_version(rel)}"
+
+
+def accepted_encodings(header: str) -> set[str]:
+    """解析 Accept-Encoding（忽略 q=0 的项）。"""
+    out = set()
+    for part in (header or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                pass
+        out.add(name.strip())
+    return out
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles + 预压缩旁路文件（<file>.br / <file>.gz）+ 哈希文件名的长缓存。"""
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        full_path = str(full_path)
+        has_variant = False
+        response: Response | None = None
+        if full_path.endswith(COMPRESSIBLE_SUFFIXES):
+            accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+            for encoding, suffix in _ENCODINGS:
+                try:
+                    variant_stat = os.stat(full_path + suffix)
+                except OSError:
+                    continue
+                has_variant = True
+                if encoding in accepted or "*" in accepted:
+                    response = FileResponse(
+                        full_path + suffix,
+                        status_code=status_code,
+                        stat_result=variant_stat,
+                        method=scope["method"],
+                        media_type=guess_type(full_path)[0] or "application/octet-stream",
+                        headers={"Content-Encoding": encoding},
+                    )
+                    break
+        if response is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, method=scope["method"])
+        if has_variant:
+            response.headers["Vary"] = "Accept-Encoding"
+        if _HASHED_NAME.search(full_path):
+            response.headers["Cache-Control"] = IMMUTABLE
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -1,10 +1,16 @@
 from fastapi import Header, HTTPException
 from app.auth.telegram_webapp import parse_telegram_user_from_init_data
+from app.auth.session_token import verify_session_token
 
 def get_telegram_id(
+    x_gs_session: str | None = Header(default=None),
     x_telegram_init_data: str | None = Header(default=None),
     x_telegram_id: str | None = Header(default=None),
 ):
+    # ✅ 已登录：/api/init_user 签发的会话令牌
+    if x_gs_session and not x_telegram_init_data:
+        return verify_session_token(x_gs_session)["telegram_id"]
+
     # ✅ 优先：Telegram WebApp initData
     if x_telegram_init_data:
         u = parse_telegram_user_from_init_data(x_telegram_init_data)
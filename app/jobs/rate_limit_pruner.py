@@ -0,0 +1,33 @@
+from app.core.database import SessionLocal
+from app.jobs.scheduler import Job, cron, env_int
+from app.services.rate_limit_service import prune_legacy_actions
+from gs_db import get_db
+from gs_rate_limiter import prune
+
+
+def run_rate_limit_prune() -> str:
+    """清理过期的限流窗口计数（行为库 rate_limits）和旧的 waitlist_rate_limits 记录。"""
+    hours = env_int("GS_RATE_LIMIT_RETENTION_HOURS", 24)
+    gen = get_db()
+    conn = next(gen)
+    try:
+        windows = prune(conn, older_than_hours=hours)
+    finally:
+        gen.close()
+    db = SessionLocal()
+    try:
+        legacy = prune_legacy_actions(db, older_than_hours=hours)
+    finally:
+        db.close()
+    return f"rate_limits={windows} waitlist_rate_limits={legacy}"
+
+
+def rate_limit_prune_job() -> Job:
+    # 每小时整点后第 17 分钟，错开其它任务
+    return Job(
+        name="rate_limit_prune",
+        schedule=cron("rate_limit_prune", "17 * * * *"),
+        func=run_rate_limit_prune,
+        jitter_seconds=env_int("GS_RATE_LIMIT_PRUNE_JITTER_SECONDS", 120),
+        lease_seconds=600,
+    )
@@ -0,0 +1,58 @@
+from app.jobs.scheduler import Job, cron, env_int
+from gs_db import get_db
+
+
+def _sweep(conn, sql: str, days: int, batch_size: int) -> int:
+    deleted = 0
+    cutoff = f"-{max(1, int(days))} days"
+    while True:
+        c = conn.cursor()
+        c.execute(sql, (cutoff, int(batch_size)))
+        conn.commit()
+        deleted += max(0, c.rowcount)
+        if c.rowcount < int(batch_size):
+            return deleted
+
+
+def run_retention_sweep() -> str:
+    """按保留期分批清理行为库里的过期数据（原来在每次启动的 init_gs_db 里做）。"""
+    batch_size = env_int("GS_RETENTION_BATCH_SIZE", 5000)
+    news_days = env_int("GS_NEWS_RETENTION_DAYS", 30)
+    idem_days = env_int("GS_IDEMPOTENCY_RETENTION_DAYS", 7)
+    gen = get_db()
+    conn = next(gen)
+    try:
+        news = _sweep(
+            conn,
+            """
+            DELETE FROM news_items
+            WHERE id IN (SELECT id FROM news_items WHERE fetched_at < datetime('now', ?) LIMIT ?);
+            """,
+            news_days,
+            batch_size,
+        )
+        idem = _sweep(
+            conn,
+            """
+            DELETE FROM idempotency_keys
+            WHERE (scope, key) IN (
+                SELECT scope, key FROM idempotency_keys WHERE created_at < datetime('now', ?) LIMIT ?
+            );
+            """,
+            idem_days,
+            batch_size,
+        )
+    finally:
+        gen.close()
+    return f"news_items={news} idempotency_keys={idem}"
+
+
+def retention_sweep_job() -> Job:
+    # 每天 UTC 02:43，避开整点任务
+    return Job(
+        name="retention_sweep",
+        schedule=cron("retention_sweep", "43 2 * * *"),
+        func=run_retention_sweep,
+        jitter_seconds=env_int("GS_RETENTION_SWEEP_JITTER_SECONDS", 300),
+        lease_seconds=1800,
+    )
@@ -0,0 +1,431 @@
+"""后台任务调度器。
+
+替代各个 job 模块里各自起线程 + time.sleep 的写法：
+- 每个进程最多一个调度线程（同机多 worker 时只有 gs_coord 选出的 leader 起），按 cron 表达式（分 时 日 月 周，可带时区偏移）计算触发时间；
+- 行为库里的 scheduler_jobs 表做租约：同一个触发点（slot）只有一个 worker 能抢到并执行，
+  多个 uvicorn worker 不会重复跑；
+- 每次执行写 job_runs（耗时、状态、摘要）；
+- 支持按任务的随机抖动（jitter），以及进程停机期间错过的触发点在启动后补跑一次；
+- CLI：python -m app.jobs.scheduler list | run <name> | history [name]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable
+
+from gs_coord import run_as_leader
+from gs_db import get_db
+from models import log_system_event
+
+
+_started = False
+_lock = threading.Lock()
+_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+_STARTUP_GRACE_SECONDS = 300
+
+
+def _parse_field(raw: str, lo: int, hi: int) -> frozenset[int]:
+    values: set[int] = set()
+    for part in raw.split(","):
+        part = part.strip()
+        step = 1
+        if "/" in part:
+            part, step_raw = part.split("/", 1)
+            step = int(step_raw)
+            if step <= 0:
+                raise ValueError(f"invalid cron step: {raw}")
+        if part in {"*", ""}:
+            start, end = lo, hi
+        elif "-" in part:
+            a, b = part.split("-", 1)
+            start, end = int(a), int(b)
+        else:
+            start = int(part)
+            end = hi if step > 1 else start
+        if start < lo or end > hi or start > end:
+            raise ValueError(f"cron field out of range: {raw}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+@dataclass(frozen=True)
+class CronSchedule:
+    """五段式 cron（分 时 日 月 周，周日为 0 或 7），tz_offset_hours 为本地时区相对 UTC 的偏移。"""
+
+    expr: str
+    minutes: frozenset[int]
+    hours: frozenset[int]
+    days: frozenset[int]
+    months: frozenset[int]
+    weekdays: frozenset[int]
+    any_day: bool
+    any_weekday: bool
+    tz_offset_hours: int = 0
+
+    @classmethod
+    def parse(cls, expr: str, tz_offset_hours: int = 0) -> "CronSchedule":
+        parts = expr.split()
+        if len(parts) != 5:
+            raise ValueError(f"cron expression needs 5 fields: {expr!r}")
+        weekdays = frozenset(d % 7 for d in _parse_field(parts[4], 0, 7))
+        return cls(
+            expr=expr,
+            minutes=_parse_field(parts[0], 0, 59),
+            hours=_parse_field(parts[1], 0, 23),
+            days=_parse_field(parts[2], 1, 31),
+            months=_parse_field(parts[3], 1, 12),
+            weekdays=weekdays,
+            any_day=parts[2] == "*",
+            any_weekday=parts[4] == "*",
+            tz_offset_hours=int(tz_offset_hours),
+        )
+
+    def _day_matches(self, d: date) -> bool:
+        if d.month not in self.months:
+            return False
+        dom = d.day in self.days
+        dow = (d.weekday() + 1) % 7 in self.weekdays
+        if self.any_day and self.any_weekday:
+            return True
+        if self.any_day:
+            return dow
+        if self.any_weekday:
+            return dom
+        return dom or dow
+
+    def prev_fire(self, now_utc: datetime) -> datetime:
+        """最近一次 <= now_utc 的触发时间（UTC）。"""
+        offset = timedelta(hours=self.tz_offset_hours)
+        local = (now_utc + offset).replace(second=0, microsecond=0, tzinfo=None)
+        hours = sorted(self.hours, reverse=True)
+        minutes = sorted(self.minutes, reverse=True)
+        for back in range(366 * 5):
+            d = local.date() - timedelta(days=back)
+            if not self._day_matches(d):
+                continue
+            for h in hours:
+                for m in minutes:
+                    candidate = datetime(d.year, d.month, d.day, h, m)
+                    if candidate <= local:
+                        return (candidate - offset).replace(tzinfo=timezone.utc)
+        raise ValueError(f"cron expression never fires: {self.expr!r}")
+
+    def next_fire(self, now_utc: datetime) -> datetime:
+        """下一次 > now_utc 的触发时间（UTC）。"""
+        offset = timedelta(hours=self.tz_offset_hours)
+        local = (now_utc + offset).replace(tzinfo=None)
+        hours = sorted(self.hours)
+        minutes = sorted(self.minutes)
+        for ahead in range(366 * 5):
+            d = local.date() + timedelta(days=ahead)
+            if not self._day_matches(d):
+                continue
+            for h in hours:
+                for m in minutes:
+                    candidate = datetime(d.year, d.month, d.day, h, m)
+                    if candidate > local:
+                        return (candidate - offset).replace(tzinfo=timezone.utc)
+        raise ValueError(f"cron expression never fires: {self.expr!r}")
+
+
+@dataclass(frozen=True)
+class Job:
+    name: str
+    schedule: CronSchedule
+    func: Callable[[], str | None]
+    jitter_seconds: int = 0
+    lease_seconds: int = 900
+    run_on_start: bool = False
+
+
+def env_flag(name: str, default: str = "0") -> bool:
+    return (os.getenv(name) or default).strip().lower() in {"1", "true", "yes", "on"}
+
+
+def env_int(name: str, default: int) -> int:
+    raw = (os.getenv(name) or "").strip()
+    try:
+        return int(raw) if raw else default
+    except Exception:
+        return default
+
+
+def cron(name: str, default_expr: str, tz_offset_hours: int = 0) -> CronSchedule:
+    """允许用 GS_JOB_SCHEDULE_<NAME> 覆盖默认 cron 表达式。"""
+    expr = (os.getenv(f"GS_JOB_SCHEDULE_{name.upper()}") or "").strip() or default_expr
+    return CronSchedule.parse(expr, tz_offset_hours=tz_offset_hours)
+
+
+def default_jobs() -> list[Job]:
+    from app.jobs.co2_fetcher import co2_fetch_job
+    from app.jobs.daily_reporter import daily_report_job
+    from app.jobs.news_fetcher import news_fetch_job
+    from app.jobs.rate_limit_pruner import rate_limit_prune_job
+    from app.jobs.retention_sweeper import retention_sweep_job
+
+    return [news_fetch_job(), co2_fetch_job(), daily_report_job(), rate_limit_prune_job(), retention_sweep_job()]
+
+
+def _slot_jitter(job: Job, slot: int) -> float:
+    if job.jitter_seconds <= 0:
+        return 0.0
+    return random.Random(f"{job.name}:{slot}").uniform(0, job.jitter_seconds)
+
+
+def _ensure_job_row(db, job: Job, initial_slot: int) -> None:
+    # 新任务从当前触发点开始记账，避免首次部署就把历史触发点当成“错过”去补跑
+    db.execute(
+        "INSERT INTO scheduler_jobs (name, last_slot) VALUES (?, ?) ON CONFLICT DO NOTHING;",
+        (job.name, int(initial_slot)),
+    )
+    db.commit()
+
+
+def _get_last_slot(db, name: str) -> int | None:
+    c = db.cursor()
+    c.execute("SELECT last_slot FROM scheduler_jobs WHERE name = ?;", (name,))
+    row = c.fetchone()
+    return int(row["last_slot"]) if row and row["last_slot"] is not None else None
+
+
+def _claim(db, job: Job, *, slot: int | None, now: int, owner: str, startup: bool = False) -> bool:
+    """抢租约。slot 不为空时要求该触发点尚未执行；startup=True 时要求最近一段时间内没人跑过。"""
+    db.execute("INSERT INTO scheduler_jobs (name) VALUES (?) ON CONFLICT DO NOTHING;", (job.name,))
+    sql = """
+        UPDATE scheduler_jobs
+        SET lease_owner = ?, lease_until = ?
+        WHERE name = ? AND (lease_until IS NULL OR lease_until < ?)
+    """
+    params: list = [owner, now + int(job.lease_seconds), job.name, now]
+    if slot is not None:
+        sql += " AND (last_slot IS NULL OR last_slot < ?)"
+        params.append(int(slot))
+    if startup:
+        sql += " AND (last_run_at IS NULL OR last_run_at < ?)"
+        params.append(now - _STARTUP_GRACE_SECONDS)
+    c = db.cursor()
+    c.execute(sql + ";", params)
+    db.commit()
+    return c.rowcount == 1
+
+
+def _execute(db, job: Job, *, slot: int | None, owner: str) -> dict:
+    started = datetime.now(timezone.utc)
+    t0 = time.perf_counter()
+    status = "ok"
+    try:
+        message = job.func() or ""
+    except Exception as e:
+        status = "error"
+        message = str(e) or e.__class__.__name__
+    duration_ms = int((time.perf_counter() - t0) * 1000)
+    finished = datetime.now(timezone.utc)
+    db.execute(
+        """
+        INSERT INTO job_runs (job_name, slot, owner, started_at, finished_at, duration_ms, status, message)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+        """,
+        (job.name, slot, owner, started.isoformat(), finished.isoformat(), duration_ms, status, message[:2000]),
+    )
+    db.execute(
+        """
+        UPDATE scheduler_jobs
+        SET lease_owner = NULL,
+            lease_until = NULL,
+            last_slot = CASE WHEN CAST(? AS BIGINT) IS NULL OR COALESCE(last_slot, 0) >= ? THEN last_slot ELSE ? END,
+            last_run_at = ?,
+            last_status = ?,
+            last_duration_ms = ?
+        WHERE name = ?;
+        """,
+        (slot, slot, slot, int(finished.timestamp()), status, duration_ms, job.name),
+    )
+    db.commit()
+    log_system_event(
+        db,
+        level="info" if status == "ok" else "error",
+        event=job.name if status == "ok" else f"{job.name}_error",
+        message=f"{message} duration_ms={duration_ms}".strip(),
+    )
+    return {"job": job.name, "status": status, "duration_ms": duration_ms, "message": message}
+
+
+def run_job_once(job: Job, *, owner: str = _OWNER, respect_lease: bool = True) -> dict | None:
+    """立即执行一次（CLI / 手动触发用），不推进 last_slot；租约被占用时返回 None。"""
+    gen = get_db()
+    db = next(gen)
+    try:
+        if respect_lease and not _claim(db, job, slot=None, now=int(time.time()), owner=owner):
+            return None
+        return _execute(db, job, slot=None, owner=owner)
+    finally:
+        gen.close()
+
+
+def _tick(db, jobs: list[Job], done: dict[str, int], owner: str) -> float:
+    """检查一轮到期任务，返回下一次需要醒来的 epoch 秒。"""
+    now_dt = datetime.now(timezone.utc)
+    now = int(now_dt.timestamp())
+    wake = now + 60.0
+    for job in jobs:
+        slot = int(job.schedule.prev_fire(now_dt).timestamp())
+        due_at = slot + _slot_jitter(job, slot)
+        if done.get(job.name, 0) < slot:
+            if now >= due_at:
+                last = _get_last_slot(db, job.name)
+                if last is not None and last >= slot:
+                    done[job.name] = last
+                elif _claim(db, job, slot=slot, now=now, owner=owner):
+                    _execute(db, job, slot=slot, owner=owner)
+                    done[job.name] = slot
+            else:
+                wake = min(wake, due_at)
+        nxt = int(job.schedule.next_fire(now_dt).timestamp())
+        wake = min(wake, nxt + _slot_jitter(job, nxt))
+    return wake
+
+
+def _log_worker_error(event: str, e: Exception) -> None:
+    """调度线程自身的异常（不是某个任务失败）记进 system_logs，带 traceback；连库都写不进去时打到 stderr。"""
+    tb = traceback.format_exc()
+    try:
+        gen = get_db()
+        db = next(gen)
+        try:
+            log_system_event(
+                db,
+                level="error",
+                event=event,
+                message=str(e) or e.__class__.__name__,
+                meta_json=json.dumps({"owner": _OWNER, "traceback": tb[-8000:]}),
+            )
+        finally:
+            gen.close()
+    except Exception:
+        traceback.print_exc()
+        sys.stderr.write(f"{event} (original error):\n{tb}")
+
+
+def _worker(jobs: list[Job]) -> None:
+    done: dict[str, int] = {}
+    # 启动补跑（如 news_fetch）推迟一会儿，不和进程刚起来时的首批请求抢 CPU / 数据库
+    time.sleep(max(0, env_int("GS_SCHEDULER_START_DELAY_SECONDS", 30)))
+    try:
+        gen = get_db()
+        db = next(gen)
+        try:
+            now_dt = datetime.now(timezone.utc)
+            for job in jobs:
+                _ensure_job_row(db, job, int(job.schedule.prev_fire(now_dt).timestamp()))
+            for job in jobs:
+                if job.run_on_start and _claim(db, job, slot=None, now=int(time.time()), owner=_OWNER, startup=True):
+                    _execute(db, job, slot=None, owner=_OWNER)
+        finally:
+            gen.close()
+    except Exception as e:
+        _log_worker_error("scheduler_startup_error", e)
+
+    while True:
+        try:
+            gen = get_db()
+            db = next(gen)
+            try:
+                wake = _tick(db, jobs, done, _OWNER)
+            finally:
+                gen.close()
+            time.sleep(max(1.0, min(60.0, wake - time.time())))
+        except Exception as e:
+            _log_worker_error("scheduler_tick_error", e)
+            time.sleep(60)
+
+
+def start_scheduler(jobs: list[Job] | None = None) -> None:
+    global _started
+    if not env_flag("GS_SCHEDULER_ENABLED", "1"):
+        return
+    with _lock:
+        if _started:
+            return
+        _started = True
+    # 同机多 worker 时只有拿到 scheduler 锁的进程跑调度线程，其余进程阻塞等待接手（见 gs_coord）
+    run_as_leader("scheduler", _worker, jobs or default_jobs())
+
+
+def list_job_runs(db, name: str | None = None, limit: int = 50) -> list[dict]:
+    c = db.cursor()
+    if name:
+        c.execute(
+            """
+            SELECT id, job_name, slot, owner, started_at, finished_at, duration_ms, status, message
+            FROM job_runs WHERE job_name = ? ORDER BY id DESC LIMIT ?;
+            """,
+            (name, int(limit)),
+        )
+    else:
+        c.execute(
+            """
+            SELECT id, job_name, slot, owner, started_at, finished_at, duration_ms, status, message
+            FROM job_runs ORDER BY id DESC LIMIT ?;
+            """,
+            (int(limit),),
+        )
+    return [dict(r) for r in c.fetchall()]
+
+
+def main(argv: list[str] | None = None) -> int:
+    from gs_db import init_gs_db
+
+    ap = argparse.ArgumentParser(prog="python -m app.jobs.scheduler")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="列出任务及下一次触发时间")
+    run_p = sub.add_parser("run", help="立即执行一次任务")
+    run_p.add_argument("name")
+    run_p.add_argument("--ignore-lease", action="store_true", help="不检查租约（任务卡死时用）")
+    hist_p = sub.add_parser("history", help="查看最近的执行记录")
+    hist_p.add_argument("name", nargs="?")
+    hist_p.add_argument("--limit", type=int, default=20)
+    args = ap.parse_args(argv)
+
+    init_gs_db()
+    jobs = {j.name: j for j in default_jobs()}
+    now = datetime.now(timezone.utc)
+
+    if args.cmd == "list":
+        for j in jobs.values():
+            print(f"{j.name:<16} {j.schedule.expr:<16} tz={j.schedule.tz_offset_hours:+d}h next={j.schedule.next_fire(now).isoformat()}")
+        return 0
+    if args.cmd == "run":
+        job = jobs.get(args.name)
+        if job is None:
+            print(f"unknown job: {args.name} (known: {', '.join(jobs)})")
+            return 2
+        result = run_job_once(job, owner=f"cli:{_OWNER}", respect_lease=not args.ignore_lease)
+        if result is None:
+            print(f"{job.name} is running elsewhere (lease held)")
+            return 1
+        print(f"{result['job']} {result['status']} {result['duration_ms']}ms {result['message']}")
+        return 0 if result["status"] == "ok" else 1
+    gen = get_db()
+    db = next(gen)
+    try:
+        for r in list_job_runs(db, args.name, limit=args.limit):
+            print(f"{r['started_at']} {r['job_name']:<16} {r['status']:<5} {r['duration_ms']}ms {r['message'] or ''}")
+    finally:
+        gen.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
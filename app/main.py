@@ -1,38 +1,41 @@
+import os
+
 from fastapi import FastAPI
 from fastapi import Header, Response
 from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from app.api.site import site_router
 
 
 from app.api import health, waitlist
-from app.core.database import Base, engine
+from app.core.responses import FastJSONResponse
+from app.core.database import SCHEMA_VERSION, Base, engine, schema_force_requested, schema_version, set_schema_version
 from app.api.quests import router as quests_router
 from app.api.me import router as me_router
 from app.api.company_admin import router as company_admin_router
 from app.api.co2 import router as co2_router
 
-from app.auth.telegram_webapp import parse_telegram_user_from_init_data
+from app.auth.telegram_webapp import parse_telegram_user_from_init_data, warm_up as warm_up_telegram_auth
 
 from app.models import waitlist as _waitlist_model  # noqa: F401
 from app.models import rate_limit as _rate_limit_model  # noqa: F401
 from app.models import company_carbon as _company_carbon_model  # noqa: F401
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.static_assets import PrecompressedStaticFiles
+from app.middleware.compression import SelectiveGZipMiddleware
 from routes import router as greensphere_router
 from gs_db import init_gs_db
-from app.jobs.news_fetcher import start_news_fetcher
-from app.jobs.co2_fetcher import start_co2_fetcher
-from app.jobs.daily_reporter import start_daily_reporter
+from gs_coord import exclusive
+from app.jobs.scheduler import start_scheduler
+from app.services.user_repository import ensure_leafpass_schema
+from app.services.company_carbon_service import ensure_company_carbon_schema
 
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="GreenSphere API")
+    app = FastAPI(title="GreenSphere API", default_response_class=FastJSONResponse)
 
-    # 静态文件 & 模板
-    app.mount("/static", StaticFiles(directory="static"), name="static")
-    Jinja2Templates(directory="templates")
+    # 静态文件（scripts/build_static.py 生成的哈希文件名 + .br/.gz 预压缩，见 app/core/static_assets.py）
+    app.mount("/static", PrecompressedStaticFiles(directory="static"), name="static")
 
     # Routers
     app.include_router(health.router, prefix="/api")
@@ -47,11 +50,16 @@ def create_app() -> FastAPI:
     # DB init
     @app.on_event("startup")
     def _startup_create_tables() -> None:
-        Base.metadata.create_all(bind=engine)
-        init_gs_db()
-        start_news_fetcher()
-        start_daily_reporter()
-        start_co2_fetcher()
+        # 多 worker 同时启动时建表 / 补列串行执行；库里记录的结构版本是最新的就跳过
+        with exclusive("startup"):
+            if schema_force_requested() or schema_version(engine) < SCHEMA_VERSION:
+                Base.metadata.create_all(bind=engine)
+                ensure_leafpass_schema(engine)
+                ensure_company_carbon_schema(engine)
+                set_schema_version(engine, SCHEMA_VERSION)
+            init_gs_db()
+        warm_up_telegram_auth()
+        start_scheduler()
 
     return app
 
@@ -80,3 +88,11 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
+# 动态响应（JSON / HTML）超过阈值才压；静态文件已预压缩，图片代理压了也没收益
+app.add_middleware(
+    SelectiveGZipMiddleware,
+    minimum_size=int((os.getenv("GS_GZIP_MIN_BYTES") or "").strip() or 1024),
+    compresslevel=int((os.getenv("GS_GZIP_LEVEL") or "").strip() or 6),
+    skip_prefixes=("/static/", "/img"),
+)
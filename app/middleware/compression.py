@@ -0,0 +1,19 @@
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import Receive, Scope, Send
+
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """动态响应超过 minimum_size 才 gzip；skip_prefixes 下的路径（静态文件已预压缩、图片代理）直接放行。
+
+    已带 Content-Encoding 的响应 starlette 本身就不会再压一遍。
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, compresslevel: int = 6, skip_prefixes: tuple[str, ...] = ()) -> None:
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.skip_prefixes = tuple(skip_prefixes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope.get("path", "").startswith(self.skip_prefixes):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
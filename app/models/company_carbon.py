@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import datetime, date
 
-from sqlalchemy import Column, Date, DateTime, Float, ForeignKey, Integer, String
+from sqlalchemy import Column, Date, DateTime, Float, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -23,6 +23,7 @@ class Company(Base):
 
 class CompanyEmission(Base):
     __tablename__ = "company_emissions"
+    __table_args__ = (Index("idx_company_emissions_company_period_end", "company_id", "period_end"),)
 
     id = Column(Integer, primary_key=True, index=True)
     company_id = Column(Integer, ForeignKey("companies.id"), index=True, nullable=False)
@@ -39,6 +40,7 @@ class CompanyEmission(Base):
 
 class CompanyOffset(Base):
     __tablename__ = "company_offsets"
+    __table_args__ = (Index("idx_company_offsets_company_purchased_at", "company_id", "purchased_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
     company_id = Column(Integer, ForeignKey("companies.id"), index=True, nullable=False)
@@ -52,3 +54,16 @@ class CompanyOffset(Base):
 
     company = relationship("Company", back_populates="offsets")
 
+
+class CompanyCarbonMonthly(Base):
+    """按月汇总（app/services/company_carbon_service.py 维护）：排放按天数摊到各月，抵消按购买日落在当月。"""
+
+    __tablename__ = "company_carbon_monthly"
+
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    month_start = Column(Date, primary_key=True)
+    scope1_tco2e = Column(Float, nullable=False, default=0.0)
+    scope2_tco2e = Column(Float, nullable=False, default=0.0)
+    scope3_tco2e = Column(Float, nullable=False, default=0.0)
+    offsets_tco2e = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Date, Boolean, func
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Date, Boolean, Index, UniqueConstraint, func
 from app.core.database import Base
 
 class TelegramUser(Base):
@@ -23,6 +23,10 @@ class Quest(Base):
 
 class QuestSubmission(Base):
     __tablename__ = "quest_submissions"
+    __table_args__ = (
+        UniqueConstraint("telegram_id", "quest_code", "submit_date", name="uniq_user_quest_day"),
+        Index("idx_quest_submissions_user_date", "telegram_id", "submit_date"),
+    )
     id = Column(Integer, primary_key=True)
     telegram_id = Column(BigInteger, nullable=False, index=True)
     quest_code = Column(String(50), nullable=False)
@@ -42,4 +46,8 @@ class LeafpassStatus(Base):
     telegram_id = Column(BigInteger, primary_key=True)
     level = Column(String(20), nullable=False)
     total_points = Column(Integer, default=0)
+    # 连续天数截至 last_active_date；读的时候 last_active_date 早于昨天就视为 0
+    streak = Column(Integer, default=0)
+    last_active_date = Column(Date)
+    participation_days = Column(Integer)
     updated_at = Column(DateTime, server_default=func.current_timestamp())
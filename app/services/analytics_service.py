@@ -0,0 +1,371 @@
+"""留存分析：基于每用户活跃位图的 cohort / DAU-WAU-MAU / 连续天数分布。
+
+存储：user_activity 每个用户一行，bits 为小端字节串，第 i 位表示 base_day + i 这一天有打卡
+（day 为相对 ANALYTICS_EPOCH 的天数，base_day 按 8 对齐）。打卡写路径增量置位，
+rebuild_activity 可从 user_task_logs（加上调用方给的其它来源，如 Quest 参与日）全量重建。
+
+计算：按查询窗口把“用户 × 天”转置成“每天一个用户位集”（Python 大整数，第 k 位 = 第 k 个用户），
+DAU/WAU/MAU、cohort 留存、streak 分布都变成整块的 & / | / bit_count，百万用户也只是几百 KB 的位运算。
+装了 numpy 时转置走 unpackbits/packbits，否则逐用户拆位。
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Iterable
+
+_np = None
+_np_checked = False
+
+
+def _numpy():
+    """numpy 为可选依赖，只用来加速转置；第一次算留存时才导入，应用启动不背这份开销。"""
+    global _np, _np_checked
+    if not _np_checked:
+        try:
+            import numpy
+        except Exception:  # pragma: no cover
+            numpy = None
+        _np, _np_checked = numpy, True
+    return _np
+
+
+ANALYTICS_EPOCH = date(2024, 1, 1)
+MAX_WINDOW_DAYS = 400
+
+
+def day_index(d: date) -> int:
+    return (d - ANALYTICS_EPOCH).days
+
+
+def day_from_index(i: int) -> date:
+    return ANALYTICS_EPOCH + timedelta(days=int(i))
+
+
+def _set_bit(bits: bytearray, base_day: int, day: int) -> tuple[bytearray, int]:
+    if day < base_day:
+        new_base = day - day % 8
+        bits = bytearray((base_day - new_base) // 8) + bits
+        base_day = new_base
+    off = day - base_day
+    need = off // 8 + 1
+    if len(bits) < need:
+        bits.extend(b"\x00" * (need - len(bits)))
+    bits[off // 8] |= 1 << (off % 8)
+    return bits, base_day
+
+
+def mark_active(conn: sqlite3.Connection, user_id: int, d: date) -> None:
+    """打卡写路径：给用户当天置位（不 commit，跟随调用方事务）。"""
+    day = day_index(d)
+    if day < 0:
+        return
+    c = conn.cursor()
+    c.execute("SELECT base_day, first_day, last_day, bits FROM user_activity WHERE user_id = ?;", (int(user_id),))
+    row = c.fetchone()
+    if row is None:
+        bits, base = _set_bit(bytearray(), day - day % 8, day)
+        c.execute(
+            "INSERT INTO user_activity (user_id, base_day, first_day, last_day, bits) VALUES (?, ?, ?, ?, ?);",
+            (int(user_id), base, day, day, bytes(bits)),
+        )
+        return
+    bits, base = _set_bit(bytearray(row["bits"] or b""), int(row["base_day"]), day)
+    c.execute(
+        "UPDATE user_activity SET base_day = ?, first_day = ?, last_day = ?, bits = ? WHERE user_id = ?;",
+        (base, min(int(row["first_day"]), day), max(int(row["last_day"]), day), bytes(bits), int(user_id)),
+    )
+
+
+def rebuild_activity(conn: sqlite3.Connection, extra_days: Iterable[tuple[int, date]] = ()) -> int:
+    """从 user_task_logs 全量重建 user_activity，返回用户数。
+
+    extra_days 是打卡日志以外的活跃日 (user_id, date)，比如统一存储下的 Quest 参与日
+    （见 user_repository.rebuild_behavior_activity）；不传的话这些日子会被清掉。
+    """
+    c = conn.cursor()
+    c.execute("SELECT user_id, date FROM user_task_logs GROUP BY user_id, date;")
+    by_user: dict[int, set[int]] = {}
+
+    def add(user_id, d: date) -> None:
+        i = day_index(d)
+        if i >= 0:
+            by_user.setdefault(int(user_id), set()).add(i)
+
+    for r in c.fetchall():
+        try:
+            add(r["user_id"], date.fromisoformat(r["date"]))
+        except Exception:
+            continue
+    for user_id, d in extra_days:
+        if d is not None:
+            add(user_id, d)
+
+    rows: list[tuple] = []
+    for user_id in sorted(by_user):
+        days = by_user[user_id]
+        first, last = min(days), max(days)
+        base = first - first % 8
+        bits = bytearray((last - base) // 8 + 1)
+        for d in days:
+            off = d - base
+            bits[off // 8] |= 1 << (off % 8)
+        rows.append((user_id, base, first, last, bytes(bits)))
+
+    c.execute("DELETE FROM user_activity;")
+    c.executemany(
+        "INSERT INTO user_activity (user_id, base_day, first_day, last_day, bits) VALUES (?, ?, ?, ?, ?);",
+        rows,
+    )
+    conn.commit()
+    return len(rows)
+
+
+def user_streak(conn: sqlite3.Connection, user_id: int, today: date) -> tuple[int, int]:
+    """单个用户：(截至 today 的连续天数, 累计活跃天数)，只读一行位图。"""
+    c = conn.cursor()
+    c.execute("SELECT base_day, bits FROM user_activity WHERE user_id = ?;", (int(user_id),))
+    row = c.fetchone()
+    if row is None:
+        return 0, 0
+    base, bits = int(row[0]), bytes(row[1] or b"")
+    x = int.from_bytes(bits, "little")
+    off = day_index(today) - base
+    streak = 0
+    while 0 <= off and (x >> off) & 1:
+        streak += 1
+        off -= 1
+    return streak, x.bit_count()
+
+
+@dataclass
+class ActivityMatrix:
+    """查询窗口内的转置位图：day_bits[k] 的第 i 位 = 第 i 个用户在 start+k 天活跃。"""
+
+    start: int
+    days: int
+    users: int
+    day_bits: list[int]
+    first_day: list[int]
+
+    def bitmap_where_first_day(self, lo: int, hi: int) -> int:
+        """first_day 落在 [lo, hi) 的用户位集。"""
+        np = _numpy()
+        if np is not None and self.users:
+            fd = np.asarray(self.first_day, dtype=np.int64)
+            mask = (fd >= lo) & (fd < hi)
+            return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+        out = 0
+        for i, f in enumerate(self.first_day):
+            if lo <= f < hi:
+                out |= 1 << i
+        return out
+
+    def union(self, lo: int, hi: int) -> int:
+        """绝对天 [lo, hi) 内任意一天活跃的用户位集。"""
+        out = 0
+        for d in range(max(lo, self.start), min(hi, self.start + self.days)):
+            out |= self.day_bits[d - self.start]
+        return out
+
+
+def _slice_window(bits: bytes, base_day: int, start: int, nbytes: int) -> bytes:
+    """把用户位图对齐到窗口起点（start 为 8 的倍数），截成固定 nbytes。"""
+    shift = (base_day - start) // 8
+    if shift >= 0:
+        chunk = bytes(shift) + bits
+    else:
+        chunk = bits[-shift:]
+    chunk = chunk[:nbytes]
+    return chunk + bytes(nbytes - len(chunk))
+
+
+def load_activity(conn: sqlite3.Connection, start: date, end: date) -> ActivityMatrix:
+    lo = day_index(start)
+    hi = day_index(end) + 1
+    if hi - lo > MAX_WINDOW_DAYS:
+        raise ValueError(f"window too large (max {MAX_WINDOW_DAYS} days)")
+    aligned = lo - lo % 8
+    nbytes = (hi - aligned + 7) // 8
+    c = conn.cursor()
+    c.row_factory = None  # 百万行时 tuple 比 sqlite3.Row 快不少
+    c.execute(
+        "SELECT base_day, first_day, bits FROM user_activity WHERE last_day >= ? AND first_day < ? ORDER BY user_id;",
+        (lo, hi),
+    )
+    rows = c.fetchall()
+    n = len(rows)
+    width = hi - lo
+    skip = lo - aligned
+
+    if n == 0:
+        return ActivityMatrix(start=lo, days=width, users=0, day_bits=[0] * width, first_day=[])
+
+    np = _numpy()
+    if np is not None:
+        base, first, blobs = zip(*rows)
+        first_day = list(first)
+        lengths = np.fromiter((len(b) for b in blobs), dtype=np.int64, count=n)
+        flat = np.frombuffer(b"".join(blobs), dtype=np.uint8)
+        # 每个字节落到 (用户行, 窗口内字节列)，一次 scatter 完成对齐
+        owner = np.repeat(np.arange(n), lengths)
+        local = np.arange(flat.size) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        col = local + np.repeat((np.asarray(base, dtype=np.int64) - aligned) // 8, lengths)
+        keep = (col >= 0) & (col < nbytes)
+        mat = np.zeros((n, nbytes), dtype=np.uint8)
+        mat[owner[keep], col[keep]] = flat[keep]
+        cols = np.unpackbits(mat, axis=1, bitorder="little")[:, skip:skip + width]
+        packed = np.packbits(cols, axis=0, bitorder="little")
+        day_bits = [int.from_bytes(packed[:, k].tobytes(), "little") for k in range(width)]
+    else:
+        first_day = [int(r[1]) for r in rows]
+        per_day = [bytearray((n + 7) // 8) for _ in range(width)]
+        for i, (base_day, _, bits) in enumerate(rows):
+            # Postgres 的 BYTEA 取出来是 memoryview，先转成 bytes 再切片拼接
+            x = int.from_bytes(_slice_window(bytes(bits), int(base_day), aligned, nbytes), "little") >> skip
+            x &= (1 << width) - 1
+            byte_i, bit = i >> 3, 1 << (i & 7)
+            while x:
+                low = x & -x
+                per_day[low.bit_length() - 1][byte_i] |= bit
+                x ^= low
+        day_bits = [int.from_bytes(b, "little") for b in per_day]
+
+    return ActivityMatrix(start=lo, days=width, users=n, day_bits=day_bits, first_day=first_day)
+
+
+def active_counts(conn: sqlite3.Connection, start: date, end: date) -> list[dict]:
+    """每天的 DAU / WAU / MAU（滚动 7 / 30 天）及黏性 DAU/MAU。"""
+    m = load_activity(conn, start - timedelta(days=29), end)
+    out = []
+    for d in range(day_index(start), day_index(end) + 1):
+        dau = m.day_bits[d - m.start].bit_count()
+        wau = m.union(d - 6, d + 1).bit_count()
+        mau = m.union(d - 29, d + 1).bit_count()
+        out.append(
+            {
+                "date": day_from_index(d).isoformat(),
+                "dau": dau,
+                "wau": wau,
+                "mau": mau,
+                "stickiness": round(dau / mau, 4) if mau else 0.0,
+            }
+        )
+    return out
+
+
+def cohort_retention(conn: sqlite3.Connection, end: date, *, period: str = "week", periods: int = 8) -> list[dict]:
+    """按首次打卡所在周/日分组，返回每个 cohort 在第 0..N 个周期仍活跃的人数和比例。"""
+    size = 7 if period == "week" else 1
+    if size == 7:
+        # 周从周一开始，end 所在周算最后一个周期
+        end_i = day_index(end - timedelta(days=end.weekday())) + 7
+    else:
+        end_i = day_index(end) + 1
+    start_i = end_i - periods * size
+    m = load_activity(conn, day_from_index(start_i), day_from_index(end_i - 1))
+    period_bits = [m.union(start_i + p * size, start_i + (p + 1) * size) for p in range(periods)]
+    out = []
+    for p in range(periods):
+        lo = start_i + p * size
+        cohort = m.bitmap_where_first_day(lo, lo + size)
+        n = cohort.bit_count()
+        retained = [(cohort & period_bits[q]).bit_count() for q in range(p, periods)]
+        out.append(
+            {
+                "cohort": day_from_index(lo).isoformat(),
+                "users": n,
+                "retained": retained,
+                "rates": [round(x / n, 4) if n else 0.0 for x in retained],
+            }
+        )
+    return out
+
+
+def streak_distribution(conn: sqlite3.Connection, end: date, *, window: int = 90) -> dict:
+    """截至 end 的当前连续天数分布，以及窗口内最长连续天数分布。"""
+    m = load_activity(conn, end - timedelta(days=window - 1), end)
+    bits = m.day_bits
+
+    current: dict[int, int] = {}
+    alive = bits[-1] if bits else 0
+    k = 1
+    while alive and k <= len(bits):
+        nxt = alive & bits[-k - 1] if k < len(bits) else 0
+        exact = alive.bit_count() - nxt.bit_count()
+        if exact:
+            current[k] = exact
+        alive, k = nxt, k + 1
+
+    # runs[d] = 从第 d 天开始连续 k 天都活跃的用户；longest >= k 的用户 = OR(runs)
+    longest: dict[int, int] = {}
+    runs = list(bits)
+    prev_any = 0
+    for d in runs:
+        prev_any |= d
+    k = 1
+    while prev_any:
+        runs = [runs[d] & bits[d + k] for d in range(len(runs) - 1)] if k < len(bits) else []
+        nxt_any = 0
+        for r in runs:
+            nxt_any |= r
+        exact = prev_any.bit_count() - nxt_any.bit_count()
+        if exact:
+            longest[k] = exact
+        prev_any, k = nxt_any, k + 1
+
+    return {
+        "end": end.isoformat(),
+        "window": window,
+        "users": m.users,
+        "current": [{"days": d, "users": n} for d, n in sorted(current.items())],
+        "longest": [{"days": d, "users": n} for d, n in sorted(longest.items())],
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    from gs_db import get_db, init_gs_db
+    from models import report_today
+
+    ap = argparse.ArgumentParser(prog="python -m app.services.analytics_service")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("rebuild", help="从 user_task_logs（和 Quest 参与日）重建活跃位图")
+    p_active = sub.add_parser("active", help="DAU/WAU/MAU")
+    p_active.add_argument("--days", type=int, default=30)
+    p_cohort = sub.add_parser("cohorts", help="cohort 留存")
+    p_cohort.add_argument("--period", choices=["week", "day"], default="week")
+    p_cohort.add_argument("--periods", type=int, default=8)
+    p_streak = sub.add_parser("streaks", help="连续天数分布")
+    p_streak.add_argument("--window", type=int, default=90)
+    for p in (p_active, p_cohort, p_streak):
+        p.add_argument("--end", default=None, help="YYYY-MM-DD，默认今天")
+    args = ap.parse_args(argv)
+
+    init_gs_db()
+    gen = get_db()
+    db = next(gen)
+    try:
+        if args.cmd == "rebuild":
+            from app.services.user_repository import rebuild_behavior_activity
+
+            print(json.dumps({"users": rebuild_behavior_activity(db)}))
+            return 0
+        end = date.fromisoformat(args.end) if args.end else report_today()
+        if args.cmd == "active":
+            result = active_counts(db, end - timedelta(days=args.days - 1), end)
+        elif args.cmd == "cohorts":
+            result = cohort_retention(db, end, period=args.period, periods=args.periods)
+        else:
+            result = streak_distribution(db, end, window=args.window)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0
+    finally:
+        gen.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
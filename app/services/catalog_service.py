@@ -0,0 +1,390 @@
+"""目录批量导入 / 导出：tasks / badges / rewards / challenges。
+
+导入流程：解析 NDJSON 或 CSV -> 逐行校验 -> 与库里现有数据按 key 做 diff
+-> 一个事务里 executemany 写入 -> 一次性 bump 缓存版本 -> 返回变更摘要。
+dry_run 只返回 diff，不写库。
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from io import StringIO
+from typing import Any, Callable
+
+import gs_dialect
+from gs_cache import bump_cache_version
+
+
+MAX_IMPORT_ROWS = 5000
+MAX_CHANGES_IN_SUMMARY = 200
+BADGE_RULE_TYPES = {"streak", "total_points", "total_completions", "participation_days"}
+
+
+class CatalogError(ValueError):
+    def __init__(self, errors: list[str]):
+        super().__init__("; ".join(errors[:5]))
+        self.errors = errors
+
+
+def _text(v: Any, name: str, *, required: bool = True, max_len: int = 255) -> str:
+    s = "" if v is None else str(v).strip()
+    if required and not s:
+        raise ValueError(f"missing {name}")
+    if len(s) > max_len:
+        raise ValueError(f"{name} too long")
+    return s
+
+
+def _int(v: Any, name: str, *, min_value: int | None = None) -> int:
+    try:
+        n = int(str(v).strip())
+    except Exception:
+        raise ValueError(f"{name} must be an integer")
+    if min_value is not None and n < min_value:
+        raise ValueError(f"{name} must be >= {min_value}")
+    return n
+
+
+def _date(v: Any, name: str) -> str:
+    s = _text(v, name)
+    try:
+        return date.fromisoformat(s).isoformat()
+    except ValueError:
+        raise ValueError(f"{name} must be YYYY-MM-DD")
+
+
+def _json_map(v: Any, name: str) -> str | None:
+    if v in (None, ""):
+        return None
+    if isinstance(v, str):
+        try:
+            v = json.loads(v)
+        except Exception:
+            raise ValueError(f"{name} must be JSON")
+    if not isinstance(v, dict) or not all(isinstance(x, str) for x in v.values()):
+        raise ValueError(f"{name} must be an object of strings")
+    return json.dumps(v, ensure_ascii=False, sort_keys=True)
+
+
+def _id_list(v: Any, name: str) -> list[int]:
+    if v in (None, ""):
+        return []
+    if isinstance(v, str):
+        v = [x for x in v.replace(",", ";").split(";") if x.strip()]
+    if not isinstance(v, list):
+        raise ValueError(f"{name} must be a list")
+    return sorted({_int(x, name, min_value=1) for x in v})
+
+
+@dataclass(frozen=True)
+class CatalogSpec:
+    kind: str
+    table: str
+    key: str
+    fields: tuple[str, ...]
+    clean: Callable[[dict], dict]
+    has_created_at: bool = True
+    extra: tuple[str, ...] = field(default_factory=tuple)
+
+
+def _clean_task(r: dict) -> dict:
+    out = {
+        "title": _text(r.get("title"), "title"),
+        "points": _int(r.get("points"), "points", min_value=0),
+        "i18n_json": _json_map(r.get("i18n") if r.get("i18n") not in (None, "") else r.get("i18n_json"), "i18n"),
+    }
+    if r.get("id") not in (None, ""):
+        out["id"] = _int(r.get("id"), "id", min_value=1)
+    return out
+
+
+def _clean_badge(r: dict) -> dict:
+    rule = _text(r.get("rule_type"), "rule_type")
+    if rule not in BADGE_RULE_TYPES:
+        raise ValueError(f"rule_type must be one of {sorted(BADGE_RULE_TYPES)}")
+    return {
+        "code": _text(r.get("code"), "code", max_len=64),
+        "title": _text(r.get("title"), "title"),
+        "description": _text(r.get("description"), "description", required=False, max_len=1000),
+        "rule_type": rule,
+        "threshold": _int(r.get("threshold"), "threshold", min_value=1),
+    }
+
+
+def _clean_reward(r: dict) -> dict:
+    status = _text(r.get("status") or "active", "status", max_len=32)
+    return {
+        "code": _text(r.get("code"), "code", max_len=64),
+        "title": _text(r.get("title"), "title"),
+        "description": _text(r.get("description"), "description", required=False, max_len=1000),
+        "cost_points": _int(r.get("cost_points"), "cost_points", min_value=1),
+        "status": status,
+    }
+
+
+def _clean_challenge(r: dict) -> dict:
+    out = {
+        "code": _text(r.get("code"), "code", max_len=64),
+        "title": _text(r.get("title"), "title"),
+        "description": _text(r.get("description"), "description", required=False, max_len=1000),
+        "start_date": _date(r.get("start_date"), "start_date"),
+        "end_date": _date(r.get("end_date"), "end_date"),
+        "status": _text(r.get("status") or "draft", "status", max_len=32),
+        "task_ids": _id_list(r.get("task_ids"), "task_ids"),
+    }
+    if out["start_date"] > out["end_date"]:
+        raise ValueError("start_date must be <= end_date")
+    return out
+
+
+SPECS: dict[str, CatalogSpec] = {
+    "tasks": CatalogSpec("tasks", "tasks", "id", ("title", "points", "i18n_json"), _clean_task, has_created_at=False),
+    "badges": CatalogSpec("badges", "badges", "code", ("title", "description", "rule_type", "threshold"), _clean_badge),
+    "rewards": CatalogSpec("rewards", "rewards", "code", ("title", "description", "cost_points", "status"), _clean_reward),
+    "challenges": CatalogSpec(
+        "challenges",
+        "challenges",
+        "code",
+        ("title", "description", "start_date", "end_date", "status"),
+        _clean_challenge,
+        extra=("task_ids",),
+    ),
+}
+
+
+def get_spec(kind: str) -> CatalogSpec:
+    spec = SPECS.get(kind)
+    if spec is None:
+        raise CatalogError([f"unknown catalog kind: {kind} (expected one of {', '.join(SPECS)})"])
+    return spec
+
+
+def parse_rows(raw: bytes, fmt: str) -> list[dict]:
+    text = raw.decode("utf-8-sig")
+    if fmt == "csv":
+        return [dict(r) for r in csv.DictReader(StringIO(text))]
+    if fmt != "ndjson":
+        raise CatalogError(["format must be csv or ndjson"])
+    rows, errors = [], []
+    for n, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            obj = json.loads(line)
+        except Exception:
+            errors.append(f"line {n}: invalid JSON")
+            continue
+        if not isinstance(obj, dict):
+            errors.append(f"line {n}: expected an object")
+            continue
+        rows.append(obj)
+    if errors:
+        raise CatalogError(errors)
+    return rows
+
+
+def _load_current(conn: sqlite3.Connection, spec: CatalogSpec) -> dict[Any, dict]:
+    c = conn.cursor()
+    cols = ", ".join(("id", "code") if spec.key == "code" else ("id",)) + ", " + ", ".join(spec.fields)
+    c.execute(f"SELECT {cols} FROM {spec.table};")
+    current = {r[spec.key]: dict(r) for r in c.fetchall()}
+    for row in current.values():
+        if "description" in row and row["description"] is None:
+            row["description"] = ""
+    if spec.kind == "tasks":
+        for row in current.values():
+            try:
+                row["i18n_json"] = _json_map(row["i18n_json"], "i18n")
+            except ValueError:
+                pass
+    if spec.kind == "challenges":
+        c.execute("SELECT challenge_id, task_id FROM challenge_tasks ORDER BY task_id;")
+        by_id = {row["id"]: row for row in current.values()}
+        for row in current.values():
+            row["task_ids"] = []
+        for r in c.fetchall():
+            if r["challenge_id"] in by_id:
+                by_id[r["challenge_id"]]["task_ids"].append(int(r["task_id"]))
+    return current
+
+
+def _row_key(spec: CatalogSpec, row: dict, by_title: dict[str, Any]) -> Any:
+    if spec.kind == "tasks":
+        # 没给 id 时按标题匹配已有任务
+        return row.get("id") or by_title.get(row["title"])
+    return row[spec.key]
+
+
+def import_catalog(
+    conn: sqlite3.Connection,
+    kind: str,
+    raw: bytes,
+    *,
+    fmt: str = "ndjson",
+    dry_run: bool = False,
+    delete_missing: bool = False,
+) -> dict:
+    spec = get_spec(kind)
+    rows = parse_rows(raw, fmt)
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise CatalogError([f"too many rows (max {MAX_IMPORT_ROWS})"])
+
+    cleaned: list[tuple[int, dict]] = []
+    errors: list[str] = []
+    for n, r in enumerate(rows, start=1):
+        try:
+            cleaned.append((n, spec.clean(r)))
+        except ValueError as e:
+            errors.append(f"row {n}: {e}")
+
+    current = _load_current(conn, spec)
+    by_title = {v["title"]: k for k, v in current.items()} if spec.kind == "tasks" else {}
+    if spec.kind == "challenges":
+        c = conn.cursor()
+        c.execute("SELECT id FROM tasks;")
+        task_ids = {int(r["id"]) for r in c.fetchall()}
+        for n, row in cleaned:
+            missing = [t for t in row["task_ids"] if t not in task_ids]
+            if missing:
+                errors.append(f"row {n}: unknown task_ids {missing}")
+
+    seen: set = set()
+    creates: list[dict] = []
+    updates: list[tuple[Any, dict, dict]] = []
+    unchanged = 0
+    for n, row in cleaned:
+        key = _row_key(spec, row, by_title)
+        dedupe_key = key if key is not None else ("title", row.get("title"))
+        if dedupe_key in seen:
+            errors.append(f"row {n}: duplicate key {dedupe_key}")
+            continue
+        seen.add(dedupe_key)
+        old = current.get(key) if key is not None else None
+        if old is None:
+            creates.append(row)
+            continue
+        diff = {f: [old.get(f), row[f]] for f in spec.fields + spec.extra if old.get(f) != row[f]}
+        if diff:
+            updates.append((key, row, diff))
+        else:
+            unchanged += 1
+    if errors:
+        raise CatalogError(errors)
+
+    deletes = [k for k in current if k not in seen] if delete_missing else []
+
+    changes: list[dict] = []
+    for row in creates:
+        changes.append({"op": "create", "key": row.get(spec.key) if spec.key in row else row.get("title")})
+    for key, _, diff in updates:
+        changes.append({"op": "update", "key": key, "fields": diff})
+    for key in deletes:
+        changes.append({"op": "delete", "key": key})
+
+    summary = {
+        "kind": spec.kind,
+        "dry_run": bool(dry_run),
+        "rows": len(cleaned),
+        "created": len(creates),
+        "updated": len(updates),
+        "unchanged": unchanged,
+        "deleted": len(deletes),
+        "changes": changes[:MAX_CHANGES_IN_SUMMARY],
+        "truncated": len(changes) > MAX_CHANGES_IN_SUMMARY,
+    }
+    if dry_run or not changes:
+        return summary
+
+    _apply(conn, spec, current, creates, updates, deletes)
+    return summary
+
+
+def _apply(
+    conn: sqlite3.Connection,
+    spec: CatalogSpec,
+    current: dict[Any, dict],
+    creates: list[dict],
+    updates: list[tuple[Any, dict, dict]],
+    deletes: list[Any],
+) -> None:
+    now = datetime.utcnow().isoformat()
+    c = conn.cursor()
+    try:
+        # Postgres 连接非 autocommit，第一条语句自动开事务；BEGIN IMMEDIATE 只有 SQLite 认
+        if not conn.in_transaction and not gs_dialect.is_postgres():
+            c.execute("BEGIN IMMEDIATE;")
+        set_clause = ", ".join(f"{f} = ?" for f in spec.fields)
+        if spec.kind == "tasks":
+            with_id = [r for r in creates if "id" in r]
+            without_id = [r for r in creates if "id" not in r]
+            c.executemany(
+                "INSERT INTO tasks (id, title, points, i18n_json) VALUES (?, ?, ?, ?);",
+                [(r["id"], r["title"], r["points"], r["i18n_json"]) for r in with_id],
+            )
+            c.executemany(
+                "INSERT INTO tasks (title, points, i18n_json) VALUES (?, ?, ?);",
+                [(r["title"], r["points"], r["i18n_json"]) for r in without_id],
+            )
+            c.executemany(
+                f"UPDATE tasks SET {set_clause} WHERE id = ?;",
+                [tuple(row[f] for f in spec.fields) + (key,) for key, row, _ in updates],
+            )
+            c.executemany("DELETE FROM tasks WHERE id = ?;", [(k,) for k in deletes])
+        else:
+            cols = (spec.key,) + spec.fields + (("created_at",) if spec.has_created_at else ())
+            c.executemany(
+                f"INSERT INTO {spec.table} ({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)});",
+                [
+                    (r[spec.key],) + tuple(r[f] for f in spec.fields) + ((now,) if spec.has_created_at else ())
+                    for r in creates
+                ],
+            )
+            c.executemany(
+                f"UPDATE {spec.table} SET {set_clause} WHERE {spec.key} = ?;",
+                [tuple(row[f] for f in spec.fields) + (key,) for key, row, _ in updates],
+            )
+            c.executemany(f"DELETE FROM {spec.table} WHERE {spec.key} = ?;", [(k,) for k in deletes])
+
+        if spec.kind == "challenges":
+            touched = [r["code"] for r in creates] + [key for key, _, diff in updates if "task_ids" in diff]
+            new_task_ids = {r["code"]: r["task_ids"] for r in creates}
+            new_task_ids.update({key: row["task_ids"] for key, row, _ in updates})
+            deleted_ids = [current[k]["id"] for k in deletes]
+            ids: dict[str, int] = {}
+            if touched:
+                c.execute(f"SELECT id, code FROM challenges WHERE code IN ({', '.join('?' for _ in touched)});", touched)
+                ids = {r["code"]: int(r["id"]) for r in c.fetchall()}
+            c.executemany(
+                "DELETE FROM challenge_tasks WHERE challenge_id = ?;",
+                [(i,) for i in list(ids.values()) + deleted_ids],
+            )
+            c.executemany(
+                "INSERT INTO challenge_tasks (challenge_id, task_id) VALUES (?, ?) ON CONFLICT DO NOTHING;",
+                [(ids[code], tid) for code in touched for tid in new_task_ids.get(code, [])],
+            )
+
+        bump_cache_version(conn, spec.kind)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def export_catalog_rows(conn: sqlite3.Connection, kind: str) -> tuple[list[str], list[tuple]]:
+    """导出为与导入相同的列，方便“导出 -> 编辑 -> 导入”往返。"""
+    spec = get_spec(kind)
+    current = _load_current(conn, spec)
+    if spec.kind == "tasks":
+        header = ["id", "title", "points", "i18n_json"]
+        rows = [(k, v["title"], v["points"], v["i18n_json"]) for k, v in sorted(current.items())]
+        return header, rows
+    header = [spec.key, *spec.fields, *spec.extra]
+    rows = []
+    for k, v in sorted(current.items()):
+        extra = tuple(";".join(str(x) for x in v.get(e) or []) for e in spec.extra)
+        rows.append((k, *(v[f] for f in spec.fields), *extra))
+    return header, rows
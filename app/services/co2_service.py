@@ -1,11 +1,15 @@
+import gzip
+import hashlib
+import io
+import math
 import os
+import threading
+import time
 from dataclasses import dataclass
-from datetime import datetime, timezone
-
-import httpx
+from datetime import date, datetime, timedelta, timezone
 
+from gs_cache import bump_cache_version, get_cache_version
 from gs_db import get_db
-from models import log_system_event
 
 
 @dataclass(frozen=True)
@@ -14,6 +18,30 @@ class Co2Point:
     value: float
 
 
+@dataclass(frozen=True)
+class TrendSvg:
+    etag: str
+    etag_gz: str
+    svg: bytes
+    svg_gz: bytes
+
+
+TREND_RANGES = (7, 30, 365)
+_TREND_MAX_POINTS = 60
+_TREND_RECHECK_SECONDS = 300
+_CO2_REVISION_DAYS = 60
+# NOAA 日数据每行约 30 字节；增量请求从旧长度往回退这么多行，回修窗口内的行一并取回
+_CO2_LINE_MAX_BYTES = 64
+
+# co2_daily 每次写入（新增或回修）都在同一事务里 bump 这个版本，各 worker 按它判断趋势图是否过期
+CO2_CACHE_NAME = "co2_daily"
+
+_trend_cache: dict[int, TrendSvg] = {}
+_trend_version: int | None = None
+_trend_checked_at = 0.0
+_trend_lock = threading.Lock()
+
+
 def _co2_source_url() -> str:
     return (
         os.getenv("GS_CO2_SOURCE_URL")
@@ -21,8 +49,8 @@ def _co2_source_url() -> str:
     ).strip()
 
 
-def _parse_noaa_daily_mlo(text: str) -> list[Co2Point]:
-    points: list[Co2Point] = []
+def _parse_noaa_daily_mlo(text: str) -> list[tuple[str, float]]:
+    rows: list[tuple[str, float]] = []
     for line in text.splitlines():
         s = line.strip()
         if not s or s.startswith("#"):
@@ -37,62 +65,289 @@ def _parse_noaa_daily_mlo(text: str) -> list[Co2Point]:
             continue
         if v <= 0:
             continue
-        points.append(Co2Point(date=f"{y:04d}-{m:02d}-{d:02d}", value=v))
-    return points
+        rows.append((f"{y:04d}-{m:02d}-{d:02d}", v))
+    return rows
+
+
+def _parse_noaa_daily_mlo_numpy(text: str) -> list[tuple[str, float]]:
+    """全量回填用的向量化解析；NumPy 不可用或文件格式异常时回退到逐行解析。"""
+    try:
+        import numpy as np
+    except ImportError:
+        return _parse_noaa_daily_mlo(text)
+    try:
+        arr = np.loadtxt(io.StringIO(text), comments="#", usecols=(0, 1, 2, 4), ndmin=2)
+    except ValueError:
+        return _parse_noaa_daily_mlo(text)
+    if arr.size == 0:
+        return []
+    arr = arr[arr[:, 3] > 0]
+    ymd = arr[:, :3].astype(np.int64)
+    keys = ymd[:, 0] * 10000 + ymd[:, 1] * 100 + ymd[:, 2]
+    return [
+        (f"{k // 10000:04d}-{k // 100 % 100:02d}-{k % 100:02d}", v)
+        for k, v in zip(keys.tolist(), arr[:, 3].tolist())
+    ]
+
+
+def _load_fetch_state(db, source: str) -> dict | None:
+    c = db.cursor()
+    c.execute(
+        "SELECT etag, last_modified, content_length, last_date FROM co2_fetch_state WHERE source = ?;",
+        (source,),
+    )
+    row = c.fetchone()
+    return dict(row) if row else None
+
+
+def _save_fetch_state(db, source: str, *, etag: str | None, last_modified: str | None, content_length: int | None, last_date: str | None) -> None:
+    db.execute(
+        """
+        INSERT INTO co2_fetch_state(source, etag, last_modified, content_length, last_date, updated_at)
+        VALUES(?, ?, ?, ?, ?, ?)
+        ON CONFLICT(source) DO UPDATE SET
+          etag=excluded.etag,
+          last_modified=excluded.last_modified,
+          content_length=excluded.content_length,
+          last_date=excluded.last_date,
+          updated_at=excluded.updated_at;
+        """,
+        (source, etag, last_modified, content_length, last_date, datetime.now(timezone.utc).isoformat()),
+    )
 
 
-def fetch_latest_co2_points(limit: int = 7) -> list[Co2Point]:
-    url = _co2_source_url()
+def _is_local_source(source: str) -> bool:
+    return source.startswith("file://") or "://" not in source
+
+
+def _tail_start(content_length: int) -> int:
+    """增量读取的起始字节：上次长度往回退 _CO2_REVISION_DAYS 行（再多退 1 字节用来对齐行边界）。"""
+    return max(0, content_length - 1 - _CO2_REVISION_DAYS * _CO2_LINE_MAX_BYTES)
+
+
+def _read_local_source(source: str, state: dict | None, full: bool) -> tuple[str, str, dict]:
+    """本地文件源（开发/测试用的 NOAA 样例文件）：用 mtime 当 Last-Modified，按偏移只读末尾部分。"""
+    path = source[len("file://"):] if source.startswith("file://") else source
+    st = os.stat(path)
+    meta = {"etag": None, "last_modified": str(int(st.st_mtime)), "content_length": st.st_size}
+    if not full and state:
+        if state.get("last_modified") == meta["last_modified"] and state.get("content_length") == st.st_size:
+            return "unchanged", "", meta
+        offset = int(state.get("content_length") or 0)
+        if 0 < offset <= st.st_size:
+            start = _tail_start(offset)
+            with open(path, "rb") as f:
+                f.seek(start)
+                return "partial", _drop_partial_line(f.read(), start), meta
+    with open(path, "rb") as f:
+        return "full", f.read().decode("utf-8", errors="ignore"), meta
+
+
+def _drop_partial_line(tail: bytes, start: int) -> str:
+    # 从行中间开始读时丢掉残缺的第一行；首字节是换行说明正好落在行边界
+    text = tail.decode("utf-8", errors="ignore")
+    if start == 0:
+        return text
+    if text.startswith("\n"):
+        return text[1:]
+    nl = text.find("\n")
+    return text[nl + 1:] if nl >= 0 else ""
+
+
+def _fetch_source(source: str, state: dict | None, full: bool) -> tuple[str, str, dict]:
+    """返回 (status, text, meta)，status 为 unchanged / partial / full。"""
+    if _is_local_source(source):
+        return _read_local_source(source, state, full)
+    import httpx
+
+    headers = {"User-Agent": "GreenSphere/1.0"}
+    start = None
+    validator = None
+    if not full and state:
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+        # If-Range 只认强 ETag，弱 ETag 时退回 Last-Modified；都没有就不发 Range
+        etag = state.get("etag") or ""
+        validator = etag if etag and not etag.startswith("W/") else state.get("last_modified")
+        offset = int(state.get("content_length") or 0)
+        if offset > 0 and validator:
+            # 文件没变才给 206；变了（validator 对不上）服务器直接回 200 全量
+            start = _tail_start(offset)
+            headers["Range"] = f"bytes={start}-"
+            headers["If-Range"] = validator
     with httpx.Client(timeout=30.0, follow_redirects=True) as client:
-        r = client.get(url, headers={"User-Agent": "GreenSphere/1.0"})
-        r.raise_for_status()
-        text = r.text
-    all_points = _parse_noaa_daily_mlo(text)
-    if not all_points:
+        r = client.get(source, headers=headers)
+        if r.status_code == 416 or (r.status_code == 206 and not _same_range(r, start, validator)):
+            # 文件被截短 / 重写，或服务器不理 If-Range：不带任何条件全量重取
+            r = client.get(source, headers={"User-Agent": headers["User-Agent"]})
+            start = None
+    meta = {
+        "etag": r.headers.get("etag") or (state or {}).get("etag"),
+        "last_modified": r.headers.get("last-modified") or (state or {}).get("last_modified"),
+        "content_length": (state or {}).get("content_length"),
+    }
+    if r.status_code == 304:
+        return "unchanged", "", meta
+    r.raise_for_status()
+    if r.status_code == 206:
+        total = (r.headers.get("content-range") or "").rsplit("/", 1)[-1]
+        meta["content_length"] = int(total) if total.isdigit() else start + len(r.content)
+        return "partial", _drop_partial_line(r.content, start), meta
+    meta["content_length"] = len(r.content)
+    return "full", r.text, meta
+
+
+def _same_range(r, start: int | None, validator: str | None) -> bool:
+    """206 是否就是按 If-Range 给的那一段：起点对得上，且响应的 ETag / Last-Modified 和本地记录的一致。"""
+    if start is None:
+        return False
+    content_range = r.headers.get("content-range") or ""
+    if not content_range.startswith(f"bytes {start}-"):
+        return False
+    current = r.headers.get("etag") if validator and validator.startswith('"') else r.headers.get("last-modified")
+    return current is None or current == validator
+
+
+def _diff_against_db(db, rows: list[tuple[str, float]], since: str | None) -> list[tuple[str, float]]:
+    """只保留新日期或数值有变化的行（NOAA 会回修最近几周的数据）。"""
+    if since:
+        rows = [r for r in rows if r[0] >= since]
+    if not rows:
         return []
-    return all_points[-limit:]
+    c = db.cursor()
+    c.execute("SELECT date, value FROM co2_daily WHERE date >= ?;", (rows[0][0],))
+    existing = {r["date"]: float(r["value"]) for r in c.fetchall()}
+    return [r for r in rows if existing.get(r[0]) is None or abs(existing[r[0]] - r[1]) > 1e-9]
 
 
-def upsert_points_to_db(points: list[Co2Point], source: str) -> int:
-    if not points:
+def _refresh_aggregates(db, since_date: str) -> None:
+    now = datetime.now(timezone.utc).isoformat()
+    db.execute(
+        """
+        INSERT INTO co2_monthly(month, avg_value, min_value, max_value, days, updated_at)
+        SELECT substr(date, 1, 7), AVG(value), MIN(value), MAX(value), COUNT(*), ?
+        FROM co2_daily
+        WHERE date >= ?
+        GROUP BY substr(date, 1, 7)
+        ON CONFLICT(month) DO UPDATE SET
+          avg_value=excluded.avg_value,
+          min_value=excluded.min_value,
+          max_value=excluded.max_value,
+          days=excluded.days,
+          updated_at=excluded.updated_at;
+        """,
+        (now, since_date[:7] + "-01"),
+    )
+    db.execute(
+        """
+        INSERT INTO co2_yearly(year, avg_value, min_value, max_value, days, updated_at)
+        SELECT substr(date, 1, 4), AVG(value), MIN(value), MAX(value), COUNT(*), ?
+        FROM co2_daily
+        WHERE date >= ?
+        GROUP BY substr(date, 1, 4)
+        ON CONFLICT(year) DO UPDATE SET
+          avg_value=excluded.avg_value,
+          min_value=excluded.min_value,
+          max_value=excluded.max_value,
+          days=excluded.days,
+          updated_at=excluded.updated_at;
+        """,
+        (now, since_date[:4] + "-01-01"),
+    )
+
+
+def upsert_points_to_db(db, rows: list[tuple[str, float]], source: str) -> int:
+    if not rows:
         return 0
+    fetched_at = datetime.now(timezone.utc).isoformat()
+    db.executemany(
+        """
+        INSERT INTO co2_daily(date, value, source, fetched_at_utc)
+        VALUES(?, ?, ?, ?)
+        ON CONFLICT(date) DO UPDATE SET
+          value=excluded.value,
+          source=excluded.source,
+          fetched_at_utc=excluded.fetched_at_utc;
+        """,
+        [(d, v, source, fetched_at) for d, v in rows],
+    )
+    bump_cache_version(db, CO2_CACHE_NAME)
+    return len(rows)
+
+
+def ingest_co2_history(full: bool = False) -> dict:
+    """把 NOAA 日数据增量写入 co2_daily，并刷新月/年聚合表。
+
+    - 首次运行（无 co2_fetch_state 记录）或 full=True 时全量回填；
+    - 之后用 ETag / Last-Modified 条件请求，未变化直接跳过；
+    - 带 Range + If-Range 只下载末尾（上次长度往回 _CO2_REVISION_DAYS 行起）；validator 变了、
+      416 或服务器不支持 Range 时全量下载；
+    - 两种情况都只比对最近 _CO2_REVISION_DAYS 天内的行，仅写入新增或被回修的点。
+    """
+    source = _co2_source_url()
     gen = get_db()
     db = next(gen)
     try:
-        c = db.cursor()
-        fetched_at = datetime.now(timezone.utc).isoformat()
-        inserted = 0
-        for p in points:
-            c.execute(
-                """
-                INSERT INTO co2_daily(date, value, source, fetched_at_utc)
-                VALUES(?, ?, ?, ?)
-                ON CONFLICT(date) DO UPDATE SET
-                  value=excluded.value,
-                  source=excluded.source,
-                  fetched_at_utc=excluded.fetched_at_utc;
-                """,
-                (p.date, p.value, source, fetched_at),
-            )
-            inserted += 1
+        state = _load_fetch_state(db, source)
+        full = full or state is None
+        status, text, meta = _fetch_source(source, state, full)
+        if status == "unchanged":
+            return {"status": status, "written": 0, "source": source}
+        if status == "full" and full:
+            rows = _parse_noaa_daily_mlo_numpy(text)
+        else:
+            rows = _parse_noaa_daily_mlo(text)
+        since = None
+        if not full and state and state.get("last_date"):
+            since = (date.fromisoformat(state["last_date"]) - timedelta(days=_CO2_REVISION_DAYS)).isoformat()
+        changed = _diff_against_db(db, rows, since)
+        written = upsert_points_to_db(db, changed, source)
+        if changed:
+            _refresh_aggregates(db, changed[0][0])
+        last_date = (state or {}).get("last_date")
+        if rows and (last_date is None or rows[-1][0] > last_date):
+            last_date = rows[-1][0]
+        _save_fetch_state(
+            db,
+            source,
+            etag=meta.get("etag"),
+            last_modified=meta.get("last_modified"),
+            content_length=meta.get("content_length"),
+            last_date=last_date,
+        )
         db.commit()
-        return inserted
+        return {"status": status, "written": written, "parsed": len(rows), "source": source}
     finally:
         gen.close()
 
 
-def update_co2_db(limit: int = 7) -> list[Co2Point]:
-    source = _co2_source_url()
-    points = fetch_latest_co2_points(limit=limit)
-    inserted = upsert_points_to_db(points, source)
+def update_co2_db(full: bool = False) -> dict:
+    result = ingest_co2_history(full=full)
+    if result.get("written"):
+        refresh_trend_cache()
+    return result
+
+
+def list_co2_aggregates(period: str = "month", limit: int = 120) -> list[dict]:
+    table, key = ("co2_yearly", "year") if period == "year" else ("co2_monthly", "month")
+    gen = get_db()
+    db = next(gen)
     try:
-        gen = get_db()
-        db = next(gen)
-        log_system_event(db, level="info", event="co2_fetch", message=f"inserted={inserted} total={len(points)} source={source}")
+        c = db.cursor()
+        c.execute(
+            f"""
+            SELECT {key} AS period, avg_value, min_value, max_value, days
+            FROM {table}
+            ORDER BY {key} DESC
+            LIMIT ?;
+            """,
+            (int(limit),),
+        )
+        return list(reversed([dict(r) for r in c.fetchall()]))
+    finally:
         gen.close()
-    except Exception:
-        pass
-    return points
 
 
 def get_latest_points_from_db(limit: int = 7) -> list[Co2Point]:
@@ -114,8 +369,81 @@ def get_co2_points_from_db() -> list[Co2Point]:
     return get_latest_points_from_db(limit=7)
 
 
-def render_trend_svg(points: list[Co2Point]) -> str:
-    title = "近 7 天大气 CO₂ 趋势（NOAA GML · MLO Daily）"
+def _downsample(points: list[Co2Point], max_points: int = _TREND_MAX_POINTS) -> list[Co2Point]:
+    """按固定桶宽求均值降采样；桶从最新一天往前切，保证最后一个点对齐最新日期。"""
+    if len(points) <= max_points:
+        return points
+    size = math.ceil(len(points) / max_points)
+    out: list[Co2Point] = []
+    end = len(points)
+    while end > 0:
+        bucket = points[max(0, end - size):end]
+        out.append(Co2Point(date=bucket[-1].date, value=sum(p.value for p in bucket) / len(bucket)))
+        end -= size
+    out.reverse()
+    return out
+
+
+def _co2_data_version() -> int:
+    gen = get_db()
+    db = next(gen)
+    try:
+        return get_cache_version(db, CO2_CACHE_NAME)
+    finally:
+        gen.close()
+
+
+def _build_trend_svg(points: list[Co2Point], days: int) -> TrendSvg:
+    svg = render_trend_svg(points, days=days).encode("utf-8")
+    # 对整张图取摘要：区间内任何一个点被回修都会换 ETag，各 worker 对同一份数据算出的 ETag 也一致
+    digest = hashlib.sha1(svg).hexdigest()[:16]
+    return TrendSvg(
+        etag=f'"co2-{days}-{digest}"',
+        etag_gz=f'"co2-{days}-{digest}-gz"',
+        svg=svg,
+        svg_gz=gzip.compress(svg, compresslevel=9, mtime=0),
+    )
+
+
+def refresh_trend_cache() -> None:
+    """从 co2_daily 读取一次最长区间，预渲染所有区间的 SVG（含 gzip 版本）。"""
+    global _trend_version, _trend_checked_at
+    # 先读版本再读数据：中间有写入的话版本已经落后，下次检查会再刷新
+    version = _co2_data_version()
+    latest = get_latest_points_from_db(limit=max(TREND_RANGES))
+    cache = {days: _build_trend_svg(_downsample(latest[-days:]), days) for days in TREND_RANGES}
+    with _trend_lock:
+        _trend_cache.clear()
+        _trend_cache.update(cache)
+        _trend_version = version
+        _trend_checked_at = time.monotonic()
+
+
+def get_trend_svg(days: int = 7) -> TrendSvg:
+    """返回预渲染的趋势图。
+
+    正常情况下缓存由 update_co2_db 写库后刷新；其他 worker 写库时，
+    本进程最多每 _TREND_RECHECK_SECONDS 秒查一次 co2_daily 的数据版本（cache_versions 主键读），
+    回修旧点也会让版本变化。
+    """
+    global _trend_checked_at
+    with _trend_lock:
+        cached = _trend_cache.get(days)
+        stale = time.monotonic() - _trend_checked_at > _TREND_RECHECK_SECONDS
+        known_version = _trend_version
+    if cached is not None and not stale:
+        return cached
+    if cached is not None and _co2_data_version() == known_version:
+        with _trend_lock:
+            _trend_checked_at = time.monotonic()
+        return cached
+    refresh_trend_cache()
+    with _trend_lock:
+        return _trend_cache[days]
+
+
+def render_trend_svg(points: list[Co2Point], days: int = 7) -> str:
+    title = f"近 {days} 天大气 CO₂ 趋势（NOAA GML · MLO Daily）"
     if not points:
         w, h = 980, 380
         return f"""<svg xmlns="http://www.w3.org/2000/svg" width="{w}" height="{h}" viewBox="0 0 {w} {h}">
@@ -179,19 +507,21 @@ def render_trend_svg(points: list[Co2Point]) -> str:
             f'<text x="{pad_l - 10}" y="{yy + 4:.2f}" text-anchor="end" font-family="system-ui, -apple-system, Segoe UI, sans-serif" font-size="11" fill="rgba(231,245,239,0.70)">{vv:.2f}</text>'
         )
 
+    label_step = max(2, math.ceil(len(points) / 8))
     x_labels = []
     for i, p in enumerate(points):
-        if i in (0, len(points) - 1) or len(points) <= 5 or i % 2 == 0:
-            label = p.date[5:]
+        if i in (0, len(points) - 1) or len(points) <= 5 or i % label_step == 0:
+            label = p.date[5:] if days <= 31 else p.date[:7]
             x_labels.append(
                 f'<text x="{x(i):.2f}" y="{pad_t + plot_h + 28:.2f}" text-anchor="middle" font-family="system-ui, -apple-system, Segoe UI, sans-serif" font-size="11" fill="rgba(231,245,239,0.70)">{label}</text>'
             )
 
+    dot_r = 4.2 if len(points) <= 31 else 2.2
     dots = []
     for i, p in enumerate(points):
         px, py = pts_xy[i]
         dots.append(
-            f'<circle cx="{px:.2f}" cy="{py:.2f}" r="4.2" fill="rgba(56,242,198,0.92)"><title>{p.date} · {p.value:.2f} ppm</title></circle>'
+            f'<circle cx="{px:.2f}" cy="{py:.2f}" r="{dot_r}" fill="rgba(56,242,198,0.92)"><title>{p.date} · {p.value:.2f} ppm</title></circle>'
         )
 
     return f"""<svg xmlns="http://www.w3.org/2000/svg" width="{w}" height="{h}" viewBox="0 0 {w} {h}">
@@ -0,0 +1,307 @@
+"""企业碳账本汇总。
+
+company_carbon_monthly 每个 (company_id, month_start) 一行，记当月的 scope1/2/3 排放和抵消量：
+- 排放记录覆盖 period_start..period_end（含两端），按天数比例摊到涉及的每个月；
+  多条记录时间段重叠时各自摊、相加
+- 抵消按 purchased_at 落在当月
+create_emission / create_offset 在同一事务里增量更新；老数据或修数用 rebuild_company_rollups 全量重算。
+查询按月 / 季 / 年 / 总计合并月行，时间范围按月对齐（start 取所在月，end 含所在月）。
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from typing import Iterable
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.models.company_carbon import CompanyCarbonMonthly, CompanyEmission, CompanyOffset
+
+GRANULARITIES = ("month", "quarter", "year", "total")
+SCOPES = (1, 2, 3)
+_REBUILD_BATCH = 5000
+
+# 月行里各列的顺序：scope1, scope2, scope3, offsets
+_Amounts = tuple[float, float, float, float]
+
+
+def month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def next_month(d: date) -> date:
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def prorate_by_month(start: date, end: date) -> list[tuple[date, float]]:
+    """[start, end] 按天数拆到各月：[(月初, 占比)]，占比之和为 1。"""
+    total_days = (end - start).days + 1
+    out = []
+    m = month_start(start)
+    while m <= end:
+        nm = next_month(m)
+        days = (min(end, nm - timedelta(days=1)) - max(start, m)).days + 1
+        out.append((m, days / total_days))
+        m = nm
+    return out
+
+
+def _emission_amounts(
+    start: date, end: date, scope1: float | None, scope2: float | None, scope3: float | None
+) -> dict[date, _Amounts]:
+    s1, s2, s3 = float(scope1 or 0), float(scope2 or 0), float(scope3 or 0)
+    return {m: (s1 * f, s2 * f, s3 * f, 0.0) for m, f in prorate_by_month(start, end)}
+
+
+def _apply(db: Session, company_id: int, amounts: dict[date, _Amounts]) -> None:
+    """把 amounts 加到 (company_id, 月) 行上（不 commit）。"""
+    if not amounts:
+        return
+    rows = db.execute(
+        select(CompanyCarbonMonthly).where(
+            CompanyCarbonMonthly.company_id == int(company_id),
+            CompanyCarbonMonthly.month_start.in_(list(amounts)),
+        )
+    ).scalars()
+    existing = {r.month_start: r for r in rows}
+    now = datetime.utcnow()
+    for m, (s1, s2, s3, off) in amounts.items():
+        r = existing.get(m)
+        if r is None:
+            db.add(
+                CompanyCarbonMonthly(
+                    company_id=int(company_id),
+                    month_start=m,
+                    scope1_tco2e=s1,
+                    scope2_tco2e=s2,
+                    scope3_tco2e=s3,
+                    offsets_tco2e=off,
+                    updated_at=now,
+                )
+            )
+            continue
+        r.scope1_tco2e += s1
+        r.scope2_tco2e += s2
+        r.scope3_tco2e += s3
+        r.offsets_tco2e += off
+        r.updated_at = now
+
+
+def apply_emission(db: Session, e: CompanyEmission) -> None:
+    amounts = _emission_amounts(e.period_start, e.period_end, e.scope1_tco2e, e.scope2_tco2e, e.scope3_tco2e)
+    _apply(db, e.company_id, amounts)
+
+
+def apply_offset(db: Session, o: CompanyOffset) -> None:
+    _apply(db, o.company_id, {month_start(o.purchased_at): (0.0, 0.0, 0.0, float(o.amount_tco2e or 0))})
+
+
+def rebuild_company_rollups(db: Session, company_id: int | None = None) -> int:
+    """用原始排放 / 抵消记录重算月汇总（升级或修数时用），返回写入的行数。"""
+    acc: dict[tuple[int, date], list[float]] = {}
+
+    def add(cid: int, amounts: dict[date, _Amounts]) -> None:
+        for m, vals in amounts.items():
+            cur = acc.get((cid, m))
+            if cur is None:
+                acc[(cid, m)] = list(vals)
+            else:
+                for i, v in enumerate(vals):
+                    cur[i] += v
+
+    q = select(
+        CompanyEmission.company_id,
+        CompanyEmission.period_start,
+        CompanyEmission.period_end,
+        CompanyEmission.scope1_tco2e,
+        CompanyEmission.scope2_tco2e,
+        CompanyEmission.scope3_tco2e,
+    )
+    if company_id is not None:
+        q = q.where(CompanyEmission.company_id == int(company_id))
+    for cid, start, end, s1, s2, s3 in db.execute(q.execution_options(yield_per=_REBUILD_BATCH)):
+        add(cid, _emission_amounts(start, end, s1, s2, s3))
+
+    q = select(CompanyOffset.company_id, CompanyOffset.purchased_at, CompanyOffset.amount_tco2e)
+    if company_id is not None:
+        q = q.where(CompanyOffset.company_id == int(company_id))
+    for cid, purchased_at, amount in db.execute(q.execution_options(yield_per=_REBUILD_BATCH)):
+        add(cid, {month_start(purchased_at): (0.0, 0.0, 0.0, float(amount or 0))})
+
+    d = delete(CompanyCarbonMonthly)
+    if company_id is not None:
+        d = d.where(CompanyCarbonMonthly.company_id == int(company_id))
+    db.execute(d)
+    now = datetime.utcnow()
+    batch = []
+    for (cid, m), (s1, s2, s3, off) in acc.items():
+        batch.append(
+            {
+                "company_id": cid,
+                "month_start": m,
+                "scope1_tco2e": s1,
+                "scope2_tco2e": s2,
+                "scope3_tco2e": s3,
+                "offsets_tco2e": off,
+                "updated_at": now,
+            }
+        )
+        if len(batch) >= _REBUILD_BATCH:
+            db.execute(insert(CompanyCarbonMonthly), batch)
+            batch = []
+    if batch:
+        db.execute(insert(CompanyCarbonMonthly), batch)
+    db.commit()
+    return len(acc)
+
+
+def ensure_company_carbon_schema(bind) -> None:
+    """老库补排放 / 抵消表的复合索引；汇总表是新建的（还空着）而原始记录已有数据时，全量重算一次。"""
+    from app.core.database import SessionLocal, add_missing_indexes
+
+    add_missing_indexes(bind, CompanyEmission.__tablename__, CompanyOffset.__tablename__)
+    db = SessionLocal()
+    try:
+        if db.execute(select(CompanyCarbonMonthly.company_id).limit(1)).first() is not None:
+            return
+        has_raw = (
+            db.execute(select(CompanyEmission.id).limit(1)).first() is not None
+            or db.execute(select(CompanyOffset.id).limit(1)).first() is not None
+        )
+        if has_raw:
+            rebuild_company_rollups(db)
+    finally:
+        db.close()
+
+
+def parse_scopes(raw: str | None) -> tuple[int, ...]:
+    """"1,2" -> (1, 2)；空表示全部。非法值抛 ValueError。"""
+    if not raw or not raw.strip():
+        return SCOPES
+    out = sorted({int(x) for x in raw.split(",") if x.strip()})
+    if not out or any(s not in SCOPES for s in out):
+        raise ValueError("scopes must be a subset of 1,2,3")
+    return tuple(out)
+
+
+def period_of(m: date, granularity: str) -> tuple[str, date, date]:
+    """月初 -> (期间标识, 期间首日, 期间末日)。"""
+    if granularity == "month":
+        return f"{m.year}-{m.month:02d}", m, next_month(m) - timedelta(days=1)
+    if granularity == "quarter":
+        q = (m.month - 1) // 3
+        start = date(m.year, q * 3 + 1, 1)
+        end = next_month(next_month(next_month(start))) - timedelta(days=1)
+        return f"{m.year}-Q{q + 1}", start, end
+    if granularity == "year":
+        return str(m.year), date(m.year, 1, 1), date(m.year, 12, 31)
+    return "total", m, m
+
+
+def _row(scopes: Iterable[int], s1: float, s2: float, s3: float, off: float) -> dict:
+    by_scope = {1: float(s1 or 0), 2: float(s2 or 0), 3: float(s3 or 0)}
+    gross = sum(by_scope[s] for s in scopes)
+    off = float(off or 0)
+    return {
+        "scope1_tco2e": by_scope[1],
+        "scope2_tco2e": by_scope[2],
+        "scope3_tco2e": by_scope[3],
+        "gross_tco2e": gross,
+        "offsets_tco2e": off,
+        "net_tco2e": gross - off,
+    }
+
+
+def _month_filter(q, start: date | None, end: date | None):
+    if start is not None:
+        q = q.where(CompanyCarbonMonthly.month_start >= month_start(start))
+    if end is not None:
+        q = q.where(CompanyCarbonMonthly.month_start <= month_start(end))
+    return q
+
+
+def carbon_periods(
+    db: Session,
+    *,
+    company_id: int | None = None,
+    granularity: str = "quarter",
+    start: date | None = None,
+    end: date | None = None,
+    scopes: tuple[int, ...] = SCOPES,
+) -> dict:
+    """某个企业（company_id=None 时所有企业合计）按期间的 gross / offsets / net。"""
+    t = CompanyCarbonMonthly
+    q = select(
+        t.month_start,
+        func.sum(t.scope1_tco2e),
+        func.sum(t.scope2_tco2e),
+        func.sum(t.scope3_tco2e),
+        func.sum(t.offsets_tco2e),
+    ).group_by(t.month_start)
+    if company_id is not None:
+        q = q.where(t.company_id == int(company_id))
+    q = _month_filter(q, start, end).order_by(t.month_start)
+
+    buckets: dict[str, list] = {}
+    total = [0.0, 0.0, 0.0, 0.0]
+    first = last = None
+    for m, s1, s2, s3, off in db.execute(q):
+        first = first or m
+        last = m
+        key, p_start, p_end = period_of(m, granularity)
+        b = buckets.get(key)
+        if b is None:
+            b = buckets[key] = [p_start, p_end, 0.0, 0.0, 0.0, 0.0]
+        for i, v in enumerate((s1, s2, s3, off)):
+            b[2 + i] += float(v or 0)
+            total[i] += float(v or 0)
+
+    if granularity == "total":
+        periods = []
+        if first is not None:
+            periods.append(
+                {
+                    "period": "total",
+                    "period_start": first,
+                    "period_end": next_month(last) - timedelta(days=1),
+                    **_row(scopes, *total),
+                }
+            )
+    else:
+        periods = [
+            {"period": key, "period_start": b[0], "period_end": b[1], **_row(scopes, *b[2:])} for key, b in buckets.items()
+        ]
+    return {
+        "company_id": company_id,
+        "granularity": granularity,
+        "scopes": list(scopes),
+        "periods": periods,
+        "totals": _row(scopes, *total),
+    }
+
+
+def carbon_by_company(
+    db: Session,
+    *,
+    start: date | None = None,
+    end: date | None = None,
+    scopes: tuple[int, ...] = SCOPES,
+    order: str = "net",
+    limit: int = 100,
+) -> list[dict]:
+    """时间范围内各企业的合计，按 net / gross / offsets 倒序取前 limit 个。"""
+    t = CompanyCarbonMonthly
+    scope_cols = {1: t.scope1_tco2e, 2: t.scope2_tco2e, 3: t.scope3_tco2e}
+    gross = func.sum(sum(scope_cols[s] for s in scopes))
+    offsets = func.sum(t.offsets_tco2e)
+    sort = {"gross": gross, "offsets": offsets}.get(order, gross - offsets)
+    q = select(
+        t.company_id,
+        func.sum(t.scope1_tco2e),
+        func.sum(t.scope2_tco2e),
+        func.sum(t.scope3_tco2e),
+        offsets,
+    ).group_by(t.company_id)
+    q = _month_filter(q, start, end).order_by(sort.desc(), t.company_id).limit(int(limit))
+    return [{"company_id": cid, **_row(scopes, s1, s2, s3, off)} for cid, s1, s2, s3, off in db.execute(q)]
@@ -0,0 +1,141 @@
+"""流式导出：CSV / NDJSON，可选 gzip。
+
+行数据来自服务端游标（sqlite3 fetchmany / SQLAlchemy yield_per），按批编码后直接写给客户端，
+内存占用只和批大小有关，与表大小无关。
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import zlib
+from datetime import date, datetime
+from io import StringIO
+from typing import Any, Callable, Iterable, Iterator, Sequence
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from gs_db import get_db
+
+
+# text/* 的 charset 由 starlette 自动补上
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson; charset=utf-8"}
+BATCH_SIZE = 1000
+_GZIP_FLUSH_BYTES = 64 * 1024
+
+
+def _cell(v: Any) -> Any:
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    return v
+
+
+def iter_sqlite_rows(sql: str, params: Sequence[Any] = (), *, batch_size: int = BATCH_SIZE) -> Iterator[list[tuple]]:
+    """自己开一条行为库连接逐批读取；生成器关闭时连接随之关闭。"""
+    gen = get_db()
+    db = next(gen)
+    try:
+        c = db.cursor()
+        c.row_factory = None
+        c.execute(sql, tuple(params))
+        while True:
+            batch = c.fetchmany(batch_size)
+            if not batch:
+                break
+            yield batch
+    finally:
+        gen.close()
+
+
+def iter_orm_rows(make_stmt: Callable[[], Any], *, batch_size: int = BATCH_SIZE) -> Iterator[list[tuple]]:
+    """SQLAlchemy 版：独立 Session + yield_per（支持的驱动上会用服务端游标）。"""
+    from app.core.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        result = session.execute(make_stmt().execution_options(yield_per=batch_size, stream_results=True))
+        for part in result.partitions(batch_size):
+            yield [tuple(r) for r in part]
+    finally:
+        session.close()
+
+
+def encode_csv(header: Sequence[str], batches: Iterable[list[tuple]]) -> Iterator[str]:
+    buf = StringIO()
+    w = csv.writer(buf)
+    w.writerow(header)
+    yield buf.getvalue()
+    for batch in batches:
+        buf.seek(0)
+        buf.truncate(0)
+        w.writerows([[_cell(v) for v in row] for row in batch])
+        yield buf.getvalue()
+
+
+def encode_ndjson(header: Sequence[str], batches: Iterable[list[tuple]]) -> Iterator[str]:
+    keys = list(header)
+    for batch in batches:
+        yield "".join(
+            json.dumps(dict(zip(keys, (_cell(v) for v in row))), ensure_ascii=False, default=str) + "\n" for row in batch
+        )
+
+
+def gzip_stream(chunks: Iterable[str], *, level: int = 6) -> Iterator[bytes]:
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)
+    pending = 0
+    out: list[bytes] = []
+    for chunk in chunks:
+        data = z.compress(chunk.encode("utf-8"))
+        if data:
+            out.append(data)
+            pending += len(data)
+        if pending >= _GZIP_FLUSH_BYTES:
+            yield b"".join(out)
+            out, pending = [], 0
+    out.append(z.flush())
+    yield b"".join(out)
+
+
+def _utf8(chunks: Iterable[str]) -> Iterator[bytes]:
+    for chunk in chunks:
+        if chunk:
+            yield chunk.encode("utf-8")
+
+
+def parse_date_range(start: str | None, end: str | None) -> tuple[date | None, date | None]:
+    try:
+        s = date.fromisoformat(start) if start else None
+        e = date.fromisoformat(end) if end else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start/end must be YYYY-MM-DD")
+    if s and e and s > e:
+        raise HTTPException(status_code=400, detail="start must be <= end")
+    return s, e
+
+
+def export_response(
+    header: Sequence[str],
+    batches: Iterable[list[tuple]],
+    *,
+    fmt: str,
+    filename: str,
+    gzip: bool = False,
+) -> StreamingResponse:
+    """按格式编码并返回 StreamingResponse；gzip=True 时下载 .gz 文件。"""
+    fmt = (fmt or "csv").lower()
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    chunks = encode_csv(header, batches) if fmt == "csv" else encode_ndjson(header, batches)
+    name = f"{filename}.{fmt}"
+    if gzip:
+        return StreamingResponse(
+            gzip_stream(chunks),
+            media_type="application/gzip",
+            headers={"Content-Disposition": f'attachment; filename="{name}.gz"'},
+        )
+    return StreamingResponse(
+        _utf8(chunks),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}"'},
+    )
@@ -1,5 +1,4 @@
 import os
-import requests
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -28,6 +27,8 @@ def notify_monitor(message: str):
     }
 
     try:
+        import requests  # 只在真正发通知时导入
+
         requests.post(TELEGRAM_API, json=payload, timeout=5)
     except Exception as e:
         print("Telegram notify failed:", e)
\ No newline at end of file
@@ -1,13 +1,13 @@
+import asyncio
 import os
 import sqlite3
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from email.utils import parsedate_to_datetime
 from typing import Iterable
 from xml.etree import ElementTree as ET
 
-import requests
-
 
 @dataclass(frozen=True)
 class NewsItem:
@@ -65,50 +65,183 @@ def default_rss_urls() -> list[str]:
     ]
 
 
-def fetch_top_news_items() -> list[NewsItem]:
-    urls = default_rss_urls()
-    all_items: list[NewsItem] = []
-    for url in urls:
-        r = requests.get(url, timeout=15, headers={"User-Agent": "GreenSphereBot/1.0 (+https://greensphere.earth)"})
-        r.raise_for_status()
-        all_items.extend(parse_rss(r.text, source_name="rss"))
+def _env_int(name: str, default: int) -> int:
+    try:
+        v = int((os.getenv(name) or "").strip() or default)
+        return v if v > 0 else default
+    except Exception:
+        return default
+
+
+@dataclass
+class FeedResult:
+    url: str
+    status: int = 0
+    items: list[NewsItem] = field(default_factory=list)
+    elapsed_ms: int = 0
+    etag: str | None = None
+    last_modified: str | None = None
+    error: str | None = None
+
+
+def _load_feed_validators(conn: sqlite3.Connection, urls: list[str]) -> dict[str, dict]:
+    if not urls:
+        return {}
+    c = conn.cursor()
+    placeholders = ",".join(["?"] * len(urls))
+    c.execute(f"SELECT url, etag, last_modified FROM news_feeds WHERE url IN ({placeholders});", urls)
+    return {r["url"]: dict(r) for r in c.fetchall()}
+
 
+async def _fetch_feed(client, sem: asyncio.Semaphore, url: str, validators: dict, *, timeout: float, max_items: int) -> FeedResult:
+    res = FeedResult(url=url, etag=validators.get("etag"), last_modified=validators.get("last_modified"))
+    headers = {"User-Agent": "GreenSphereBot/1.0 (+https://greensphere.earth)"}
+    if res.etag:
+        headers["If-None-Match"] = res.etag
+    if res.last_modified:
+        headers["If-Modified-Since"] = res.last_modified
+
+    async def _run() -> None:
+        async with client.stream("GET", url, headers=headers) as r:
+            res.status = r.status_code
+            if r.status_code == 304:
+                return
+            r.raise_for_status()
+            # 边读边解析，item 读完就从父节点（channel）上摘掉，大 feed 也只占用常数内存；
+            # 用 start / end 维护当前路径，才知道 item 挂在哪个节点下
+            parser = ET.XMLPullParser(events=("start", "end"))
+            path: list[ET.Element] = []
+            async for chunk in r.aiter_bytes():
+                parser.feed(chunk)
+                for event, elem in parser.read_events():
+                    if event == "start":
+                        path.append(elem)
+                        continue
+                    path.pop()
+                    if elem.tag != "item":
+                        continue
+                    title = _safe_text(elem.find("title"))
+                    link = _safe_text(elem.find("link"))
+                    pub = _parse_pub_date(_safe_text(elem.find("pubDate")))
+                    if path:
+                        path[-1].remove(elem)
+                    if title and link:
+                        res.items.append(NewsItem(title=title, url=link, source="rss", published_at=pub))
+                if len(res.items) >= max_items:
+                    break
+            # 只有完整解析成功才更新校验值，否则下次仍会全量重拉
+            res.etag = r.headers.get("etag")
+            res.last_modified = r.headers.get("last-modified")
+
+    t0 = time.perf_counter()
+    async with sem:
+        try:
+            await asyncio.wait_for(_run(), timeout=timeout)
+        except asyncio.TimeoutError:
+            res.error = f"timeout after {timeout:g}s"
+        except Exception as e:
+            res.error = str(e)[:255] or e.__class__.__name__
+    res.elapsed_ms = int((time.perf_counter() - t0) * 1000)
+    res.items = res.items[:max_items]
+    return res
+
+
+async def _fetch_feeds(urls: list[str], validators: dict[str, dict]) -> list[FeedResult]:
+    import httpx
+
+    sem = asyncio.Semaphore(_env_int("GS_NEWS_FETCH_CONCURRENCY", 4))
+    timeout = float(_env_int("GS_NEWS_FEED_TIMEOUT_SECONDS", 15))
+    max_items = _env_int("GS_NEWS_MAX_ITEMS_PER_FEED", 50)
+    async with httpx.AsyncClient(follow_redirects=True, timeout=timeout) as client:
+        return await asyncio.gather(
+            *[_fetch_feed(client, sem, url, validators.get(url) or {}, timeout=timeout, max_items=max_items) for url in urls]
+        )
+
+
+def _top_items(results: Iterable[FeedResult], limit: int = 10) -> list[NewsItem]:
     seen: set[str] = set()
     unique: list[NewsItem] = []
-    for it in all_items:
-        if it.url in seen:
-            continue
-        seen.add(it.url)
-        unique.append(it)
+    for res in results:
+        for it in res.items:
+            if it.url in seen:
+                continue
+            seen.add(it.url)
+            unique.append(it)
 
     def sort_key(x: NewsItem):
         return x.published_at or ""
 
     unique.sort(key=sort_key, reverse=True)
-    return unique[:10]
+    return unique[:limit]
 
 
-def upsert_news_items(conn: sqlite3.Connection, items: Iterable[NewsItem]) -> int:
+def fetch_feed_results(conn: sqlite3.Connection | None = None) -> list[FeedResult]:
+    """并发抓取所有 RSS 源；传入 conn 时带上上次保存的 ETag / Last-Modified。"""
+    urls = default_rss_urls()
+    validators = _load_feed_validators(conn, urls) if conn is not None else {}
+    return asyncio.run(_fetch_feeds(urls, validators))
+
+
+def fetch_top_news_items(conn: sqlite3.Connection | None = None) -> list[NewsItem]:
+    return _top_items(fetch_feed_results(conn))
+
+
+def _record_feed_results(conn: sqlite3.Connection, results: Iterable[FeedResult]) -> None:
     fetched_at = _now_iso()
-    c = conn.cursor()
-    inserted = 0
-    for it in items:
-        try:
-            c.execute(
-                """
-                INSERT OR IGNORE INTO news_items (title, url, source, published_at, fetched_at)
-                VALUES (?, ?, ?, ?, ?);
-                """,
-                (it.title, it.url, it.source, it.published_at, fetched_at),
-            )
-            if c.rowcount:
-                inserted += 1
-        except Exception:
-            continue
-    conn.commit()
+    conn.executemany(
+        """
+        INSERT INTO news_feeds (url, etag, last_modified, last_status, last_fetch_ms, last_item_count, last_error, last_fetched_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(url) DO UPDATE SET
+          etag=excluded.etag,
+          last_modified=excluded.last_modified,
+          last_status=excluded.last_status,
+          last_fetch_ms=excluded.last_fetch_ms,
+          last_item_count=excluded.last_item_count,
+          last_error=excluded.last_error,
+          last_fetched_at=excluded.last_fetched_at;
+        """,
+        [
+            (r.url, r.etag, r.last_modified, r.status, r.elapsed_ms, len(r.items), r.error, fetched_at)
+            for r in results
+        ],
+    )
+
+
+def upsert_news_items(conn: sqlite3.Connection, items: Iterable[NewsItem], *, commit: bool = True) -> int:
+    fetched_at = _now_iso()
+    before = conn.total_changes
+    conn.executemany(
+        """
+        INSERT INTO news_items (title, url, source, published_at, fetched_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT DO NOTHING;
+        """,
+        [(it.title, it.url, it.source, it.published_at, fetched_at) for it in items],
+    )
+    inserted = conn.total_changes - before
+    if commit:
+        conn.commit()
     return inserted
 
 
+def refresh_news(conn: sqlite3.Connection) -> dict:
+    """抓取 + 入库 + 记录每个源的耗时/条数，在同一个事务里提交。"""
+    results = fetch_feed_results(conn)
+    items = _top_items(results)
+    inserted = upsert_news_items(conn, items, commit=False)
+    _record_feed_results(conn, results)
+    conn.commit()
+    return {
+        "inserted": inserted,
+        "total": len(items),
+        "feeds": [
+            {"url": r.url, "status": r.status, "ms": r.elapsed_ms, "items": len(r.items), "error": r.error}
+            for r in results
+        ],
+    }
+
+
 def list_latest_news(conn: sqlite3.Connection, limit: int = 10) -> list[dict]:
     c = conn.cursor()
     c.execute(
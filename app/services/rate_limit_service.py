@@ -1,30 +1,35 @@
 from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
 from sqlalchemy.orm import Session
+
 from app.models.rate_limit import WaitlistRateLimit
+from gs_db import get_db
+from gs_rate_limiter import hit
+
+# 官网表单的限流走行为库的固定窗口计数（gs_rate_limiter），和 /api/* 共用一套；
+# waitlist_rate_limits 表只剩历史数据，由 rate_limit_prune 任务清掉。
+
+
+def allow_action(ip: str, action: str, limit: int = 3, minutes: int = 5) -> bool:
+    """记一次 ip 的 action，返回是否仍在 minutes 分钟窗口的限额内。"""
+    gen = get_db()
+    conn = next(gen)
+    try:
+        return hit(conn, ip=ip, key=f"site:{action}", limit=limit, window_seconds=int(minutes) * 60)
+    finally:
+        gen.close()
 
-def is_rate_limited(
-    db: Session,
-    ip: str,
-    action: str,
-    limit: int = 3,
-    minutes: int = 5
-) -> bool:
-    since = datetime.utcnow() - timedelta(minutes=minutes)
-    count = (
-        db.query(WaitlistRateLimit)
-        .filter(
-            WaitlistRateLimit.ip_address == ip,
-            WaitlistRateLimit.action == action,
-            WaitlistRateLimit.created_at >= since
-        )
-        .count()
-    )
 
-    return count >= limit
-def record_action(db: Session, ip: str, action: str):
-    record = WaitlistRateLimit(
-    ip_address=ip,
-    action=action
-    )
-    db.add(record)
-    db.commit()
\ No newline at end of file
+def prune_legacy_actions(db: Session, older_than_hours: int = 24, batch_size: int = 5000) -> int:
+    since = datetime.utcnow() - timedelta(hours=older_than_hours)
+    deleted = 0
+    while True:
+        ids = db.execute(
+            select(WaitlistRateLimit.id).where(WaitlistRateLimit.created_at < since).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return deleted
+        db.execute(delete(WaitlistRateLimit).where(WaitlistRateLimit.id.in_(ids)))
+        db.commit()
+        deleted += len(ids)
@@ -0,0 +1,96 @@
+"""Quest 连续天数（截至某天、含当天）的查询。
+
+两种实现，结果一致：
+- window：gaps-and-islands，一条 SQL 在库里算完。按倒序编号后，“日期序号 + 行号”在同一段连续日期里
+  是常数，数出和 today 同组的行即可。各方言只有“日期 -> 天序号”的写法不同。
+- scan：按 (telegram_id, submit_date) 索引倒序分批取日期，遇到第一个断档就停，代价只和 streak 长度有关；
+  不依赖窗口函数（MySQL 5.7 用这个）。
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from datetime import date, timedelta
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from app.models import QuestSubmission
+
+SCAN_BATCH = 64
+
+# 日期 -> 整数天序号（只需要相邻日期差 1）
+_DAY_NUMBER = {
+    "sqlite": "CAST(julianday({col}) AS INTEGER)",
+    "postgresql": "({col} - DATE '1970-01-01')",
+    "mysql": "TO_DAYS({col})",
+}
+
+
+def _window_sql(dialect: str) -> str:
+    day = _DAY_NUMBER[dialect]
+    today = "CAST(:today AS DATE)" if dialect == "postgresql" else ":today"
+    return f"""
+        WITH d AS (
+            SELECT DISTINCT submit_date AS day
+            FROM quest_submissions
+            WHERE telegram_id = :tid AND submit_date <= {today}
+        ),
+        g AS (
+            SELECT {day.format(col="day")} + ROW_NUMBER() OVER (ORDER BY day DESC) AS grp
+            FROM d
+        )
+        SELECT COUNT(*) FROM g WHERE grp = {day.format(col=today)} + 1
+    """
+
+
+def supports_window(db: Session) -> bool:
+    bind = db.get_bind()
+    name = bind.dialect.name
+    if name == "sqlite":
+        return sqlite3.sqlite_version_info >= (3, 25, 0)
+    if name == "postgresql":
+        return True
+    if name == "mysql":
+        info = getattr(bind.dialect, "server_version_info", None) or ()
+        # MariaDB 10.2+ 也支持，但 server_version_info 不好区分，统一走 scan
+        return bool(info) and info >= (8, 0) and not getattr(bind.dialect, "is_mariadb", False)
+    return False
+
+
+def streak_window(db: Session, telegram_id: int, today: date) -> int:
+    dialect = db.get_bind().dialect.name
+    n = db.execute(text(_window_sql(dialect)), {"tid": telegram_id, "today": today.isoformat()}).scalar_one()
+    return int(n or 0)
+
+
+def streak_scan(db: Session, telegram_id: int, today: date, batch: int = SCAN_BATCH) -> int:
+    streak = 0
+    expect = today
+    upper = today
+    while True:
+        rows = db.execute(
+            select(QuestSubmission.submit_date)
+            .where(QuestSubmission.telegram_id == telegram_id, QuestSubmission.submit_date <= upper)
+            .group_by(QuestSubmission.submit_date)
+            .order_by(QuestSubmission.submit_date.desc())
+            .limit(batch)
+        ).all()
+        for (d,) in rows:
+            if d != expect:
+                return streak
+            streak += 1
+            expect = d - timedelta(days=1)
+        if len(rows) < batch:
+            return streak
+        upper = expect
+
+
+def current_streak(db: Session, telegram_id: int, today: date | None = None, *, method: str | None = None) -> int:
+    """截至 today（默认今天）的连续参与天数；today 没有提交则为 0。"""
+    today = today or date.today()
+    if method is None:
+        method = "window" if supports_window(db) else "scan"
+    if method == "window":
+        return streak_window(db, telegram_id, today)
+    return streak_scan(db, telegram_id, today)
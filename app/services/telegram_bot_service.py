@@ -1,5 +1,4 @@
 import os
-import requests
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,6 +13,8 @@ def send_message(chat_id: int, text: str):
         "text": text,
         "parse_mode": "HTML"
     }
+    import requests
+
     requests.post(f"{API_URL}/sendMessage", json=payload)
 
 
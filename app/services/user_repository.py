@@ -0,0 +1,430 @@
+"""统一的用户 / 积分仓库层。
+
+用户身份和积分以行为库为准（gs_db：users / user_balances / points_ledger / user_activity）：
+任务打卡（routes.py）本来就写这里，Quest 接口（app/api/quests.py、me.py）通过本模块接入，
+积分、连续天数、参与天数只算一套。
+
+GS_STORAGE_MODE 控制在线迁移阶段：
+  legacy   只读写 SQLAlchemy 的 quest_submissions / point_transactions / leafpass_status（旧行为）
+  dual     旧表照写，同时把 Quest 积分和活跃日双写进行为库；读仍走旧表
+  unified  Quest 积分只进行为库（不再写 point_transactions），/api/me 从行为库读
+历史数据用 scripts/migrate_unified_storage.py 合并，dual 阶段可反复执行（按流水 id 幂等）。
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import case, exists, func, null, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models import LeafpassStatus, PointTransaction, Quest, QuestSubmission, TelegramUser
+from app.services import analytics_service, streak_service
+from gs_db import get_db as get_behavior_db
+from models import adopt_existing_user, credit_points, record_new_user, report_today
+
+STORAGE_MODES = ("legacy", "dual", "unified")
+
+# 旧 point_transactions 流水（dual 双写 / 迁移）与 unified 阶段的提交，在 points_ledger 里的 ref_type
+REF_QUEST_TX = "quest_tx"
+REF_QUEST_SUBMISSION = "quest_submission"
+
+# 你可以按需要改等级阈值
+LEVELS = [
+    ("seed", 0),
+    ("sprout", 50),
+    ("leaf", 150),
+    ("tree", 300),
+]
+
+
+def storage_mode() -> str:
+    mode = (os.getenv("GS_STORAGE_MODE") or "legacy").strip().lower()
+    return mode if mode in STORAGE_MODES else "legacy"
+
+
+def calc_level(total_points: int) -> str:
+    lvl = LEVELS[0][0]
+    for name, threshold in LEVELS:
+        if total_points >= threshold:
+            lvl = name
+    return lvl
+
+
+def calc_streak(db: Session, telegram_id: int, today: date | None = None) -> int:
+    return streak_service.current_streak(db, telegram_id, today)
+
+
+def _level_case(total_expr):
+    return case(*[(total_expr >= threshold, name) for name, threshold in reversed(LEVELS)], else_=LEVELS[0][0])
+
+
+def quest_summary(db: Session, telegram_id: int, today: date | None = None) -> dict:
+    """旧口径（只看 Quest 这一侧）：leafpass_status 一次主键读。"""
+    today = today or date.today()
+    status = db.get(LeafpassStatus, telegram_id)
+    if status is None:
+        return {"telegram_id": telegram_id, "total_points": 0, "streak": 0, "leafpass_level": "seed", "participation_days": 0}
+    active = status.last_active_date is not None and status.last_active_date >= today - timedelta(days=1)
+    return {
+        "telegram_id": telegram_id,
+        "total_points": int(status.total_points or 0),
+        "streak": int(status.streak or 0) if active else 0,
+        "leafpass_level": status.level,
+        "participation_days": int(status.participation_days or 0),
+    }
+
+
+def bump_leafpass(db: Session, telegram_id: int, points: int, day: date) -> None:
+    """在调用方事务里累加 leafpass_status：一条 upsert，单语句原子（MyISAM 下也不会丢更新）。"""
+    t = LeafpassStatus.__table__
+    values = {
+        "telegram_id": telegram_id,
+        "level": calc_level(points),
+        "total_points": points,
+        "streak": 1,
+        "last_active_date": day,
+        "participation_days": 1,
+        "updated_at": func.current_timestamp(),
+    }
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+
+        stmt = insert(t).values(**values)
+        incoming = stmt.inserted.total_points
+    else:
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        stmt = insert(t).values(**values)
+        incoming = stmt.excluded.total_points
+
+    new_total = func.coalesce(t.c.total_points, 0) + incoming
+    changes = [
+        ("level", _level_case(new_total)),
+        (
+            "streak",
+            case(
+                (t.c.last_active_date == day, t.c.streak),
+                (t.c.last_active_date == day - timedelta(days=1), t.c.streak + 1),
+                else_=1,
+            ),
+        ),
+        (
+            "participation_days",
+            func.coalesce(t.c.participation_days, 0) + case((t.c.last_active_date == day, 0), else_=1),
+        ),
+        ("updated_at", func.current_timestamp()),
+        # MySQL 按顺序赋值、后面的表达式会读到前面的新值，所以这两列放最后
+        ("last_active_date", day),
+        ("total_points", new_total),
+    ]
+    if dialect == "mysql":
+        stmt = stmt.on_duplicate_key_update(changes)
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=[t.c.telegram_id], set_=dict(changes))
+    db.execute(stmt)
+
+
+LEAFPASS_COLUMNS = {"streak": "INTEGER DEFAULT 0", "last_active_date": "DATE", "participation_days": "INTEGER"}
+
+
+def rebuild_leafpass_status(db: Session, today: date | None = None) -> int:
+    """用 point_transactions / quest_submissions 重算 leafpass_status 的累计列（升级或修数时用）。"""
+    today = today or date.today()
+    t = LeafpassStatus.__table__
+    missing = (
+        select(QuestSubmission.telegram_id)
+        .where(~exists().where(LeafpassStatus.telegram_id == QuestSubmission.telegram_id))
+        .distinct()
+    )
+    for (telegram_id,) in db.execute(missing).all():
+        db.add(LeafpassStatus(telegram_id=telegram_id, level=LEVELS[0][0], total_points=0))
+    db.flush()
+
+    total = (
+        select(func.coalesce(func.sum(PointTransaction.points), 0))
+        .where(PointTransaction.telegram_id == t.c.telegram_id)
+        .scalar_subquery()
+    )
+    days = (
+        select(func.count(func.distinct(QuestSubmission.submit_date)))
+        .where(QuestSubmission.telegram_id == t.c.telegram_id)
+        .scalar_subquery()
+    )
+    last = select(func.max(QuestSubmission.submit_date)).where(QuestSubmission.telegram_id == t.c.telegram_id).scalar_subquery()
+    db.execute(update(t).values(total_points=total, participation_days=days, last_active_date=last, streak=0))
+    db.execute(update(t).values(level=_level_case(t.c.total_points)))
+
+    # streak 只对昨天 / 今天还活跃的用户有意义，其余读的时候本来就按 0 处理
+    recent = db.execute(
+        select(LeafpassStatus.telegram_id, LeafpassStatus.last_active_date).where(
+            LeafpassStatus.last_active_date >= today - timedelta(days=1)
+        )
+    ).all()
+    for telegram_id, last_day in recent:
+        db.execute(
+            update(t).where(t.c.telegram_id == telegram_id).values(streak=calc_streak(db, telegram_id, today=last_day))
+        )
+    db.commit()
+    reconcile_behavior_credits(db)
+    return db.execute(select(func.count()).select_from(t)).scalar_one()
+
+
+def reconcile_behavior_credits(db: Session) -> int:
+    """补记 SQLAlchemy 侧已 commit、行为库里缺的 Quest 积分；按 (ref_type, ref_id) 幂等，可随时重跑。
+
+    record_quest_completion 两个库分两次 commit，第二次失败时就会留下这种缺口。legacy 阶段不做事。
+    """
+    mode = storage_mode()
+    if mode == "legacy":
+        return 0
+    if mode == "dual":
+        ref_type = REF_QUEST_TX
+        stmt = select(
+            PointTransaction.id,
+            PointTransaction.telegram_id,
+            PointTransaction.points,
+            null(),
+            func.coalesce(TelegramUser.created_at, PointTransaction.created_at),
+        ).outerjoin(TelegramUser, TelegramUser.telegram_id == PointTransaction.telegram_id)
+    else:
+        # unified 阶段没有 telegram_users：缺的用户按这次提交的时间补进来
+        ref_type = REF_QUEST_SUBMISSION
+        stmt = select(
+            QuestSubmission.id,
+            QuestSubmission.telegram_id,
+            Quest.points,
+            QuestSubmission.submit_date,
+            QuestSubmission.submitted_at,
+        ).outerjoin(Quest, Quest.code == QuestSubmission.quest_code)
+
+    gen = get_behavior_db()
+    conn = next(gen)
+    try:
+        c = conn.cursor()
+        c.execute("SELECT ref_id FROM points_ledger WHERE ref_type = ?;", (ref_type,))
+        done = {int(row[0]) for row in c.fetchall()}
+        if mode == "unified":
+            # 切 unified 之前的提交已经按 quest_tx 流水记过账：只补第一笔 unified 提交之后的
+            if not done:
+                return 0
+            stmt = stmt.where(QuestSubmission.id > min(done))
+        credited, users = 0, set()
+        for ref_id, telegram_id, points, day, created_at in db.execute(stmt.order_by(stmt.selected_columns[0])):
+            if int(ref_id) in done:
+                continue
+            credit_quest_points(
+                conn,
+                int(telegram_id),
+                int(points or 0),
+                ref_type=ref_type,
+                ref_id=int(ref_id),
+                day=day,
+                created_at=created_at,
+                commit=False,
+            )
+            credited += 1
+            users.add(int(telegram_id))
+        if mode == "dual" and users:
+            # point_transactions 不记参与日：这些用户的 Quest 参与日按 submit_date 重新置位（置位幂等）
+            days = (
+                select(QuestSubmission.telegram_id, QuestSubmission.submit_date)
+                .where(QuestSubmission.telegram_id.in_(users), QuestSubmission.submit_date.is_not(None))
+                .distinct()
+            )
+            for telegram_id, submit_date in db.execute(days):
+                analytics_service.mark_active(conn, int(telegram_id), submit_date)
+        conn.commit()
+        return credited
+    finally:
+        gen.close()
+
+
+def ensure_leafpass_schema(engine) -> None:
+    """老库补 leafpass_status 新列和 quest_submissions 的连续天数索引 / 每日唯一约束；补了列就顺带重算一次累计值。"""
+    from app.core.database import SessionLocal, add_missing_columns, add_missing_indexes
+
+    add_missing_indexes(engine, QuestSubmission.__tablename__)
+    if add_missing_columns(engine, "leafpass_status", LEAFPASS_COLUMNS):
+        db = SessionLocal()
+        try:
+            rebuild_leafpass_status(db)
+        finally:
+            db.close()
+
+
+def behavior_summary(conn: sqlite3.Connection, telegram_id: int, today: date | None = None) -> dict:
+    """统一口径：任务打卡 + Quest 的累计积分、连续天数、参与天数，各一次主键读。"""
+    c = conn.cursor()
+    c.execute("SELECT earned FROM user_balances WHERE user_id = ?;", (int(telegram_id),))
+    row = c.fetchone()
+    total_points = int(row[0]) if row else 0
+    streak, days = analytics_service.user_streak(conn, int(telegram_id), today or report_today())
+    return {
+        "telegram_id": telegram_id,
+        "total_points": total_points,
+        "streak": streak,
+        "leafpass_level": calc_level(total_points),
+        "participation_days": days,
+    }
+
+
+def get_user_summary(db: Session, telegram_id: int) -> dict:
+    if storage_mode() != "unified":
+        return quest_summary(db, telegram_id)
+    gen = get_behavior_db()
+    conn = next(gen)
+    try:
+        return behavior_summary(conn, telegram_id)
+    finally:
+        gen.close()
+
+
+def rebuild_behavior_activity(conn: sqlite3.Connection) -> int:
+    """重建行为库 user_activity：打卡日志 + （dual / unified 阶段）quest_submissions 的参与日。"""
+    if storage_mode() == "legacy":
+        return analytics_service.rebuild_activity(conn)
+    from app.core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        stmt = (
+            select(QuestSubmission.telegram_id, QuestSubmission.submit_date)
+            .where(QuestSubmission.submit_date.is_not(None))
+            .group_by(QuestSubmission.telegram_id, QuestSubmission.submit_date)
+        )
+        result = db.execute(stmt.execution_options(yield_per=1000, stream_results=True))
+        return analytics_service.rebuild_activity(conn, ((int(u), d) for u, d in result))
+    finally:
+        db.close()
+
+
+def ensure_behavior_user(
+    conn: sqlite3.Connection,
+    telegram_id: int,
+    name: str | None = None,
+    *,
+    created_at=None,
+    new_signup: bool = False,
+) -> None:
+    """行为库里没有这个用户就补上。
+
+    new_signup=True 才算当日注册（累加 daily_metrics）；迁移 / 双写补进来的老用户沿用 created_at。
+    """
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM users WHERE id = ?;", (int(telegram_id),))
+    if c.fetchone() is not None:
+        return
+    if new_signup:
+        record_new_user(conn, int(telegram_id), name or "Telegram User", commit=False)
+    else:
+        adopt_existing_user(conn, int(telegram_id), name or "Telegram User", created_at)
+
+
+def credit_quest_points(
+    conn: sqlite3.Connection,
+    telegram_id: int,
+    points: int,
+    *,
+    ref_type: str,
+    ref_id: int,
+    day: date | None,
+    name: str | None = None,
+    created_at=None,
+    commit: bool = True,
+) -> bool:
+    """把一笔 Quest 积分记进行为库（不 commit 时跟随调用方事务）；同一 (ref_type, ref_id) 只记一次。"""
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM points_ledger WHERE ref_type = ? AND ref_id = ? LIMIT 1;", (ref_type, int(ref_id)))
+    if c.fetchone() is not None:
+        return False
+    ensure_behavior_user(conn, telegram_id, name, created_at=created_at)
+    if int(points) > 0:
+        credit_points(conn, int(telegram_id), int(points), ref_type=ref_type, ref_id=int(ref_id), commit=False)
+    else:
+        # 0 分的提交也留一条流水，保证幂等判断
+        c.execute(
+            """
+            INSERT INTO points_ledger (user_id, kind, delta, held_delta, balance_after, ref_type, ref_id, created_at)
+            VALUES (?, 'earn', 0, 0, COALESCE((SELECT balance FROM user_balances WHERE user_id = ?), 0), ?, ?, ?);
+            """,
+            (int(telegram_id), int(telegram_id), ref_type, int(ref_id), datetime.utcnow().isoformat()),
+        )
+    if day is not None:
+        analytics_service.mark_active(conn, int(telegram_id), day)
+    if commit:
+        conn.commit()
+    return True
+
+
+def record_quest_completion(db: Session, telegram_id: int, quest, *, username: str | None = None) -> bool:
+    """写一次 Quest 完成及积分；当天重复提交返回 False。
+
+    dual / unified 阶段两个库没有共同事务：先 commit SQLAlchemy 侧，再 commit 行为库。
+    第二次 commit 失败时提交和积分已落库、行为库缺这笔流水（请求报错，重试会当作当天已完成）；
+    缺口由 reconcile_behavior_credits 按 ref 补记，rebuild_leafpass_status 会顺带跑一次。
+    """
+    mode = storage_mode()
+
+    # unified 阶段不再写 telegram_users，行为库里没有的就是新注册
+    new_signup, created_at = mode == "unified", None
+    if mode != "unified":
+        # 确保用户存在（A 阶段：只靠 telegram_id）
+        user = db.execute(select(TelegramUser).where(TelegramUser.telegram_id == telegram_id)).scalar_one_or_none()
+        if not user:
+            user = TelegramUser(telegram_id=telegram_id, username=username)
+            db.add(user)
+            db.flush()
+            new_signup = True
+        created_at = user.created_at
+
+    # 写 submission（依赖 uniq_user_quest_day 防重复）
+    today = date.today()
+    sub = QuestSubmission(
+        telegram_id=telegram_id,
+        quest_code=quest.code,
+        submitted_at=datetime.utcnow(),
+        submit_date=today,
+    )
+    db.add(sub)
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        return False
+
+    points = int(quest.points or 0)
+    ref_type, ref_id = REF_QUEST_SUBMISSION, int(sub.id)
+    if mode != "unified":
+        tx = PointTransaction(telegram_id=telegram_id, points=points, source=f"quest:{quest.code}")
+        db.add(tx)
+        db.flush()
+        bump_leafpass(db, telegram_id, points, today)
+        ref_type, ref_id = REF_QUEST_TX, int(tx.id)
+
+    if mode == "legacy":
+        db.commit()
+        return True
+
+    gen = get_behavior_db()
+    conn = next(gen)
+    try:
+        ensure_behavior_user(conn, telegram_id, username, created_at=created_at, new_signup=new_signup)
+        credit_quest_points(conn, telegram_id, points, ref_type=ref_type, ref_id=ref_id, day=today, name=username, commit=False)
+        # 顺序不能反：先落 SQLAlchemy 侧，行为库的缺口才能从它补回来
+        db.commit()
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        db.rollback()
+        raise
+    finally:
+        gen.close()
+    return True
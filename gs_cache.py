@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+# 目录类数据（tasks / badges / rewards / challenges）的进程内缓存。
+# 多 worker 之间靠行为库里的 cache_versions 计数失效：写入方 bump，读取方每次比一下版本号（主键查询），
+# 版本变了才重新加载。
+# 同一张表里还有每个用户一行 `user:<id>`：改到该用户数据（打卡 / 徽章 / 积分 / 挑战）时 +1，见 gs_dashboard.py。
+
+_lock = threading.Lock()
+_entries: dict[str, tuple[int, Any]] = {}
+
+
+def get_cache_version(conn, name: str) -> int:
+    c = conn.cursor()
+    c.execute("SELECT version FROM cache_versions WHERE name = ?;", (name,))
+    row = c.fetchone()
+    return int(row[0]) if row else 0
+
+
+def get_cache_versions(conn, names) -> dict[str, int]:
+    """一次查多个版本号；没有记录的不在返回值里（视为 0）。"""
+    names = list(names)
+    c = conn.cursor()
+    c.execute(
+        f"SELECT name, version FROM cache_versions WHERE name IN ({','.join(['?'] * len(names))});",
+        names,
+    )
+    return {r[0]: int(r[1]) for r in c.fetchall()}
+
+
+def user_cache_name(user_id: int) -> str:
+    return f"user:{int(user_id)}"
+
+
+def bump_user_cache_version(conn, *user_ids: int) -> None:
+    """在调用方事务里给这些用户的数据加一个版本（不 commit）。"""
+    bump_cache_version(conn, *(user_cache_name(u) for u in user_ids))
+
+
+def bump_cache_version(conn, *names: str) -> None:
+    """在调用方事务里给各缓存加一个版本（不 commit）。"""
+    conn.executemany(
+        """
+        INSERT INTO cache_versions (name, version) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET version = cache_versions.version + 1;
+        """,
+        [(n,) for n in names],
+    )
+    with _lock:
+        for n in names:
+            _entries.pop(n, None)
+
+
+def cached(conn, name: str, loader: Callable[[Any], T]) -> T:
+    version = get_cache_version(conn, name)
+    with _lock:
+        hit = _entries.get(name)
+    if hit is not None and hit[0] == version:
+        return hit[1]
+    value = loader(conn)
+    with _lock:
+        _entries[name] = (version, value)
+    return value
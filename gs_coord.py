@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import functools
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, TypeVar
+
+try:
+    import fcntl
+except ImportError:  # Windows 本地开发：没有文件锁，退化成单进程语义
+    fcntl = None
+
+T = TypeVar("T")
+
+# 同一台机器上多个 worker 进程之间的协调（gunicorn -c gunicorn.conf.py，GS_WORKERS > 1）：
+# - run_as_leader(name, fn)：文件锁选主，拿到锁的进程执行 fn（后台任务调度）；进程退出时锁由内核释放，
+#   阻塞等待的其它 worker 立刻接手
+# - exclusive(name)：跨进程临界区（启动时建表 / 补列只让一个 worker 做，其余等它做完）
+# - publish(topic) / cached_until(topic)：用一个 SQLite 小库记各 topic 的代数，广播“进程内缓存失效”；
+#   各进程最多每 GS_COORD_POLL_SECONDS 秒看一次代数
+# 限流计数在行为库里（gs_rate_limiter），各 worker 本来就共用，不经过这里。
+# 这些只在单机内生效；多机部署时后台任务仍由行为库 scheduler_jobs 的租约保证只跑一次。
+
+
+def coord_dir() -> str:
+    path = (os.getenv("GS_COORD_DIR") or "").strip() or os.path.join("data", "coord")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _lock_path(name: str) -> str:
+    return os.path.join(coord_dir(), f"{name}.lock")
+
+
+_local_locks: dict[str, threading.Lock] = {}
+_local_locks_guard = threading.Lock()
+
+
+def _local_lock(name: str) -> threading.Lock:
+    with _local_locks_guard:
+        return _local_locks.setdefault(name, threading.Lock())
+
+
+@contextmanager
+def exclusive(name: str) -> Iterator[None]:
+    """跨进程互斥（阻塞等待）。"""
+    with _local_lock(name):
+        if fcntl is None:
+            yield
+            return
+        with open(_lock_path(name), "a+") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class Leadership:
+    """持有 <coord_dir>/<name>.lock 的排他锁即为 leader；文件里写着 leader 的 pid，方便排查。"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if self._file is not None:
+            return True
+        if fcntl is None:
+            self._file = True
+            return True
+        f = open(_lock_path(self.name), "a+")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(f"{os.getpid()}\n")
+        f.flush()
+        self._file = f
+        return True
+
+    def release(self) -> None:
+        f, self._file = self._file, None
+        if f is None or f is True:
+            return
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        f.close()
+
+
+def run_as_leader(name: str, target: Callable[..., None], *args) -> threading.Thread:
+    """起一个守护线程：等到成为 name 的 leader 后执行 target(*args)。"""
+    leadership = Leadership(name)
+
+    def _run() -> None:
+        leadership.acquire(blocking=True)
+        target(*args)
+
+    t = threading.Thread(target=_run, name=f"gs_leader_{name}", daemon=True)
+    t.start()
+    return t
+
+
+def current_leader(name: str) -> int | None:
+    """读锁文件里的 pid；锁没人持有时返回 None。"""
+    path = _lock_path(name)
+    if not os.path.exists(path):
+        return None
+    if fcntl is not None:
+        with open(path, "a+") as f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                pass
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                return None
+    try:
+        with open(path) as f:
+            return int(f.read().strip() or 0) or None
+    except (OSError, ValueError):
+        return None
+
+
+def _poll_seconds() -> float:
+    try:
+        return float((os.getenv("GS_COORD_POLL_SECONDS") or "").strip() or 1.0)
+    except ValueError:
+        return 1.0
+
+
+# 每个进程一条连接，建表只在打开时做一次；fork 出来的 worker 按 pid 重新打开，不沿用父进程的连接
+_db_lock = threading.Lock()
+_db: tuple[int, str, sqlite3.Connection] | None = None
+
+
+@contextmanager
+def _coord_db() -> Iterator[sqlite3.Connection]:
+    global _db
+    path = os.path.join(coord_dir(), "coord.db")
+    with _db_lock:
+        if _db is None or _db[0] != os.getpid() or _db[1] != path:
+            conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("CREATE TABLE IF NOT EXISTS generations (topic TEXT PRIMARY KEY, gen INTEGER NOT NULL);")
+            conn.commit()
+            _db = (os.getpid(), path, conn)
+        yield _db[2]
+
+
+_gen_lock = threading.Lock()
+_generations: dict[str, tuple[int, float]] = {}
+
+
+def publish(topic: str) -> int:
+    """广播 topic 失效：代数 +1，返回新代数。"""
+    with _coord_db() as conn:
+        row = conn.execute(
+            """
+            INSERT INTO generations (topic, gen) VALUES (?, 1)
+            ON CONFLICT(topic) DO UPDATE SET gen = generations.gen + 1
+            RETURNING gen;
+            """,
+            (topic,),
+        ).fetchone()
+        conn.commit()
+    gen = int(row[0])
+    with _gen_lock:
+        _generations[topic] = (gen, time.monotonic())
+    return gen
+
+
+def generation(topic: str) -> int:
+    now = time.monotonic()
+    with _gen_lock:
+        hit = _generations.get(topic)
+    if hit is not None and now - hit[1] < _poll_seconds():
+        return hit[0]
+    with _coord_db() as conn:
+        row = conn.execute("SELECT gen FROM generations WHERE topic = ?;", (topic,)).fetchone()
+    gen = int(row[0]) if row else 0
+    with _gen_lock:
+        _generations[topic] = (gen, now)
+    return gen
+
+
+def cached_until(topic: str, maxsize: int | None = 1):
+    """lru_cache，另外在收到 publish(topic) 后（所有进程）清空。"""
+
+    def decorator(fn: Callable[..., T]) -> Callable[..., T]:
+        cached = functools.lru_cache(maxsize=maxsize)(fn)
+        seen: list[int | None] = [None]
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs) -> T:
+            gen = generation(topic)
+            if gen != seen[0]:
+                cached.cache_clear()
+                seen[0] = gen
+            return cached(*args, **kwargs)
+
+        wrapper.cache_clear = cached.cache_clear
+        return wrapper
+
+    return decorator
+
+
+def main(argv: list[str]) -> int:
+    if len(argv) >= 2 and argv[0] == "publish":
+        for topic in argv[1:]:
+            print(f"{topic} -> {publish(topic)}")
+        return 0
+    if argv and argv[0] == "status":
+        for fn in sorted(os.listdir(coord_dir())):
+            if fn.endswith(".lock"):
+                print(f"lock {fn[:-5]:<16} leader={current_leader(fn[:-5])}")
+        with _coord_db() as conn:
+            for topic, gen in conn.execute("SELECT topic, gen FROM generations ORDER BY topic;").fetchall():
+                print(f"topic {topic:<15} gen={gen}")
+        return 0
+    print("usage: python gs_coord.py status | publish <topic> [...]")
+    return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, TypeVar
+
+from gs_cache import get_cache_versions, user_cache_name
+
+T = TypeVar("T")
+
+# WebApp 首页（/api/tasks）的整包缓存。
+# - 版本：改到某个用户数据的写入（打卡 / 徽章 / 积分 / 兑换 / 加入挑战）bump `user:<id>`，
+#   目录和动态流各有自己的全局版本（tasks / badges / rewards / challenges / feed），都在行为库 cache_versions 里，
+#   多 worker 共用。一次 IN 查询拿齐，连同 user_id / 语言 / 日期算出 ETag。
+# - feed 版本不进 ETag：任何人打卡 / 点赞 / 评论都会 bump 它，放进去 304 基本不会命中。ETag 里换成
+#   GS_DASHBOARD_FEED_TTL_SECONDS 的时间桶，客户端手里的动态最多滞后这么久；自己的写入会改 user 版本，重拼时拿最新动态。
+# - If-None-Match 对上直接 304，不查任何业务表；本进程缓存里有同一 ETag 的整包就直接发缓存的 bytes。
+# - 全局部分（按语言本地化的任务列表、挑战、奖励、动态）按 (section, locale, version) 另存，所有用户共用，
+#   某个用户的版本变了只重算他自己那部分。
+# - 整包缓存是按字节计量的 LRU，总量不超过 GS_DASHBOARD_CACHE_BYTES（0 关闭）。
+
+GLOBAL_SECTIONS = ("tasks", "badges", "rewards", "challenges", "feed")
+# 载荷格式变了就 +1，让客户端手里的旧 ETag 全部失效
+PAYLOAD_FORMAT = 1
+# 每条缓存除 body 外的大致开销（key、ETag、OrderedDict 节点）
+_ENTRY_OVERHEAD = 256
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int((os.getenv(name) or "").strip() or default)
+    except ValueError:
+        return default
+
+
+def dashboard_versions(conn, user_id: int) -> dict[str, int]:
+    """{"user": n, "tasks": n, ...}，一次查询。"""
+    user_name = user_cache_name(user_id)
+    found = get_cache_versions(conn, (user_name,) + GLOBAL_SECTIONS)
+    out = {"user": found.get(user_name, 0)}
+    for name in GLOBAL_SECTIONS:
+        out[name] = found.get(name, 0)
+    return out
+
+
+FEED_TTL_SECONDS = max(1, _env_int("GS_DASHBOARD_FEED_TTL_SECONDS", 60))
+
+
+def feed_bucket(now: float | None = None) -> int:
+    return int((time.time() if now is None else now) // FEED_TTL_SECONDS)
+
+
+def dashboard_etag(user_id: int, locale: str, day: str, versions: dict[str, int]) -> str:
+    parts = [f"{k}={versions[k]}" for k in sorted(versions) if k != "feed"]
+    raw = "|".join([str(PAYLOAD_FORMAT), str(int(user_id)), locale, day, f"feed@{feed_bucket()}"] + parts)
+    return '"' + hashlib.blake2b(raw.encode("utf-8"), digest_size=10).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class SizedLRU:
+    """(key -> (etag, body)) 的 LRU，按 body 字节数计量，总量超过 max_bytes 从最久没用的开始淘汰。"""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max(0, int(max_bytes))
+        self._lock = threading.Lock()
+        self._items: OrderedDict[Any, tuple[str, bytes]] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Any, etag: str) -> bytes | None:
+        with self._lock:
+            hit = self._items.get(key)
+            if hit is None or hit[0] != etag:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return hit[1]
+
+    def put(self, key: Any, etag: str, body: bytes) -> None:
+        size = len(body) + _ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1]) + _ENTRY_OVERHEAD
+            self._items[key] = (etag, body)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self.size -= len(evicted) + _ENTRY_OVERHEAD
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+dashboard_cache = SizedLRU(_env_int("GS_DASHBOARD_CACHE_BYTES", 32 * 1024 * 1024))
+
+_sections_lock = threading.Lock()
+_sections: dict[tuple[str, str], tuple[int, Any]] = {}
+
+
+def global_section(name: str, locale: str, version: int, loader: Callable[[], T]) -> T:
+    """全局部分按 (name, locale) 各留最新版本的一份；调用方不要改返回的对象。"""
+    with _sections_lock:
+        hit = _sections.get((name, locale))
+    if hit is not None and hit[0] == version:
+        return hit[1]
+    value = loader()
+    with _sections_lock:
+        _sections[(name, locale)] = (version, value)
+    return value
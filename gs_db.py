@@ -5,6 +5,9 @@ from datetime import datetime, date, timedelta
 from typing import Iterator
 import json
 
+import gs_dialect
+from gs_cache import bump_cache_version
+
 DB_PATH_DEFAULT = "data/greensphere_behavior.db"
 
 
@@ -16,7 +19,10 @@ def _behavior_db_path() -> str:
     return path
 
 
-def get_db() -> Iterator[sqlite3.Connection]:
+def _connect():
+    """打开行为库连接：默认 SQLite 文件；配置了 GS_BEHAVIOR_DB_URL 时从 Postgres 连接池取（见 gs_dialect）。"""
+    if gs_dialect.is_postgres():
+        return gs_dialect.pg_connect()
     db_path = _behavior_db_path()
     parent = os.path.dirname(db_path)
     if parent:
@@ -30,27 +36,62 @@ def get_db() -> Iterator[sqlite3.Connection]:
         conn.execute("PRAGMA busy_timeout=5000;")
     except Exception:
         pass
+    return conn
+
+
+def fetch_dicts(c) -> list[dict]:
+    """把游标剩下的结果按列名转成 dict 列表。
+
+    配合 c.row_factory = None（先拿 tuple）用，省掉 sqlite3.Row -> dict 的一次转换；Row 游标也能用。
+    """
+    cols = [d[0] for d in c.description or ()]
+    return [dict(zip(cols, r)) for r in c.fetchall()]
+
+
+def get_db() -> Iterator[sqlite3.Connection]:
+    conn = _connect()
     try:
         yield conn
     finally:
         conn.close()
 
 
-def init_gs_db() -> None:
-    """初始化打卡用的 SQLite 数据库（行为层专用）"""
-    db_path = _behavior_db_path()
-    parent = os.path.dirname(db_path)
-    if parent:
-        os.makedirs(parent, exist_ok=True)
-    conn = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
-    c = conn.cursor()
+# 行为库结构版本：改了下面的建表 / 补列 / 种子数据就 +1，老库下次启动时会整体重跑一遍 init_gs_db
+SCHEMA_VERSION = 1
+
+
+def schema_version(conn, name: str = "behavior") -> int:
+    """库里记录的结构版本；还没有 schema_meta 表（新库 / 老库）时返回 0。"""
     try:
-        conn.execute("PRAGMA journal_mode=WAL;")
-        conn.execute("PRAGMA synchronous=NORMAL;")
-        conn.execute("PRAGMA foreign_keys=ON;")
-        conn.execute("PRAGMA busy_timeout=5000;")
-    except Exception:
-        pass
+        row = conn.execute("SELECT version FROM schema_meta WHERE name = ?;", (name,)).fetchone()
+    except sqlite3.OperationalError:
+        conn.rollback()
+        return 0
+    return int(row[0]) if row else 0
+
+
+def init_gs_db(force: bool = False) -> None:
+    """初始化打卡用的行为库（SQLite，或 GS_BEHAVIOR_DB_URL 指向的 Postgres）。
+
+    库里记录的结构版本已是 SCHEMA_VERSION 时直接返回（启动只多一次主键读）；
+    force=True 或 GS_SCHEMA_FORCE=1 时无条件重跑。
+    """
+    conn = _connect()
+    force = force or (os.getenv("GS_SCHEMA_FORCE") or "").strip().lower() in {"1", "true", "yes", "on"}
+    if not force and schema_version(conn) >= SCHEMA_VERSION:
+        conn.close()
+        return
+    c = conn.cursor()
+
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_meta (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        """
+    )
 
     # 用户表
     c.execute(
@@ -96,6 +137,50 @@ def init_gs_db() -> None:
         ON user_task_logs(user_id, task_id, date);
         """
     )
+    try:
+        c.execute("ALTER TABLE user_task_logs ADD COLUMN lang TEXT;")
+    except sqlite3.OperationalError:
+        pass
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_user_task_logs_date_user
+        ON user_task_logs(date, user_id);
+        """
+    )
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_users_created_at
+        ON users(created_at);
+        """
+    )
+
+    # 每日指标预聚合（写路径增量累加，夜间任务重算后 finalized=1）
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS daily_metrics (
+            date TEXT PRIMARY KEY,
+            new_users INTEGER NOT NULL DEFAULT 0,
+            active_users INTEGER NOT NULL DEFAULT 0,
+            completions INTEGER NOT NULL DEFAULT 0,
+            points INTEGER NOT NULL DEFAULT 0,
+            total_users INTEGER NOT NULL DEFAULT 0,
+            finalized INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT
+        );
+        """
+    )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS daily_metrics_breakdown (
+            date TEXT NOT NULL,
+            dim TEXT NOT NULL,
+            key TEXT NOT NULL,
+            completions INTEGER NOT NULL DEFAULT 0,
+            points INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (date, dim, key)
+        );
+        """
+    )
 
     c.execute(
         """
@@ -147,6 +232,43 @@ def init_gs_db() -> None:
         """
     )
 
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS co2_fetch_state (
+            source TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            content_length INTEGER,
+            last_date TEXT,
+            updated_at TEXT NOT NULL
+        );
+        """
+    )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS co2_monthly (
+            month TEXT PRIMARY KEY,
+            avg_value REAL NOT NULL,
+            min_value REAL NOT NULL,
+            max_value REAL NOT NULL,
+            days INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        """
+    )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS co2_yearly (
+            year TEXT PRIMARY KEY,
+            avg_value REAL NOT NULL,
+            min_value REAL NOT NULL,
+            max_value REAL NOT NULL,
+            days INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        """
+    )
+
     c.execute(
         """
         CREATE TABLE IF NOT EXISTS challenges (
@@ -243,6 +365,51 @@ def init_gs_db() -> None:
         );
         """
     )
+    try:
+        c.execute("ALTER TABLE reward_redemptions ADD COLUMN cost_points INTEGER;")
+    except sqlite3.OperationalError:
+        pass
+
+    # 积分余额：balance 可用、held 兑换冻结中；每次变动都记一条 points_ledger
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_balances (
+            user_id INTEGER PRIMARY KEY,
+            balance INTEGER NOT NULL DEFAULT 0,
+            held INTEGER NOT NULL DEFAULT 0,
+            earned INTEGER NOT NULL DEFAULT 0,
+            spent INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL
+        );
+        """
+    )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS points_ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            delta INTEGER NOT NULL,
+            held_delta INTEGER NOT NULL DEFAULT 0,
+            balance_after INTEGER NOT NULL,
+            ref_type TEXT,
+            ref_id INTEGER,
+            created_at TEXT NOT NULL
+        );
+        """
+    )
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_points_ledger_user_id
+        ON points_ledger(user_id, id);
+        """
+    )
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_points_ledger_ref
+        ON points_ledger(ref_type, ref_id);
+        """
+    )
 
     c.execute(
         """
@@ -274,6 +441,21 @@ def init_gs_db() -> None:
         """
     )
 
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS news_feeds (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            last_status INTEGER,
+            last_fetch_ms INTEGER,
+            last_item_count INTEGER,
+            last_error TEXT,
+            last_fetched_at TEXT
+        );
+        """
+    )
+
     c.execute(
         """
         CREATE TABLE IF NOT EXISTS rate_limits (
@@ -287,15 +469,109 @@ def init_gs_db() -> None:
         );
         """
     )
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_rate_limits_created_at
+        ON rate_limits(created_at);
+        """
+    )
 
-    try:
-        c.execute("DELETE FROM rate_limits WHERE created_at < datetime('now', '-2 days');")
-    except Exception:
-        pass
-    try:
-        c.execute("DELETE FROM news_items WHERE fetched_at < datetime('now', '-30 days');")
-    except Exception:
-        pass
+    # 幂等键：客户端重试 / 离线补发时直接返回首次处理的结果
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            scope TEXT NOT NULL,
+            key TEXT NOT NULL,
+            status_code INTEGER NOT NULL DEFAULT 200,
+            response_json TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (scope, key)
+        );
+        """
+    )
+
+    # 目录缓存版本号（gs_cache.py），写入方 +1，各 worker 比对后重新加载
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        );
+        """
+    )
+
+    # 每用户活跃位图（app/services/analytics_service.py）
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_activity (
+            user_id INTEGER PRIMARY KEY,
+            base_day INTEGER NOT NULL,
+            first_day INTEGER NOT NULL,
+            last_day INTEGER NOT NULL,
+            bits BLOB NOT NULL
+        );
+        """
+    )
+
+    # 调度器：租约 + 已执行的触发点（epoch 秒），多 worker 下同一 slot 只跑一次
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS scheduler_jobs (
+            name TEXT PRIMARY KEY,
+            last_slot INTEGER,
+            lease_owner TEXT,
+            lease_until INTEGER,
+            last_run_at INTEGER,
+            last_status TEXT,
+            last_duration_ms INTEGER
+        );
+        """
+    )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS job_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_name TEXT NOT NULL,
+            slot INTEGER,
+            owner TEXT,
+            started_at TEXT NOT NULL,
+            finished_at TEXT,
+            duration_ms INTEGER,
+            status TEXT NOT NULL,
+            message TEXT
+        );
+        """
+    )
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_job_runs_job_name_id
+        ON job_runs(job_name, id);
+        """
+    )
+
+    # 首次启用余额：按历史打卡积分给老用户开户（之前的兑换没有扣分，不追溯）
+    c.execute("SELECT 1 FROM user_balances LIMIT 1;")
+    if c.fetchone() is None:
+        now = datetime.utcnow().isoformat()
+        c.execute(
+            """
+            INSERT INTO user_balances (user_id, balance, held, earned, spent, updated_at)
+            SELECT l.user_id, SUM(t.points), 0, SUM(t.points), 0, ?
+            FROM user_task_logs l
+            JOIN tasks t ON t.id = l.task_id
+            GROUP BY l.user_id
+            HAVING SUM(t.points) > 0;
+            """,
+            (now,),
+        )
+        c.execute(
+            """
+            INSERT INTO points_ledger (user_id, kind, delta, held_delta, balance_after, ref_type, ref_id, created_at)
+            SELECT user_id, 'opening', balance, 0, balance, NULL, NULL, ?
+            FROM user_balances;
+            """,
+            (now,),
+        )
 
     # 示例任务
     c.execute("SELECT COUNT(*) AS cnt FROM tasks;")
@@ -457,9 +733,18 @@ def init_gs_db() -> None:
         c.execute("SELECT id FROM tasks ORDER BY id ASC LIMIT 3;")
         for r in c.fetchall():
             c.execute(
-                "INSERT OR IGNORE INTO challenge_tasks (challenge_id, task_id) VALUES (?, ?);",
+                "INSERT INTO challenge_tasks (challenge_id, task_id) VALUES (?, ?) ON CONFLICT DO NOTHING;",
                 (challenge_id, int(r[0])),
             )
 
+    # 种子数据 / 补列可能改了目录：各进程的目录缓存和 WebApp 首页的 ETag 一起失效
+    bump_cache_version(conn, "tasks", "badges", "rewards", "challenges")
+    c.execute(
+        """
+        INSERT INTO schema_meta (name, version, updated_at) VALUES ('behavior', ?, ?)
+        ON CONFLICT(name) DO UPDATE SET version = excluded.version, updated_at = excluded.updated_at;
+        """,
+        (SCHEMA_VERSION, datetime.utcnow().isoformat()),
+    )
     conn.commit()
     conn.close()
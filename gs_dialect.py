@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Iterator
+
+# 行为库的方言层：默认 SQLite（GS_BEHAVIOR_DB_PATH）；配置 GS_BEHAVIOR_DB_URL=postgresql://... 时走 Postgres。
+# 上层代码（gs_db / models / routes / services）照旧写 sqlite3 风格：? 占位符、datetime('now')、
+# INTEGER PRIMARY KEY AUTOINCREMENT、cursor.lastrowid、row["col"]、捕获 sqlite3.IntegrityError。
+# Postgres 下由 PgConnection 把 SQL 改写一遍（结果按语句缓存），异常映射回 sqlite3 的异常类型。
+# 依赖 psycopg 3 + psycopg_pool（pip install "psycopg[binary]" psycopg_pool），只在启用 Postgres 时导入。
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int((os.getenv(name) or "").strip() or default)
+    except ValueError:
+        return default
+
+
+def database_url() -> str:
+    return (os.getenv("GS_BEHAVIOR_DB_URL") or "").strip()
+
+
+def is_postgres() -> bool:
+    return database_url().startswith(("postgresql://", "postgres://"))
+
+
+_PG_NOW = "(now() AT TIME ZONE 'UTC')"
+_PG_TEXT_TS = "'YYYY-MM-DD HH24:MI:SS'"
+
+_LITERAL = re.compile(r"('(?:[^']|'')*')")
+_DATETIME_NOW = re.compile(r"datetime\('now'\)")
+_DATETIME_NOW_SHIFT = re.compile(r"datetime\('now',\s*('(?:[^']|'')*'|\?)\)")
+_EPOCH_NOW = re.compile(r"CAST\(strftime\('%s',\s*'now'\) AS INTEGER\)")
+_EPOCH_COL = re.compile(r"CAST\(strftime\('%s',\s*([\w.]+)\) AS INTEGER\)")
+_DDL = re.compile(r"^\s*(CREATE\s+TABLE|ALTER\s+TABLE)", re.IGNORECASE)
+_CREATE_TABLE = re.compile(r"CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", re.IGNORECASE)
+_INSERT_TABLE = re.compile(r"^\s*INSERT\s+INTO\s+(\w+)", re.IGNORECASE)
+_RETURNING = re.compile(r"\bRETURNING\b", re.IGNORECASE)
+# Postgres 的保留字，做列名时要加引号（rate_limits.window）
+_RESERVED_COLUMNS = re.compile(r'(?<![\w"])(window)(?![\w"])')
+
+_declared_serial: set[str] = set()
+
+
+@lru_cache(maxsize=2048)
+def translate(sql: str, has_params: bool) -> str:
+    """把行为层的 SQLite 方言改写成 Postgres 能执行的 SQL。"""
+    q = sql.strip().rstrip(";").strip()
+    q = _EPOCH_NOW.sub("CAST(EXTRACT(EPOCH FROM now()) AS BIGINT)", q)
+    q = _EPOCH_COL.sub(r"CAST(EXTRACT(EPOCH FROM CAST(\1 AS timestamp)) AS BIGINT)", q)
+    q = _DATETIME_NOW_SHIFT.sub(lambda m: f"to_char({_PG_NOW} + CAST({m.group(1)} AS interval), {_PG_TEXT_TS})", q)
+    q = _DATETIME_NOW.sub(f"to_char({_PG_NOW}, {_PG_TEXT_TS})", q)
+    if _DDL.match(q):
+        if "AUTOINCREMENT" in q.upper():
+            m = _CREATE_TABLE.search(q)
+            if m:
+                _declared_serial.add(m.group(1).lower())
+        q = re.sub(r"INTEGER\s+PRIMARY\s+KEY\s+AUTOINCREMENT", "BIGSERIAL PRIMARY KEY", q, flags=re.IGNORECASE)
+        q = re.sub(r"\bINTEGER\b", "BIGINT", q)
+        q = re.sub(r"\bREAL\b", "DOUBLE PRECISION", q)
+        q = re.sub(r"\bBLOB\b", "BYTEA", q)
+        q = re.sub(r"\bADD\s+COLUMN\s+(?!IF\s)", "ADD COLUMN IF NOT EXISTS ", q, flags=re.IGNORECASE)
+
+    parts = _LITERAL.split(q)
+    for i, part in enumerate(parts):
+        if has_params:
+            part = part.replace("%", "%%")
+        if i % 2 == 0:
+            part = _RESERVED_COLUMNS.sub(r'"\1"', part)
+            if has_params:
+                part = part.replace("?", "%s")
+        parts[i] = part
+    return "".join(parts)
+
+
+class Row(tuple):
+    """和 sqlite3.Row 一样既能 row[0] 也能 row["col"]，dict(row) 可用。"""
+
+    def __new__(cls, values, index: dict[str, int]):
+        row = super().__new__(cls, values)
+        row._index = index
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def keys(self) -> list[str]:
+        return list(self._index)
+
+
+def _row_factory(cursor):
+    names = [d.name for d in (cursor.description or [])]
+    index = {n: i for i, n in enumerate(names)}
+    return lambda values: Row(values, index)
+
+
+@contextmanager
+def _sqlite_errors() -> Iterator[None]:
+    import psycopg
+
+    try:
+        yield
+    except psycopg.IntegrityError as e:
+        raise sqlite3.IntegrityError(str(e)) from e
+    except (psycopg.OperationalError, psycopg.ProgrammingError) as e:
+        raise sqlite3.OperationalError(str(e)) from e
+    except psycopg.Error as e:
+        raise sqlite3.DatabaseError(str(e)) from e
+
+
+_WRITE_HEADS = ("INSERT", "UPDATE", "DELETE", "CREATE", "ALTER", "DROP")
+
+
+class PgCursor:
+    def __init__(self, conn: "PgConnection") -> None:
+        self._conn = conn
+        self._cur = conn.raw.cursor(row_factory=_row_factory)
+        self.lastrowid: int | None = None
+        self._empty = False
+
+    def execute(self, sql: str, params=()) -> "PgCursor":
+        params = tuple(params or ())
+        head = sql.lstrip()[:6].upper()
+        self.lastrowid = None
+        self._empty = head == "PRAGMA"
+        if self._empty:
+            return self
+        q = translate(sql, bool(params))
+        returning = False
+        if head == "INSERT" and not _RETURNING.search(q):
+            m = _INSERT_TABLE.match(q)
+            if m and m.group(1).lower() in self._conn.serial_tables():
+                q += " RETURNING id"
+                returning = True
+        self._run(head, lambda: self._cur.execute(q, params or None))
+        if returning:
+            row = self._cur.fetchone()
+            self.lastrowid = int(row[0]) if row else None
+        if head in _WRITE_HEADS:
+            self._conn.total_changes += max(0, self._cur.rowcount)
+        return self
+
+    def executemany(self, sql: str, seq_of_params) -> "PgCursor":
+        rows = [tuple(p) for p in seq_of_params]
+        self.lastrowid = None
+        self._empty = not rows
+        if not rows:
+            return self
+        head = sql.lstrip()[:6].upper()
+        q = translate(sql, True)
+        self._run(head, lambda: self._cur.executemany(q, rows))
+        self._conn.total_changes += max(0, self._cur.rowcount)
+        return self
+
+    def _run(self, head: str, fn) -> None:
+        # SQLite 里单条语句失败不影响事务里前面的写入；Postgres 会让整个事务作废，
+        # 所以事务中途的写语句包一层 savepoint，失败时只回滚这一条
+        from psycopg.pq import TransactionStatus
+
+        raw = self._conn.raw
+        status = raw.info.transaction_status
+        savepoint = head in _WRITE_HEADS and status == TransactionStatus.INTRANS
+        with _sqlite_errors():
+            if savepoint:
+                raw.execute("SAVEPOINT gs_stmt")
+            try:
+                fn()
+            except Exception:
+                if savepoint:
+                    raw.execute("ROLLBACK TO SAVEPOINT gs_stmt")
+                elif status == TransactionStatus.IDLE:
+                    raw.rollback()
+                raise
+            if savepoint:
+                raw.execute("RELEASE SAVEPOINT gs_stmt")
+
+    @property
+    def rowcount(self) -> int:
+        return -1 if self._empty else self._cur.rowcount
+
+    @property
+    def description(self):
+        return None if self._empty else self._cur.description
+
+    def fetchone(self):
+        if self._empty or self._cur.description is None:
+            return None
+        with _sqlite_errors():
+            return self._cur.fetchone()
+
+    def fetchall(self) -> list:
+        if self._empty or self._cur.description is None:
+            return []
+        with _sqlite_errors():
+            return self._cur.fetchall()
+
+    def fetchmany(self, size: int = 1) -> list:
+        if self._empty or self._cur.description is None:
+            return []
+        with _sqlite_errors():
+            return self._cur.fetchmany(size)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self) -> None:
+        self._cur.close()
+
+
+_serial_lock = threading.Lock()
+_serial_tables: frozenset[str] | None = None
+
+
+class PgConnection:
+    """sqlite3.Connection 的子集：cursor / execute / executemany / commit / rollback / close。"""
+
+    def __init__(self, raw, pool=None) -> None:
+        self.raw = raw
+        self._pool = pool
+        self.total_changes = 0
+        self.row_factory = None
+
+    def cursor(self) -> PgCursor:
+        return PgCursor(self)
+
+    def execute(self, sql: str, params=()) -> PgCursor:
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql: str, seq_of_params) -> PgCursor:
+        return self.cursor().executemany(sql, seq_of_params)
+
+    @property
+    def in_transaction(self) -> bool:
+        from psycopg.pq import TransactionStatus
+
+        return self.raw.info.transaction_status != TransactionStatus.IDLE
+
+    def serial_tables(self) -> frozenset[str]:
+        """带自增 id 的表：INSERT 时追加 RETURNING id 以支持 lastrowid。"""
+        global _serial_tables
+        if _serial_tables is None:
+            with _serial_lock:
+                if _serial_tables is None:
+                    cur = self.raw.execute(
+                        """
+                        SELECT table_name FROM information_schema.columns
+                        WHERE table_schema = current_schema() AND column_name = 'id'
+                          AND column_default LIKE 'nextval(%'
+                        """
+                    )
+                    _serial_tables = frozenset(r[0] for r in cur.fetchall())
+        return _serial_tables | _declared_serial
+
+    def commit(self) -> None:
+        with _sqlite_errors():
+            self.raw.commit()
+
+    def rollback(self) -> None:
+        with _sqlite_errors():
+            self.raw.rollback()
+
+    def close(self) -> None:
+        if self.raw is None:
+            return
+        raw, self.raw = self.raw, None
+        if self._pool is not None:
+            from psycopg.pq import TransactionStatus
+
+            # 调用方没 commit 的事务在这里回滚，免得连接池归还时告警
+            if raw.info.transaction_status != TransactionStatus.IDLE:
+                try:
+                    raw.rollback()
+                except Exception:
+                    pass
+            self._pool.putconn(raw)
+        else:
+            raw.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from psycopg_pool import ConnectionPool
+
+                _pool = ConnectionPool(
+                    database_url(),
+                    min_size=_env_int("GS_BEHAVIOR_DB_POOL_MIN", 1),
+                    max_size=_env_int("GS_BEHAVIOR_DB_POOL_MAX", 10),
+                    timeout=_env_int("GS_BEHAVIOR_DB_POOL_TIMEOUT", 30),
+                    kwargs={"autocommit": False},
+                    open=True,
+                )
+    return _pool
+
+
+def pg_connect() -> PgConnection:
+    pool = _get_pool()
+    return PgConnection(pool.getconn(), pool)
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
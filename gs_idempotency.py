@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator
+
+from fastapi import HTTPException
+from app.core.responses import FastJSONResponse
+
+# Idempotency-Key 去重：同一 (scope, key) 的重试直接回放第一次的响应，不再碰业务表。
+# 进程内 LRU + TTL 挡住绝大多数重试；GS_IDEMPOTENCY_SHARED=1 时再落一份到行为库
+# idempotency_keys 表，多 worker 之间共享（status_code=0 表示处理中）。
+
+MAX_KEY_LENGTH = 128
+_PENDING = 0
+_PENDING_STALE_SECONDS = 60
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int((os.getenv(name) or "").strip() or default)
+    except ValueError:
+        return default
+
+
+class IdempotencyStore:
+    def __init__(self, *, max_entries: int, ttl_seconds: int, shared: bool) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = max(1, int(ttl_seconds))
+        self.shared = bool(shared)
+        self._lock = threading.Lock()
+        self._items: OrderedDict[tuple[str, str], tuple[float, int, dict]] = OrderedDict()
+        self._pending: dict[tuple[str, str], float] = {}
+
+    def _get_local(self, k: tuple[str, str]) -> tuple[int, dict] | None:
+        now = time.time()
+        with self._lock:
+            hit = self._items.get(k)
+            if hit is None:
+                return None
+            if hit[0] <= now:
+                del self._items[k]
+                return None
+            self._items.move_to_end(k)
+            return hit[1], hit[2]
+
+    def _put_local(self, k: tuple[str, str], status_code: int, body: dict) -> None:
+        with self._lock:
+            self._items[k] = (time.time() + self.ttl_seconds, int(status_code), body)
+            self._items.move_to_end(k)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def _claim_shared(self, conn: sqlite3.Connection, scope: str, key: str) -> tuple[int, dict] | None:
+        c = conn.cursor()
+        c.execute(
+            """
+            INSERT INTO idempotency_keys (scope, key, status_code, response_json, created_at)
+            VALUES (?, ?, ?, '', datetime('now'))
+            ON CONFLICT DO NOTHING;
+            """,
+            (scope, key, _PENDING),
+        )
+        if c.rowcount:
+            conn.commit()
+            return None
+        c.execute(
+            """
+            SELECT status_code, response_json,
+                   CAST(strftime('%s', 'now') AS INTEGER) - CAST(strftime('%s', created_at) AS INTEGER) AS age
+            FROM idempotency_keys
+            WHERE scope = ? AND key = ?;
+            """,
+            (scope, key),
+        )
+        row = c.fetchone()
+        status_code, age = int(row[0]), int(row[2] or 0)
+        if status_code == _PENDING and age < _PENDING_STALE_SECONDS:
+            raise HTTPException(status_code=409, detail="Request with this Idempotency-Key is still in progress")
+        if status_code != _PENDING and age < self.ttl_seconds:
+            try:
+                return status_code, json.loads(row[1])
+            except Exception:
+                pass
+        # 过期或处理中断的旧记录：接管后重新处理
+        c.execute(
+            """
+            UPDATE idempotency_keys
+            SET status_code = ?, response_json = '', created_at = datetime('now')
+            WHERE scope = ? AND key = ?;
+            """,
+            (_PENDING, scope, key),
+        )
+        conn.commit()
+        return None
+
+    def begin(self, conn: sqlite3.Connection, scope: str, key: str) -> tuple[int, dict] | None:
+        """命中则返回 (status_code, body)；否则占位并返回 None，调用方处理完后 finish / abort。"""
+        k = (scope, key)
+        hit = self._get_local(k)
+        if hit is not None:
+            return hit
+        now = time.time()
+        with self._lock:
+            started = self._pending.get(k)
+            if started is not None and now - started < _PENDING_STALE_SECONDS:
+                raise HTTPException(status_code=409, detail="Request with this Idempotency-Key is still in progress")
+            self._pending[k] = now
+        if not self.shared:
+            return None
+        try:
+            hit = self._claim_shared(conn, scope, key)
+        except BaseException:
+            with self._lock:
+                self._pending.pop(k, None)
+            raise
+        if hit is not None:
+            with self._lock:
+                self._pending.pop(k, None)
+            self._put_local(k, hit[0], hit[1])
+        return hit
+
+    def finish(self, conn: sqlite3.Connection, scope: str, key: str, body: dict, *, status_code: int = 200) -> None:
+        k = (scope, key)
+        self._put_local(k, status_code, body)
+        with self._lock:
+            self._pending.pop(k, None)
+        if self.shared:
+            conn.execute(
+                """
+                UPDATE idempotency_keys
+                SET status_code = ?, response_json = ?, created_at = datetime('now')
+                WHERE scope = ? AND key = ?;
+                """,
+                (int(status_code), json.dumps(body, ensure_ascii=False, default=str), scope, key),
+            )
+            conn.commit()
+
+    def abort(self, conn: sqlite3.Connection, scope: str, key: str) -> None:
+        """处理失败：释放占位，允许客户端用同一个 key 重试。"""
+        with self._lock:
+            self._pending.pop((scope, key), None)
+        if self.shared:
+            try:
+                conn.rollback()
+                conn.execute(
+                    "DELETE FROM idempotency_keys WHERE scope = ? AND key = ? AND status_code = ?;",
+                    (scope, key, _PENDING),
+                )
+                conn.commit()
+            except sqlite3.Error:
+                pass
+
+
+store = IdempotencyStore(
+    max_entries=_env_int("GS_IDEMPOTENCY_CACHE_SIZE", 10000),
+    ttl_seconds=_env_int("GS_IDEMPOTENCY_TTL_SECONDS", 86400),
+    shared=(os.getenv("GS_IDEMPOTENCY_SHARED") or "1").strip() == "1",
+)
+
+
+class IdempotentCall:
+    def __init__(self, conn: sqlite3.Connection, scope: str, key: str | None) -> None:
+        self.conn = conn
+        self.scope = scope
+        self.key = key
+        self.replay: FastJSONResponse | None = None
+        self.replay_body: dict | None = None
+        self.done_called = False
+
+    def done(self, body: dict, *, status_code: int = 200) -> dict:
+        if self.key:
+            store.finish(self.conn, self.scope, self.key, body, status_code=status_code)
+            self.done_called = True
+        return body
+
+
+def normalize_key(raw: str | None) -> str | None:
+    key = (raw or "").strip()
+    if not key:
+        return None
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be at most {MAX_KEY_LENGTH} chars")
+    return key
+
+
+@contextmanager
+def idempotent(conn: sqlite3.Connection, scope: str, raw_key: str | None) -> Iterator[IdempotentCall]:
+    """没有 Idempotency-Key 时什么都不做；命中时 call.replay 是要直接返回的响应。"""
+    call = IdempotentCall(conn, scope, normalize_key(raw_key))
+    if call.key:
+        hit = store.begin(conn, scope, call.key)
+        if hit is not None:
+            call.replay_body = hit[1]
+            call.replay = FastJSONResponse(content=hit[1], status_code=hit[0], headers={"Idempotent-Replayed": "true"})
+            yield call
+            return
+    try:
+        yield call
+    except BaseException:
+        if call.key and not call.done_called:
+            store.abort(conn, scope, call.key)
+        raise
+    if call.key and not call.done_called:
+        store.abort(conn, scope, call.key)
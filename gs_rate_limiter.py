@@ -1,13 +1,101 @@
 from __future__ import annotations
 
-import time
+import os
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# 固定窗口计数：每个 (ip, key, window) 一行，upsert 自增。
+# 进程内再挡一层有上限的计数表：本进程已经看到超限的请求直接拒绝，不再写库，
+# 刷接口时不会变成写库风暴；没超限的才落库，多 worker 之间按库里的计数为准。
+
+_UPSERT_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int((os.getenv(name) or "").strip() or default)
+    except ValueError:
+        return default
 
 
 def _window_id(window_seconds: int) -> str:
     return str(int(time.time() // window_seconds))
 
 
+class LocalWindowCounter:
+    """进程内的固定窗口计数，最多保留 max_entries 个 (ip, key)，超出按 LRU 淘汰。"""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._items: OrderedDict[tuple[str, str], tuple[str, int]] = OrderedDict()
+
+    def incr(self, ip: str, key: str, win: str) -> int:
+        k = (ip, key)
+        with self._lock:
+            hit = self._items.get(k)
+            count = hit[1] + 1 if hit is not None and hit[0] == win else 1
+            self._items[k] = (win, count)
+            self._items.move_to_end(k)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+            return count
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+local_counter = LocalWindowCounter(_env_int("GS_RATE_LIMIT_LOCAL_ENTRIES", 50000))
+
+
+def _normalize(ip: str, key: str) -> tuple[str, str]:
+    return (ip or "").strip() or "unknown", (key or "").strip() or "unknown"
+
+
+def _increment(c, ip: str, key: str, win: str) -> int:
+    if _UPSERT_RETURNING:
+        c.execute(
+            """
+            INSERT INTO rate_limits (ip, key, window, count, created_at)
+            VALUES (?, ?, ?, 1, datetime('now'))
+            ON CONFLICT(ip, key, window) DO UPDATE SET count = rate_limits.count + 1
+            RETURNING count;
+            """,
+            (ip, key, win),
+        )
+        row = c.fetchone()
+        return int(row[0] if row and row[0] is not None else 0)
+    c.execute(
+        """
+        INSERT INTO rate_limits (ip, key, window, count, created_at)
+        VALUES (?, ?, ?, 0, datetime('now'))
+        ON CONFLICT DO NOTHING;
+        """,
+        (ip, key, win),
+    )
+    c.execute(
+        """
+        UPDATE rate_limits
+        SET count = count + 1
+        WHERE ip = ? AND key = ? AND window = ?;
+        """,
+        (ip, key, win),
+    )
+    c.execute(
+        """
+        SELECT count
+        FROM rate_limits
+        WHERE ip = ? AND key = ? AND window = ?;
+        """,
+        (ip, key, win),
+    )
+    row = c.fetchone()
+    return int(row[0] if row and row[0] is not None else 0)
+
+
 def increment_and_get_count(
     conn,
     *,
@@ -15,40 +103,47 @@ def increment_and_get_count(
     key: str,
     window_seconds: int,
 ) -> int:
-    ip = (ip or "").strip() or "unknown"
-    key = (key or "").strip() or "unknown"
+    ip, key = _normalize(ip, key)
     win = _window_id(int(window_seconds))
     for attempt in range(5):
         try:
-            c = conn.cursor()
-            c.execute(
-                """
-                INSERT OR IGNORE INTO rate_limits (ip, key, window, count, created_at)
-                VALUES (?, ?, ?, 0, datetime('now'));
-                """,
-                (ip, key, win),
-            )
-            c.execute(
-                """
-                UPDATE rate_limits
-                SET count = count + 1
-                WHERE ip = ? AND key = ? AND window = ?;
-                """,
-                (ip, key, win),
-            )
+            count = _increment(conn.cursor(), ip, key, win)
             conn.commit()
-            c.execute(
-                """
-                SELECT count
-                FROM rate_limits
-                WHERE ip = ? AND key = ? AND window = ?;
-                """,
-                (ip, key, win),
-            )
-            row = c.fetchone()
-            return int(row["count"] if row and row["count"] is not None else 0)
+            return count
         except sqlite3.OperationalError as e:
+            conn.rollback()
             if "locked" not in str(e).lower() or attempt == 4:
                 raise
             time.sleep(0.05 * (attempt + 1))
+    return 0
+
+
+def hit(conn, *, ip: str, key: str, limit: int, window_seconds: int = 60) -> bool:
+    """记一次访问，返回是否仍在限额内。"""
+    ip, key = _normalize(ip, key)
+    win = _window_id(int(window_seconds))
+    # 本地 key 带上窗口长度：同一个 key 用不同窗口长度时计数不会串
+    if local_counter.incr(ip, f"{key}@{int(window_seconds)}", win) > int(limit):
+        return False
+    return increment_and_get_count(conn, ip=ip, key=key, window_seconds=window_seconds) <= int(limit)
+
 
+def prune(conn, *, older_than_hours: int = 24, batch_size: int = 5000) -> int:
+    """分批删掉过期窗口的计数行，返回删除行数。"""
+    deleted = 0
+    cutoff = f"-{max(1, int(older_than_hours))} hours"
+    while True:
+        c = conn.cursor()
+        c.execute(
+            """
+            DELETE FROM rate_limits
+            WHERE id IN (
+                SELECT id FROM rate_limits WHERE created_at < datetime('now', ?) LIMIT ?
+            );
+            """,
+            (cutoff, int(batch_size)),
+        )
+        conn.commit()
+        deleted += max(0, c.rowcount)
+        if c.rowcount < int(batch_size):
+            return deleted
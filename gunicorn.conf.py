@@ -0,0 +1,32 @@
+# gunicorn -c gunicorn.conf.py app.main:app
+# 多 worker 部署：GS_WORKERS=auto 按 CPU 核数起，默认 1（等同原来的单进程 uvicorn）。
+# 多 worker 下后台任务只在 leader 进程跑、进程内缓存按 topic 广播失效，见 gs_coord.py。
+import multiprocessing
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int((os.getenv(name) or "").strip() or default)
+    except ValueError:
+        return default
+
+
+def _workers() -> int:
+    raw = (os.getenv("GS_WORKERS") or "").strip().lower()
+    if raw == "auto":
+        return multiprocessing.cpu_count()
+    return max(1, _env_int("GS_WORKERS", 1))
+
+
+bind = os.getenv("GS_BIND") or "0.0.0.0:8000"
+workers = _workers()
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = _env_int("GS_WORKER_TIMEOUT", 60)
+graceful_timeout = _env_int("GS_WORKER_GRACEFUL_TIMEOUT", 30)
+keepalive = 5
+# 定期重启 worker 防内存缓慢增长；0 表示不重启
+max_requests = _env_int("GS_WORKER_MAX_REQUESTS", 0)
+max_requests_jitter = max(0, max_requests // 10)
+accesslog = "-"
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS") or "127.0.0.1"
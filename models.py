@@ -1,9 +1,14 @@
 # models.py
+import json
+import os
 import sqlite3
 from datetime import date, timedelta
-from datetime import datetime
+from datetime import datetime, timezone
 from pydantic import BaseModel
 from app.db import get_db 
+from app.services.analytics_service import mark_active
+from gs_cache import bump_cache_version, bump_user_cache_version, cached
+from gs_db import fetch_dicts
 
 
 class CompleteTaskRequest(BaseModel):
@@ -11,13 +16,24 @@ class CompleteTaskRequest(BaseModel):
     task_id: int
 
 
+class CompleteBatchItem(BaseModel):
+    task_id: int
+    client_ts: int | None = None  # 客户端点击时间（毫秒）
+    idempotency_key: str | None = None
+
+
+class CompleteBatchRequest(BaseModel):
+    user_id: int | None = None
+    items: list[CompleteBatchItem] = []
+
+
 class UserInitRequest(BaseModel):
     telegram_id: int | None = None
     username: str | None = None
 
 
 def get_today_str() -> str:
-    return date.today().strftime("%Y-%m-%d")
+    return report_today().strftime("%Y-%m-%d")
 
 
 def calculate_stats(conn: sqlite3.Connection, user_id: int) -> dict:
@@ -80,7 +96,7 @@ def calculate_stats(conn: sqlite3.Connection, user_id: int) -> dict:
 
     # 连续天数 streak
     streak = 0
-    today = date.today()
+    today = report_today()
 
     while True:
         day_str = (today - timedelta(days=streak)).strftime("%Y-%m-%d")
@@ -99,8 +115,12 @@ def calculate_stats(conn: sqlite3.Connection, user_id: int) -> dict:
         else:
             break
 
+    balance = get_balance(conn, user_id)
+
     return {
         "total_points": total_points,
+        "points_balance": balance["balance"],
+        "points_held": balance["held"],
         "streak": streak,
         "today_completed": today_completed,
         "total_tasks": total_tasks,
@@ -110,9 +130,34 @@ def calculate_stats(conn: sqlite3.Connection, user_id: int) -> dict:
 
 
 def _load_badges(conn: sqlite3.Connection) -> list[dict]:
-    c = conn.cursor()
-    c.execute("SELECT code, title, description, rule_type, threshold FROM badges ORDER BY id ASC;")
-    return [dict(r) for r in c.fetchall()]
+    def load(conn: sqlite3.Connection) -> list[dict]:
+        c = conn.cursor()
+        c.row_factory = None
+        c.execute("SELECT code, title, description, rule_type, threshold FROM badges ORDER BY id ASC;")
+        return fetch_dicts(c)
+
+    return cached(conn, "badges", load)
+
+
+def list_tasks_catalog(conn: sqlite3.Connection) -> list[dict]:
+    """任务目录（i18n_json 已解析），走进程内缓存。"""
+
+    def load(conn: sqlite3.Connection) -> list[dict]:
+        c = conn.cursor()
+        c.execute("SELECT id, title, points, i18n_json FROM tasks;")
+        out = []
+        for r in c.fetchall():
+            i18n = None
+            if r["i18n_json"]:
+                try:
+                    m = json.loads(r["i18n_json"])
+                    i18n = m if isinstance(m, dict) else None
+                except Exception:
+                    pass
+            out.append({"id": r["id"], "title": r["title"], "points": r["points"], "i18n": i18n})
+        return out
+
+    return cached(conn, "tasks", load)
 
 
 def _load_user_badge_codes(conn: sqlite3.Connection, user_id: int) -> set[str]:
@@ -152,17 +197,20 @@ def unlock_eligible_badges(conn: sqlite3.Connection, user_id: int) -> list[dict]
     for b in eligible:
         c.execute(
             """
-            INSERT OR IGNORE INTO user_badges (user_id, badge_code, unlocked_at)
-            VALUES (?, ?, ?);
+            INSERT INTO user_badges (user_id, badge_code, unlocked_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT DO NOTHING;
             """,
             (user_id, b["code"], now),
         )
+    bump_user_cache_version(conn, user_id)
     conn.commit()
     return eligible
 
 
 def list_user_badges(conn: sqlite3.Connection, user_id: int) -> list[dict]:
     c = conn.cursor()
+    c.row_factory = None
     c.execute(
         """
         SELECT b.code, b.title, b.description, b.rule_type, b.threshold, ub.unlocked_at
@@ -173,11 +221,12 @@ def list_user_badges(conn: sqlite3.Connection, user_id: int) -> list[dict]:
         """,
         (user_id,),
     )
-    return [dict(r) for r in c.fetchall()]
+    return fetch_dicts(c)
 
 
 def list_recent_task_logs(conn: sqlite3.Connection, user_id: int, limit: int = 10) -> list[dict]:
     c = conn.cursor()
+    c.row_factory = None
     c.execute(
         """
         SELECT l.date, l.created_at, t.title, t.points, t.i18n_json
@@ -189,7 +238,7 @@ def list_recent_task_logs(conn: sqlite3.Connection, user_id: int, limit: int = 1
         """,
         (int(user_id), int(limit)),
     )
-    return [dict(r) for r in c.fetchall()]
+    return fetch_dicts(c)
 
 
 def list_next_rewards(conn: sqlite3.Connection, user_id: int, limit: int = 3) -> list[dict]:
@@ -235,15 +284,19 @@ def list_next_rewards(conn: sqlite3.Connection, user_id: int, limit: int = 3) ->
 
 
 def list_challenges(conn: sqlite3.Connection) -> list[dict]:
-    c = conn.cursor()
-    c.execute(
-        """
-        SELECT id, code, title, description, start_date, end_date, status, created_at
-        FROM challenges
-        ORDER BY id DESC;
-        """
-    )
-    return [dict(r) for r in c.fetchall()]
+    def load(conn: sqlite3.Connection) -> list[dict]:
+        c = conn.cursor()
+        c.row_factory = None
+        c.execute(
+            """
+            SELECT id, code, title, description, start_date, end_date, status, created_at
+            FROM challenges
+            ORDER BY id DESC;
+            """
+        )
+        return fetch_dicts(c)
+
+    return cached(conn, "challenges", load)
 
 
 def list_user_challenge_ids(conn: sqlite3.Connection, user_id: int) -> set[int]:
@@ -256,11 +309,14 @@ def join_challenge(conn: sqlite3.Connection, challenge_id: int, user_id: int) ->
     c = conn.cursor()
     c.execute(
         """
-        INSERT OR IGNORE INTO challenge_participants (challenge_id, user_id, joined_at)
-        VALUES (?, ?, ?);
+        INSERT INTO challenge_participants (challenge_id, user_id, joined_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT DO NOTHING;
         """,
         (int(challenge_id), int(user_id), datetime.utcnow().isoformat()),
     )
+    if c.rowcount:
+        bump_user_cache_version(conn, user_id)
     conn.commit()
 
 
@@ -272,6 +328,7 @@ def challenge_leaderboard(conn: sqlite3.Connection, challenge_id: int, limit: in
         return []
     start_date = ch["start_date"]
     end_date = ch["end_date"]
+    c.row_factory = None
     c.execute(
         """
         WITH t AS (
@@ -293,7 +350,7 @@ def challenge_leaderboard(conn: sqlite3.Connection, challenge_id: int, limit: in
         """,
         (int(challenge_id), start_date, end_date, int(limit)),
     )
-    return [dict(r) for r in c.fetchall()]
+    return fetch_dicts(c)
 
 
 def add_feed_event(conn: sqlite3.Connection, user_id: int, type: str, message: str, meta_json: str | None = None) -> int:
@@ -305,12 +362,14 @@ def add_feed_event(conn: sqlite3.Connection, user_id: int, type: str, message: s
         """,
         (int(user_id), str(type), str(message), meta_json, datetime.utcnow().isoformat()),
     )
+    bump_cache_version(conn, "feed")
     conn.commit()
     return int(c.lastrowid)
 
 
 def list_feed(conn: sqlite3.Connection, limit: int = 30) -> list[dict]:
     c = conn.cursor()
+    c.row_factory = None
     c.execute(
         """
         SELECT f.id, f.user_id, u.name AS name, f.type, f.message, f.meta_json, f.created_at
@@ -321,7 +380,7 @@ def list_feed(conn: sqlite3.Connection, limit: int = 30) -> list[dict]:
         """,
         (int(limit),),
     )
-    rows = [dict(r) for r in c.fetchall()]
+    rows = fetch_dicts(c)
     if not rows:
         return []
     feed_ids = [int(r["id"]) for r in rows]
@@ -330,12 +389,12 @@ def list_feed(conn: sqlite3.Connection, limit: int = 30) -> list[dict]:
         f"SELECT feed_id, COUNT(*) AS cnt FROM feed_likes WHERE feed_id IN ({placeholders}) GROUP BY feed_id;",
         feed_ids,
     )
-    like_map = {int(r["feed_id"]): int(r["cnt"]) for r in c.fetchall()}
+    like_map = {int(r[0]): int(r[1]) for r in c.fetchall()}
     c.execute(
         f"SELECT feed_id, COUNT(*) AS cnt FROM feed_comments WHERE feed_id IN ({placeholders}) GROUP BY feed_id;",
         feed_ids,
     )
-    comment_map = {int(r["feed_id"]): int(r["cnt"]) for r in c.fetchall()}
+    comment_map = {int(r[0]): int(r[1]) for r in c.fetchall()}
     for r in rows:
         fid = int(r["id"])
         r["like_count"] = like_map.get(fid, 0)
@@ -347,11 +406,14 @@ def like_feed(conn: sqlite3.Connection, feed_id: int, user_id: int) -> None:
     c = conn.cursor()
     c.execute(
         """
-        INSERT OR IGNORE INTO feed_likes (feed_id, user_id, created_at)
-        VALUES (?, ?, ?);
+        INSERT INTO feed_likes (feed_id, user_id, created_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT DO NOTHING;
         """,
         (int(feed_id), int(user_id), datetime.utcnow().isoformat()),
     )
+    if c.rowcount:
+        bump_cache_version(conn, "feed")
     conn.commit()
 
 
@@ -364,33 +426,187 @@ def comment_feed(conn: sqlite3.Connection, feed_id: int, user_id: int, text: str
         """,
         (int(feed_id), int(user_id), str(text)[:500], datetime.utcnow().isoformat()),
     )
+    bump_cache_version(conn, "feed")
     conn.commit()
 
 
 def list_rewards(conn: sqlite3.Connection) -> list[dict]:
+    def load(conn: sqlite3.Connection) -> list[dict]:
+        c = conn.cursor()
+        c.row_factory = None
+        c.execute(
+            """
+            SELECT id, code, title, description, cost_points, status, created_at
+            FROM rewards
+            WHERE status = 'active'
+            ORDER BY cost_points ASC, id ASC;
+            """
+        )
+        return fetch_dicts(c)
+
+    return cached(conn, "rewards", load)
+
+
+class InsufficientPoints(Exception):
+    pass
+
+
+class RedemptionConflict(Exception):
+    pass
+
+
+def _append_ledger(
+    c: sqlite3.Cursor,
+    user_id: int,
+    kind: str,
+    delta: int,
+    held_delta: int,
+    *,
+    ref_type: str | None,
+    ref_id: int | None,
+    now: str,
+) -> None:
+    c.execute("SELECT balance FROM user_balances WHERE user_id = ?;", (int(user_id),))
+    row = c.fetchone()
+    c.execute(
+        """
+        INSERT INTO points_ledger (user_id, kind, delta, held_delta, balance_after, ref_type, ref_id, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+        """,
+        (int(user_id), kind, int(delta), int(held_delta), int(row[0] if row else 0), ref_type, ref_id, now),
+    )
+
+
+def get_balance(conn: sqlite3.Connection, user_id: int) -> dict:
     c = conn.cursor()
+    c.execute("SELECT balance, held, earned, spent FROM user_balances WHERE user_id = ?;", (int(user_id),))
+    row = c.fetchone()
+    if row is None:
+        return {"balance": 0, "held": 0, "earned": 0, "spent": 0}
+    return {"balance": int(row[0]), "held": int(row[1]), "earned": int(row[2]), "spent": int(row[3])}
+
+
+def list_points_ledger(conn: sqlite3.Connection, user_id: int, limit: int = 50) -> list[dict]:
+    c = conn.cursor()
+    c.row_factory = None
     c.execute(
         """
-        SELECT id, code, title, description, cost_points, status, created_at
-        FROM rewards
-        WHERE status = 'active'
-        ORDER BY cost_points ASC, id ASC;
+        SELECT id, kind, delta, held_delta, balance_after, ref_type, ref_id, created_at
+        FROM points_ledger
+        WHERE user_id = ?
+        ORDER BY id DESC
+        LIMIT ?;
+        """,
+        (int(user_id), int(limit)),
+    )
+    return fetch_dicts(c)
+
+
+def credit_points(
+    conn: sqlite3.Connection,
+    user_id: int,
+    points: int,
+    *,
+    ref_type: str | None = None,
+    ref_id: int | None = None,
+    commit: bool = True,
+) -> None:
+    if int(points) <= 0:
+        return
+    now = datetime.utcnow().isoformat()
+    c = conn.cursor()
+    c.execute(
         """
+        INSERT INTO user_balances (user_id, balance, held, earned, spent, updated_at)
+        VALUES (?, ?, 0, ?, 0, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            balance = user_balances.balance + excluded.balance,
+            earned = user_balances.earned + excluded.earned,
+            updated_at = excluded.updated_at;
+        """,
+        (int(user_id), int(points), int(points), now),
     )
-    return [dict(r) for r in c.fetchall()]
+    _append_ledger(c, user_id, "earn", int(points), 0, ref_type=ref_type, ref_id=ref_id, now=now)
+    bump_user_cache_version(conn, user_id)
+    if commit:
+        conn.commit()
 
 
 def create_redemption(conn: sqlite3.Connection, reward_id: int, user_id: int, note: str | None = None) -> int:
+    """提交兑换申请并冻结积分；余额不足抛 InsufficientPoints，奖励不存在/已下架抛 LookupError。"""
     c = conn.cursor()
+    c.execute("SELECT cost_points FROM rewards WHERE id = ? AND status = 'active';", (int(reward_id),))
+    row = c.fetchone()
+    if row is None:
+        raise LookupError("Reward not found")
+    cost = max(0, int(row["cost_points"] or 0))
+    now = datetime.utcnow().isoformat()
+    if cost > 0:
+        # 单条条件 UPDATE 完成校验 + 冻结，并发兑换时只有余额够的那次能成功
+        c.execute(
+            """
+            UPDATE user_balances
+            SET balance = balance - ?, held = held + ?, updated_at = ?
+            WHERE user_id = ? AND balance >= ?;
+            """,
+            (cost, cost, now, int(user_id), cost),
+        )
+        if c.rowcount != 1:
+            raise InsufficientPoints(f"Need {cost} points")
     c.execute(
         """
-        INSERT INTO reward_redemptions (reward_id, user_id, status, note, created_at)
-        VALUES (?, ?, ?, ?, ?);
+        INSERT INTO reward_redemptions (reward_id, user_id, status, note, created_at, cost_points)
+        VALUES (?, ?, ?, ?, ?, ?);
         """,
-        (int(reward_id), int(user_id), "pending", (note or "")[:255], datetime.utcnow().isoformat()),
+        (int(reward_id), int(user_id), "pending", (note or "")[:255], now, cost),
     )
+    rid = int(c.lastrowid)
+    if cost > 0:
+        _append_ledger(c, user_id, "hold", -cost, cost, ref_type="redemption", ref_id=rid, now=now)
+        bump_user_cache_version(conn, user_id)
+    conn.commit()
+    return rid
+
+
+def update_redemption_status(conn: sqlite3.Connection, redemption_id: int, status: str, note: str = "") -> None:
+    """审核兑换：pending -> approved 扣除冻结积分，pending -> rejected 退回可用余额。"""
+    c = conn.cursor()
+    c.execute("SELECT user_id, status, cost_points FROM reward_redemptions WHERE id = ?;", (int(redemption_id),))
+    row = c.fetchone()
+    if row is None:
+        raise LookupError("Redemption not found")
+    if status == row["status"]:
+        c.execute("UPDATE reward_redemptions SET note = ? WHERE id = ?;", (note[:255], int(redemption_id)))
+        conn.commit()
+        return
+    if row["status"] != "pending":
+        raise RedemptionConflict(f"Redemption already {row['status']}")
+    c.execute(
+        "UPDATE reward_redemptions SET status = ?, note = ? WHERE id = ? AND status = 'pending';",
+        (status, note[:255], int(redemption_id)),
+    )
+    if c.rowcount != 1:
+        conn.rollback()
+        raise RedemptionConflict("Redemption already settled")
+    # 旧的兑换记录没有冻结过积分（cost_points 为空），只改状态
+    cost = int(row["cost_points"] or 0)
+    user_id = int(row["user_id"])
+    now = datetime.utcnow().isoformat()
+    if cost > 0 and status == "approved":
+        c.execute(
+            "UPDATE user_balances SET held = held - ?, spent = spent + ?, updated_at = ? WHERE user_id = ?;",
+            (cost, cost, now, user_id),
+        )
+        _append_ledger(c, user_id, "settle", 0, -cost, ref_type="redemption", ref_id=int(redemption_id), now=now)
+    elif cost > 0 and status == "rejected":
+        c.execute(
+            "UPDATE user_balances SET balance = balance + ?, held = held - ?, updated_at = ? WHERE user_id = ?;",
+            (cost, cost, now, user_id),
+        )
+        _append_ledger(c, user_id, "release", cost, -cost, ref_type="redemption", ref_id=int(redemption_id), now=now)
+    if cost > 0:
+        bump_user_cache_version(conn, user_id)
     conn.commit()
-    return int(c.lastrowid)
 
 
 def log_system_event(
@@ -414,6 +630,7 @@ def log_system_event(
 
 def list_system_logs(conn: sqlite3.Connection, limit: int = 100) -> list[dict]:
     c = conn.cursor()
+    c.row_factory = None
     c.execute(
         """
         SELECT id, level, event, message, meta_json, created_at
@@ -423,4 +640,284 @@ def list_system_logs(conn: sqlite3.Connection, limit: int = 100) -> list[dict]:
         """,
         (int(limit),),
     )
-    return [dict(r) for r in c.fetchall()]
+    return fetch_dicts(c)
+
+
+# ---- 每日指标预聚合 ----
+# daily_metrics 在写路径上增量累加（注册 / 打卡），夜间任务再用原始表重算一遍并标记 finalized，
+# 统计接口和日报只读一行，不再对 user_task_logs / users 做 COUNT。
+
+
+def report_tz_offset_hours() -> int:
+    """日报 / 每日指标按这个时区（UTC+N 小时）划分日期。"""
+    try:
+        return int((os.getenv("GS_DAILY_REPORT_TZ_OFFSET_HOURS") or "").strip() or 7)
+    except ValueError:
+        return 7
+
+
+def report_today() -> date:
+    """报表时区的今天。打卡日期、每日指标的写入和定稿、日报都按它划分“一天”，不看服务器本地时区。"""
+    return report_date_for(datetime.now(timezone.utc).timestamp())
+
+
+def report_date_for(ts: float) -> date:
+    """Unix 时间戳在报表时区落在哪一天（离线打卡按点击时间记账时用）。"""
+    return datetime.fromtimestamp(ts, timezone(timedelta(hours=report_tz_offset_hours()))).date()
+
+
+def finalized_metric_dates(conn: sqlite3.Connection, since: str) -> set[str]:
+    """since（含）之后已经被夜间任务定稿的日期。"""
+    c = conn.cursor()
+    c.execute("SELECT date FROM daily_metrics WHERE finalized = 1 AND date >= ?;", (since,))
+    return {r[0] for r in c.fetchall()}
+
+
+def _local_day_bounds_utc(date_str: str) -> tuple[str, str]:
+    """报表时区的日期 -> users.created_at（UTC, 'YYYY-MM-DD HH:MM:SS'）上的半开区间，走 created_at 索引。"""
+    tz = timezone(timedelta(hours=report_tz_offset_hours()))
+    start_local = datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=tz)
+    end_local = start_local + timedelta(days=1)
+    fmt = "%Y-%m-%d %H:%M:%S"
+    return (
+        start_local.astimezone(timezone.utc).strftime(fmt),
+        end_local.astimezone(timezone.utc).strftime(fmt),
+    )
+
+
+def _ensure_daily_metrics_row(conn: sqlite3.Connection, date_str: str) -> None:
+    # 当天第一次写入时用当前用户总数做基线，之后随注册增量累加
+    conn.execute(
+        """
+        INSERT INTO daily_metrics (date, total_users, updated_at)
+        VALUES (?, (SELECT COUNT(*) FROM users), ?)
+        ON CONFLICT DO NOTHING;
+        """,
+        (date_str, datetime.utcnow().isoformat()),
+    )
+
+
+def record_new_user(conn: sqlite3.Connection, user_id: int, name: str, *, commit: bool = True) -> bool:
+    """注册新用户并累加当日 new_users / total_users；已存在时返回 False。"""
+    date_str = get_today_str()
+    # 基线要在插入新用户之前建，否则 total_users 会多算一次
+    _ensure_daily_metrics_row(conn, date_str)
+    c = conn.cursor()
+    c.execute(
+        "INSERT INTO users (id, name, created_at) VALUES (?, ?, datetime('now')) ON CONFLICT DO NOTHING;",
+        (int(user_id), name),
+    )
+    if c.rowcount != 1:
+        return False
+    c.execute(
+        """
+        UPDATE daily_metrics
+        SET new_users = new_users + 1, total_users = total_users + 1, updated_at = ?
+        WHERE date = ?;
+        """,
+        (datetime.utcnow().isoformat(), date_str),
+    )
+    if commit:
+        conn.commit()
+    return True
+
+
+def adopt_existing_user(conn: sqlite3.Connection, user_id: int, name: str, created_at) -> bool:
+    """把别处已有的老用户补进 users：沿用原注册时间，不算当日新增（daily_metrics 不动）。"""
+    if isinstance(created_at, datetime):
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+        created_at = created_at.strftime("%Y-%m-%d %H:%M:%S")
+    # 注册时间不详的记成 1970-01-01：只计入 total_users，不落进任何一天的 new_users
+    created_at = created_at or "1970-01-01 00:00:00"
+    c = conn.cursor()
+    c.execute(
+        "INSERT INTO users (id, name, created_at) VALUES (?, ?, ?) ON CONFLICT DO NOTHING;",
+        (int(user_id), name, created_at),
+    )
+    return c.rowcount == 1
+
+
+def record_task_completion(
+    conn: sqlite3.Connection,
+    user_id: int,
+    task_id: int,
+    *,
+    lang: str | None = None,
+    date_str: str | None = None,
+    commit: bool = True,
+) -> bool:
+    """写打卡日志并累加当日指标；同一用户同一任务当天重复时返回 False。"""
+    date_str = date_str or get_today_str()
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM user_task_logs WHERE user_id = ? AND date = ? LIMIT 1;", (int(user_id), date_str))
+    first_today = c.fetchone() is None
+    c.execute(
+        """
+        INSERT INTO user_task_logs (user_id, task_id, date, created_at, lang)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT DO NOTHING;
+        """,
+        (int(user_id), int(task_id), date_str, datetime.utcnow().isoformat(), lang),
+    )
+    if c.rowcount != 1:
+        return False
+    log_id = int(c.lastrowid)
+    bump_user_cache_version(conn, user_id)
+    if first_today:
+        mark_active(conn, int(user_id), date.fromisoformat(date_str))
+
+    c.execute("SELECT points FROM tasks WHERE id = ?;", (int(task_id),))
+    row = c.fetchone()
+    points = int(row["points"] or 0) if row else 0
+    now = datetime.utcnow().isoformat()
+    _ensure_daily_metrics_row(conn, date_str)
+    c.execute(
+        """
+        UPDATE daily_metrics
+        SET active_users = active_users + ?, completions = completions + 1, points = points + ?, updated_at = ?
+        WHERE date = ?;
+        """,
+        (1 if first_today else 0, points, now, date_str),
+    )
+    c.executemany(
+        """
+        INSERT INTO daily_metrics_breakdown (date, dim, key, completions, points)
+        VALUES (?, ?, ?, 1, ?)
+        ON CONFLICT(date, dim, key) DO UPDATE SET
+            completions = daily_metrics_breakdown.completions + 1,
+            points = daily_metrics_breakdown.points + excluded.points;
+        """,
+        [(date_str, "task", str(int(task_id)), points), (date_str, "lang", lang or "unknown", points)],
+    )
+    credit_points(conn, int(user_id), points, ref_type="task_log", ref_id=log_id, commit=False)
+    if commit:
+        conn.commit()
+    return True
+
+
+def finalize_daily_metrics(conn: sqlite3.Connection, date_str: str, *, finalized: bool = True) -> dict:
+    """用原始表重算某一天（修正增量计数的偏差），并标记 finalized。
+
+    当天还在写入，重算时传 finalized=False，行保持未定稿，夜间任务再定稿。
+    """
+    start, end = _local_day_bounds_utc(date_str)
+    c = conn.cursor()
+    c.execute("SELECT COUNT(*) AS cnt FROM users WHERE created_at >= ? AND created_at < ?;", (start, end))
+    new_users = int(c.fetchone()["cnt"] or 0)
+    c.execute("SELECT COUNT(*) AS cnt FROM users WHERE created_at < ?;", (end,))
+    total_users = int(c.fetchone()["cnt"] or 0)
+    c.execute(
+        """
+        SELECT COUNT(DISTINCT l.user_id) AS active_users,
+               COUNT(*) AS completions,
+               COALESCE(SUM(t.points), 0) AS points
+        FROM user_task_logs l
+        LEFT JOIN tasks t ON t.id = l.task_id
+        WHERE l.date = ?;
+        """,
+        (date_str,),
+    )
+    agg = c.fetchone()
+    now = datetime.utcnow().isoformat()
+    c.execute(
+        """
+        INSERT INTO daily_metrics (date, new_users, active_users, completions, points, total_users, finalized, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(date) DO UPDATE SET
+            new_users = excluded.new_users,
+            active_users = excluded.active_users,
+            completions = excluded.completions,
+            points = excluded.points,
+            total_users = excluded.total_users,
+            finalized = excluded.finalized,
+            updated_at = excluded.updated_at;
+        """,
+        (
+            date_str,
+            new_users,
+            int(agg["active_users"] or 0),
+            int(agg["completions"] or 0),
+            int(agg["points"] or 0),
+            total_users,
+            1 if finalized else 0,
+            now,
+        ),
+    )
+    c.execute("DELETE FROM daily_metrics_breakdown WHERE date = ?;", (date_str,))
+    c.execute(
+        """
+        INSERT INTO daily_metrics_breakdown (date, dim, key, completions, points)
+        SELECT l.date, 'task', CAST(l.task_id AS TEXT), COUNT(*), COALESCE(SUM(t.points), 0)
+        FROM user_task_logs l
+        LEFT JOIN tasks t ON t.id = l.task_id
+        WHERE l.date = ?
+        GROUP BY l.date, l.task_id;
+        """,
+        (date_str,),
+    )
+    c.execute(
+        """
+        INSERT INTO daily_metrics_breakdown (date, dim, key, completions, points)
+        SELECT l.date, 'lang', COALESCE(l.lang, 'unknown'), COUNT(*), COALESCE(SUM(t.points), 0)
+        FROM user_task_logs l
+        LEFT JOIN tasks t ON t.id = l.task_id
+        WHERE l.date = ?
+        GROUP BY l.date, COALESCE(l.lang, 'unknown');
+        """,
+        (date_str,),
+    )
+    conn.commit()
+    return get_daily_metrics(conn, date_str) or {}
+
+
+def get_daily_metrics(conn: sqlite3.Connection, date_str: str) -> dict | None:
+    c = conn.cursor()
+    c.execute(
+        """
+        SELECT date, new_users, active_users, completions, points, total_users, finalized, updated_at
+        FROM daily_metrics WHERE date = ?;
+        """,
+        (date_str,),
+    )
+    row = c.fetchone()
+    return dict(row) if row else None
+
+
+def list_daily_metrics(
+    conn: sqlite3.Connection,
+    start: str,
+    end: str,
+    *,
+    include_breakdown: bool = False,
+) -> list[dict]:
+    c = conn.cursor()
+    c.row_factory = None
+    c.execute(
+        """
+        SELECT date, new_users, active_users, completions, points, total_users, finalized
+        FROM daily_metrics
+        WHERE date >= ? AND date <= ?
+        ORDER BY date ASC;
+        """,
+        (start, end),
+    )
+    rows = fetch_dicts(c)
+    if not include_breakdown or not rows:
+        return rows
+    c.execute(
+        """
+        SELECT date, dim, key, completions, points
+        FROM daily_metrics_breakdown
+        WHERE date >= ? AND date <= ?
+        ORDER BY date ASC, dim ASC, completions DESC;
+        """,
+        (start, end),
+    )
+    by_date: dict[str, dict] = {r["date"]: r for r in rows}
+    for date_, dim, key, completions, points in c.fetchall():
+        day = by_date.get(date_)
+        if day is None:
+            continue
+        day.setdefault("by_" + dim, []).append({"key": key, "completions": completions, "points": points})
+    return rows
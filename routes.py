@@ -1,30 +1,26 @@
 import sqlite3
-from datetime import datetime
-import base64
-import hashlib
-import hmac
+from datetime import datetime, timedelta
 import os
 import json
 import secrets
-import csv
-from io import StringIO
-from functools import lru_cache
-from pathlib import Path
 import time
 
 from fastapi import APIRouter, Depends, BackgroundTasks, Request
 from fastapi import Header
 from fastapi import HTTPException
 from fastapi.responses import HTMLResponse, Response, RedirectResponse, JSONResponse
-from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 
-from gs_db import get_db
+from gs_db import fetch_dicts, get_db
 
 from models import (
     CompleteTaskRequest,
+    CompleteBatchRequest,
     UserInitRequest,
     get_today_str,
+    finalized_metric_dates,
+    report_date_for,
     calculate_stats,
     list_user_badges,
     list_recent_task_logs,
@@ -39,33 +35,37 @@ from models import (
     comment_feed,
     list_rewards,
     create_redemption,
+    update_redemption_status,
+    InsufficientPoints,
+    RedemptionConflict,
+    get_balance,
+    list_points_ledger,
     unlock_eligible_badges,
     log_system_event,
     list_system_logs,
+    record_new_user,
+    record_task_completion,
+    finalize_daily_metrics,
+    get_daily_metrics,
+    list_daily_metrics,
+    list_tasks_catalog,
 )
 from telegram_utils import send_telegram_message, send_monitor_message
 from app.middleware.admin_auth import admin_auth
 from app.auth.telegram_webapp import parse_telegram_user_from_init_data
-from gs_rate_limiter import increment_and_get_count
+from app.auth.session_token import make_session_token, read_token, session_ttl_seconds, sign_token, verify_session_token
+from gs_rate_limiter import hit as rate_limit_hit
+from gs_idempotency import idempotent, normalize_key, store as idempotency_store
+from app.services import analytics_service, catalog_service, export_service, user_repository
+from gs_cache import bump_cache_version
+from app.core.responses import FastJSONResponse, dumps as dumps_json
+from gs_dashboard import dashboard_cache, dashboard_etag, dashboard_versions, etag_matches, global_section
+from app.api.site import templates  # 和官网页共用一个模板环境（同一份编译缓存）
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
 
 load_dotenv()
 
-templates.env.globals["GS_OFFICIAL_CHANNEL_URL"] = (os.getenv("GS_OFFICIAL_CHANNEL_URL") or "https://t.me/GreenSphere_Official").strip()
-templates.env.globals["GS_COMMUNITY_GROUP_URL"] = (os.getenv("GS_COMMUNITY_GROUP_URL") or "https://t.me/GreenSphere_Community").strip()
-
-@lru_cache(maxsize=1)
-def _asset_version() -> str:
-    v = (os.getenv("GS_ASSET_VERSION") or "").strip()
-    if v:
-        return v
-    try:
-        return str(int(max(Path("static/style.css").stat().st_mtime, Path("static/admin.css").stat().st_mtime)))
-    except Exception:
-        return "1"
-
 REQUIRE_TG_INIT_DATA = (os.getenv("GS_REQUIRE_TG_INIT_DATA") or "").strip().lower() in {
     "1",
     "true",
@@ -86,6 +86,32 @@ def _normalize_lang(code: str | None) -> str:
     return "en"
 
 
+def _webapp_user(
+    x_gs_session: str | None = Header(default=None),
+    x_telegram_init_data: str | None = Header(default=None),
+) -> dict | None:
+    """当前 WebApp 用户：优先 X-GS-Session（一次 HMAC），其次完整 initData；都没有时返回 None。
+
+    返回值里 via 标明身份来源（"session" / "init_data"），只有 init_data 才能换新会话。
+    """
+    if x_gs_session:
+        try:
+            return {**verify_session_token(x_gs_session), "via": "session"}
+        except HTTPException:
+            if not x_telegram_init_data:
+                raise
+    if x_telegram_init_data:
+        u = parse_telegram_user_from_init_data(x_telegram_init_data)
+        return {"telegram_id": int(u["telegram_id"]), "lang": None, "username": u.get("username"), "via": "init_data"}
+    if REQUIRE_TG_INIT_DATA:
+        raise HTTPException(status_code=401, detail="Missing X-Telegram-Init-Data")
+    return None
+
+
+def _request_lang(request: Request, x_gs_lang: str | None, auth: dict | None) -> str:
+    return _normalize_lang(x_gs_lang or (auth or {}).get("lang") or request.headers.get("accept-language"))
+
+
 def _client_ip(request: Request) -> str:
     xf = request.headers.get("x-forwarded-for")
     if xf:
@@ -94,8 +120,7 @@ def _client_ip(request: Request) -> str:
 
 
 def _rate_limit_or_429(db: sqlite3.Connection, *, ip: str, key: str, limit: int, window_seconds: int = 60) -> None:
-    cnt = increment_and_get_count(db, ip=ip, key=key, window_seconds=window_seconds)
-    if cnt > int(limit):
+    if not rate_limit_hit(db, ip=ip, key=key, limit=limit, window_seconds=window_seconds):
         raise HTTPException(status_code=429, detail="Too Many Requests")
 
 
@@ -104,7 +129,7 @@ def _rate_limit_or_429(db: sqlite3.Connection, *, ip: str, key: str, limit: int,
 def app_index(request: Request):
     return templates.TemplateResponse(
         "index.html",
-        {"request": request, "asset_version": _asset_version()},
+        {"request": request},
         headers={"X-Robots-Tag": "noindex, nofollow", "Cache-Control": "no-store"},
     )
 
@@ -131,7 +156,7 @@ def admin_index(request: Request):
         return RedirectResponse(url="/admin/login?next=/admin", status_code=302)
     return templates.TemplateResponse(
         "admin.html",
-        {"request": request, "asset_version": _asset_version()},
+        {"request": request},
         headers={"X-Robots-Tag": "noindex, nofollow", "Cache-Control": "no-store"},
     )
 
@@ -162,40 +187,13 @@ def admin_index_head(request: Request):
     )
 
 
-def _b64url_encode(raw: bytes) -> str:
-    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
-
-
-def _b64url_decode(s: str) -> bytes:
-    pad = "=" * (-len(s) % 4)
-    return base64.urlsafe_b64decode((s + pad).encode("ascii"))
-
-
 def _make_admin_session(secret: str, ttl_seconds: int = 86400) -> str:
     now = int(time.time())
-    payload = {"iat": now, "exp": now + int(ttl_seconds)}
-    payload_b64 = _b64url_encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
-    sig = hmac.new(secret.encode("utf-8"), payload_b64.encode("ascii"), hashlib.sha256).digest()
-    sig_b64 = _b64url_encode(sig)
-    return f"{payload_b64}.{sig_b64}"
+    return sign_token(secret.encode("utf-8"), {"iat": now, "exp": now + int(ttl_seconds)})
 
 
 def _verify_admin_session(token: str, secret: str) -> bool:
-    try:
-        payload_b64, sig_b64 = token.split(".", 1)
-    except ValueError:
-        return False
-    expected = hmac.new(secret.encode("utf-8"), payload_b64.encode("ascii"), hashlib.sha256).digest()
-    if not hmac.compare_digest(_b64url_encode(expected), sig_b64):
-        return False
-    try:
-        payload = json.loads(_b64url_decode(payload_b64).decode("utf-8"))
-    except Exception:
-        return False
-    exp = int(payload.get("exp") or 0)
-    if exp <= int(time.time()):
-        return False
-    return True
+    return read_token(secret.encode("utf-8"), token) is not None
 
 
 def _is_https(request: Request) -> bool:
@@ -213,7 +211,7 @@ def admin_login_page(request: Request, next: str = "/admin"):
         return RedirectResponse(url=next or "/admin", status_code=302)
     return templates.TemplateResponse(
         "admin_login.html",
-        {"request": request, "asset_version": _asset_version(), "next": next or "/admin"},
+        {"request": request, "next": next or "/admin"},
         headers={"X-Robots-Tag": "noindex, nofollow", "Cache-Control": "no-store"},
     )
 
@@ -322,7 +320,6 @@ def public_profile(token: str, request: Request, db: sqlite3.Connection = Depend
             "stats": stats,
             "badges": badges,
             "logs": logs,
-            "asset_version": _asset_version(),
         },
         headers={"X-Robots-Tag": "noindex, nofollow", "Cache-Control": "no-store"},
     )
@@ -332,73 +329,96 @@ def public_profile(token: str, request: Request, db: sqlite3.Connection = Depend
 def profile_share(
     request: Request,
     body: dict,
-    x_telegram_init_data: str | None = Header(default=None),
+    auth: dict | None = Depends(_webapp_user),
+    idempotency_key: str | None = Header(default=None),
     db: sqlite3.Connection = Depends(get_db),
 ):
     _rate_limit_or_429(db, ip=_client_ip(request), key="api:profile:share", limit=30)
     user_id = int(body.get("user_id") or 0)
     make_public = body.get("is_public")
-    if x_telegram_init_data:
-        u = parse_telegram_user_from_init_data(x_telegram_init_data)
-        user_id = int(u["telegram_id"])
-    elif REQUIRE_TG_INIT_DATA:
-        raise HTTPException(status_code=401, detail="Missing X-Telegram-Init-Data")
+    if auth:
+        user_id = auth["telegram_id"]
     if not user_id:
         raise HTTPException(status_code=400, detail="Missing user_id")
-    if make_public is None:
-        p = _ensure_public_profile(db, user_id)
-    else:
-        p = _set_profile_public(db, user_id, bool(make_public))
-    base = _external_base_url(request)
-    return {"ok": True, "token": p["token"], "is_public": p["is_public"], "url": f"{base}/p/{p['token']}"}
+    with idempotent(db, f"api:profile:share:{user_id}", idempotency_key) as idem:
+        if idem.replay is not None:
+            return idem.replay
+        if make_public is None:
+            p = _ensure_public_profile(db, user_id)
+        else:
+            p = _set_profile_public(db, user_id, bool(make_public))
+        base = _external_base_url(request)
+        return idem.done({"ok": True, "token": p["token"], "is_public": p["is_public"], "url": f"{base}/p/{p['token']}"})
+
+
+_LOG_EXPORT_HEADER = ["date", "title", "points", "created_at"]
+
+
+def _task_log_export_query(user_id: int | None, start, end) -> tuple[str, list]:
+    where, params = [], []
+    if user_id is not None:
+        where.append("l.user_id = ?")
+        params.append(int(user_id))
+    if start:
+        where.append("l.date >= ?")
+        params.append(start.isoformat())
+    if end:
+        where.append("l.date <= ?")
+        params.append(end.isoformat())
+    cols = "l.date, t.title, t.points, l.created_at" if user_id is not None else "l.user_id, l.task_id, l.date, t.title, t.points, l.lang, l.created_at"
+    sql = f"""
+        SELECT {cols}
+        FROM user_task_logs l
+        LEFT JOIN tasks t ON t.id = l.task_id
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY l.date DESC, l.id DESC;
+    """
+    return sql, params
 
 
+@router.get("/api/export/logs")
 @router.get("/api/export/logs.csv")
-def export_logs_csv(
+def export_logs(
     request: Request,
     user_id: int | None = None,
-    x_telegram_init_data: str | None = Header(default=None),
+    format: str = "csv",
+    start: str | None = None,
+    end: str | None = None,
+    gzip: bool = False,
+    auth: dict | None = Depends(_webapp_user),
     db: sqlite3.Connection = Depends(get_db),
 ):
+    """导出当前用户的全部打卡记录（流式，支持日期范围 / ndjson / gzip）。"""
     _rate_limit_or_429(db, ip=_client_ip(request), key="api:export:logs", limit=60)
-    if x_telegram_init_data:
-        u = parse_telegram_user_from_init_data(x_telegram_init_data)
-        user_id = int(u["telegram_id"])
-    elif REQUIRE_TG_INIT_DATA:
-        raise HTTPException(status_code=401, detail="Missing X-Telegram-Init-Data")
+    if auth:
+        user_id = auth["telegram_id"]
     if user_id is None:
         user_id = 1
-    rows = list_recent_task_logs(db, int(user_id), limit=500)
-    output = StringIO()
-    w = csv.writer(output)
-    w.writerow(["date", "title", "points", "created_at"])
-    for r in rows:
-        w.writerow([r.get("date"), r.get("title"), r.get("points"), r.get("created_at")])
-    csv_text = output.getvalue()
-    return Response(
-        content=csv_text,
-        media_type="text/csv; charset=utf-8",
-        headers={"Content-Disposition": 'attachment; filename="greensphere_logs.csv"'},
+    start_d, end_d = export_service.parse_date_range(start, end)
+    sql, params = _task_log_export_query(int(user_id), start_d, end_d)
+    return export_service.export_response(
+        _LOG_EXPORT_HEADER,
+        export_service.iter_sqlite_rows(sql, params),
+        fmt=format,
+        filename="greensphere_logs",
+        gzip=gzip,
     )
 
 
-
 # 用户初始化：用 Telegram 用户建立/获取内部 user_id
 @router.post("/api/init_user")
 def init_user(
     body: UserInitRequest,
     background_tasks: BackgroundTasks,
     request: Request,
-    x_telegram_init_data: str | None = Header(default=None),
+    x_gs_lang: str | None = Header(default=None),
+    auth: dict | None = Depends(_webapp_user),
     db: sqlite3.Connection = Depends(get_db),
 ):
     _rate_limit_or_429(db, ip=_client_ip(request), key="api:init_user", limit=20)
-    if x_telegram_init_data:
-        u = parse_telegram_user_from_init_data(x_telegram_init_data)
-        body.telegram_id = int(u["telegram_id"])
-        body.username = u.get("username") or body.username
-    elif REQUIRE_TG_INIT_DATA:
-        raise HTTPException(status_code=401, detail="Missing X-Telegram-Init-Data")
+    if auth:
+        body.telegram_id = auth["telegram_id"]
+        body.username = auth.get("username") or body.username
 
     c = db.cursor()
 
@@ -408,12 +428,7 @@ def init_user(
     c.execute("SELECT id FROM users WHERE id = ?;", (int(body.telegram_id),))
     row = c.fetchone()
 
-    if row is None:
-        c.execute(
-            "INSERT INTO users (id, name, created_at) VALUES (?, ?, datetime('now'));",
-            (int(body.telegram_id), body.username or "Telegram User"),
-        )
-        db.commit()
+    if row is None and record_new_user(db, int(body.telegram_id), body.username or "Telegram User"):
         user_id = int(body.telegram_id)
         log_system_event(
             db,
@@ -426,49 +441,45 @@ def init_user(
             f"🆕 新用户注册\ntelegram_id: {body.telegram_id}\nname: {body.username or 'Telegram User'}\n来源：/api/init_user",
         )
     else:
-        user_id = row["id"]
+        user_id = int(body.telegram_id)
 
-    return {"user_id": user_id}
+    if not auth or auth.get("via") != "init_data":
+        # 只拿会话来的不续签：会话到期后必须重新校验 initData
+        return {"user_id": user_id}
+    # 刚验过 initData：签发短期会话，后续请求只带 X-GS-Session
+    session = make_session_token(user_id, _request_lang(request, x_gs_lang, auth))
+    return {"user_id": user_id, "session": session, "session_expires_in": session_ttl_seconds() if session else None}
 
 
 # 获取任务列表 + 今日完成情况 + 统计
-@router.get("/api/tasks")
-def get_tasks(
-    request: Request,
-    user_id: int | None = None,
-    x_telegram_init_data: str | None = Header(default=None),
-    x_gs_lang: str | None = Header(default=None),
-    db: sqlite3.Connection = Depends(get_db),
-):
-    _rate_limit_or_429(db, ip=_client_ip(request), key="api:tasks", limit=120)
-    if x_telegram_init_data:
-        u = parse_telegram_user_from_init_data(x_telegram_init_data)
-        user_id = int(u["telegram_id"])
-    elif REQUIRE_TG_INIT_DATA:
-        raise HTTPException(status_code=401, detail="Missing X-Telegram-Init-Data")
-    if user_id is None:
-        user_id = 1
-    c = db.cursor()
+def _compose_dashboard(db: sqlite3.Connection, user_id: int, locale: str, today_str: str, versions: dict) -> dict:
+    """/api/tasks 的载荷：全局部分走 global_section（所有用户共用），其余按用户现查。"""
+
+    def localized_tasks() -> list[dict]:
+        rows = []
+        for t in list_tasks_catalog(db):
+            m = t["i18n"]
+            title = (m.get(locale) or m.get("en") or t["title"]) if m else t["title"]
+            rows.append({"id": t["id"], "title": title, "points": t["points"]})
+        return rows
+
+    def challenge_rows() -> list[dict]:
+        return [
+            {
+                "id": ch["id"],
+                "code": ch["code"],
+                "title": ch["title"],
+                "description": ch.get("description"),
+                "start_date": ch["start_date"],
+                "end_date": ch["end_date"],
+                "status": ch["status"],
+            }
+            for ch in list_challenges(db)
+        ]
 
-    # 所有任务
-    c.execute("SELECT id, title, points, i18n_json FROM tasks;")
-    raw_tasks = [dict(row) for row in c.fetchall()]
-    locale = _normalize_lang(x_gs_lang) if x_gs_lang else _normalize_lang(request.headers.get("accept-language"))
-    tasks = []
-    for t in raw_tasks:
-        title = t.get("title")
-        i18n_json = t.get("i18n_json")
-        if i18n_json:
-            try:
-                m = json.loads(i18n_json)
-                if isinstance(m, dict):
-                    title = m.get(locale) or m.get("en") or title
-            except Exception:
-                pass
-        tasks.append({"id": t.get("id"), "title": title, "points": t.get("points")})
+    c = db.cursor()
 
     # 今天已完成的任务
-    today_str = get_today_str()
     c.execute(
         """
         SELECT task_id FROM user_task_logs
@@ -477,9 +488,10 @@ def get_tasks(
         (user_id, today_str),
     )
     done_today_ids = {row["task_id"] for row in c.fetchall()}
-
-    for t in tasks:
-        t["completed_today"] = t["id"] in done_today_ids
+    tasks = [
+        {**t, "completed_today": t["id"] in done_today_ids}
+        for t in global_section("tasks", locale, versions["tasks"], localized_tasks)
+    ]
 
     stats = calculate_stats(db, user_id)
     badges = list_user_badges(db, user_id)
@@ -499,52 +511,70 @@ def get_tasks(
         recent_logs.append({"date": x.get("date"), "title": title, "points": x.get("points")})
 
     next_rewards = list_next_rewards(db, user_id, limit=3)
-    challenges = list_challenges(db)
     joined_ids = list_user_challenge_ids(db, user_id)
-    challenge_rows = []
-    for ch in challenges:
-        challenge_rows.append(
-            {
-                "id": ch["id"],
-                "code": ch["code"],
-                "title": ch["title"],
-                "description": ch.get("description"),
-                "start_date": ch["start_date"],
-                "end_date": ch["end_date"],
-                "status": ch["status"],
-                "joined": int(ch["id"]) in joined_ids,
-            }
-        )
-    rewards = list_rewards(db)
-    feed = list_feed(db, limit=20)
+    challenges = [
+        {**ch, "joined": int(ch["id"]) in joined_ids}
+        for ch in global_section("challenges", "", versions["challenges"], challenge_rows)
+    ]
     return {
         "tasks": tasks,
         "stats": stats,
         "badges": badges,
         "recent_logs": recent_logs,
         "next_rewards": next_rewards,
-        "challenges": challenge_rows,
-        "rewards": rewards,
-        "feed": feed,
+        "challenges": challenges,
+        "rewards": global_section("rewards", "", versions["rewards"], lambda: list_rewards(db)),
+        "feed": global_section("feed", "", versions["feed"], lambda: list_feed(db, limit=20)),
     }
 
 
+@router.get("/api/tasks")
+def get_tasks(
+    request: Request,
+    user_id: int | None = None,
+    auth: dict | None = Depends(_webapp_user),
+    x_gs_lang: str | None = Header(default=None),
+    if_none_match: str | None = Header(default=None),
+    db: sqlite3.Connection = Depends(get_db),
+):
+    _rate_limit_or_429(db, ip=_client_ip(request), key="api:tasks", limit=120)
+    if auth:
+        user_id = auth["telegram_id"]
+    if user_id is None:
+        user_id = 1
+    user_id = int(user_id)
+
+    # 版本号没变 -> 304；本进程缓存里有同一 ETag 的整包 -> 直接发 bytes（见 gs_dashboard.py）
+    locale = _request_lang(request, x_gs_lang, auth)
+    today_str = get_today_str()
+    versions = dashboard_versions(db, user_id)
+    etag = dashboard_etag(user_id, locale, today_str, versions)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    body = dashboard_cache.get((user_id, locale), etag)
+    if body is None:
+        # 载荷大、每次打开小程序都要拉：直接序列化，不走 jsonable_encoder
+        body = dumps_json(_compose_dashboard(db, user_id, locale, today_str, versions))
+        dashboard_cache.put((user_id, locale), etag, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 # 完成任务（打卡）
 @router.post("/api/complete")
 def complete_task(
     body: CompleteTaskRequest,
     background_tasks: BackgroundTasks,
     request: Request,
-    x_telegram_init_data: str | None = Header(default=None),
+    auth: dict | None = Depends(_webapp_user),
+    idempotency_key: str | None = Header(default=None),
+    x_gs_lang: str | None = Header(default=None),
     db: sqlite3.Connection = Depends(get_db),
 ):
     ip = _client_ip(request)
     _rate_limit_or_429(db, ip=ip, key="api:complete", limit=60)
-    if x_telegram_init_data:
-        u = parse_telegram_user_from_init_data(x_telegram_init_data)
-        body.user_id = int(u["telegram_id"])
-    elif REQUIRE_TG_INIT_DATA:
-        raise HTTPException(status_code=401, detail="Missing X-Telegram-Init-Data")
+    if auth:
+        body.user_id = auth["telegram_id"]
     if body.user_id is None:
         return {"ok": False, "reason": "Missing user_id"}
     c = db.cursor()
@@ -552,102 +582,240 @@ def complete_task(
 
     _rate_limit_or_429(db, ip=ip, key=f"api:complete:user:{int(body.user_id)}", limit=30)
 
-    c.execute("SELECT id FROM tasks WHERE id = ?;", (body.task_id,))
-    if c.fetchone() is None:
-        raise HTTPException(status_code=404, detail="Task not found")
+    with idempotent(db, f"api:complete:{int(body.user_id)}", idempotency_key) as idem:
+        if idem.replay is not None:
+            if "status" in (idem.replay_body or {}):
+                return FastJSONResponse(content=_single_replay(idem.replay_body), headers={"Idempotent-Replayed": "true"})
+            return idem.replay
+        c.execute("SELECT id FROM tasks WHERE id = ?;", (body.task_id,))
+        if c.fetchone() is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+
+        # 插入记录（当天已完成过则视为重复），同时累加 daily_metrics
+        locale = _request_lang(request, x_gs_lang, auth)
+        if not record_task_completion(db, int(body.user_id), body.task_id, lang=locale, date_str=today_str):
+            log_system_event(
+                db,
+                level="info",
+                event="task_complete_duplicate",
+                message=f"user={body.user_id} task={body.task_id}",
+            )
+            return idem.done({"ok": True, "duplicate": True})
 
-    # 检查当天是否已完成过
-    c.execute(
-        """
-        SELECT id FROM user_task_logs
-        WHERE user_id = ? AND task_id = ? AND date = ?;
-        """,
-        (int(body.user_id), body.task_id, today_str),
-    )
-    if c.fetchone() is not None:
+        # 查任务标题用于提示
+        c.execute("SELECT title FROM tasks WHERE id = ?;", (body.task_id,))
+        row = c.fetchone()
+        task_title = row["title"] if row else "绿色任务"
+
+        # 后台给用户发一条打卡成功消息
+        msg = f"✅ 你已完成今天的绿色任务：{task_title}"
+        background_tasks.add_task(send_telegram_message, body.user_id, msg)
         log_system_event(
             db,
             level="info",
-            event="task_complete_duplicate",
+            event="task_completed",
             message=f"user={body.user_id} task={body.task_id}",
         )
-        return {"ok": True, "duplicate": True}
+        try:
+            add_feed_event(db, int(body.user_id), "task_completed", f"✅ 完成任务：{task_title}")
+        except Exception:
+            pass
+
+        newly_unlocked = unlock_eligible_badges(db, body.user_id)
+        if newly_unlocked:
+            titles = "、".join([x["title"] for x in newly_unlocked])
+            background_tasks.add_task(
+                send_telegram_message,
+                body.user_id,
+                f"🏅 解锁新徽章：{titles}\n去「LeafPass」看看你的绿色档案吧。",
+            )
+            background_tasks.add_task(
+                send_monitor_message,
+                f"🏅 徽章解锁\nuser: {body.user_id}\nbadges: {', '.join([x['code'] for x in newly_unlocked])}\n来源：/api/complete",
+            )
+            log_system_event(
+                db,
+                level="info",
+                event="badge_unlocked",
+                message=f"user={body.user_id} badges={','.join([x['code'] for x in newly_unlocked])}",
+            )
 
-    # 插入记录
-    c.execute(
-        """
-        INSERT INTO user_task_logs (user_id, task_id, date, created_at)
-        VALUES (?, ?, ?, ?);
-        """,
-        (body.user_id, body.task_id, today_str, datetime.utcnow().isoformat()),
-    )
-    db.commit()
+        return idem.done({"ok": True, "duplicate": False, "new_badges": newly_unlocked})
 
-    # 查任务标题用于提示
-    c.execute("SELECT title FROM tasks WHERE id = ?;", (body.task_id,))
-    row = c.fetchone()
-    task_title = row["title"] if row else "绿色任务"
-
-    # 后台给用户发一条打卡成功消息
-    msg = f"✅ 你已完成今天的绿色任务：{task_title}"
-    background_tasks.add_task(send_telegram_message, body.user_id, msg)
-    log_system_event(
-        db,
-        level="info",
-        event="task_completed",
-        message=f"user={body.user_id} task={body.task_id}",
-    )
-    try:
-        add_feed_event(db, int(body.user_id), "task_completed", f"✅ 完成任务：{task_title}")
-    except Exception:
-        pass
 
-    newly_unlocked = unlock_eligible_badges(db, body.user_id)
-    if newly_unlocked:
-        titles = "、".join([x["title"] for x in newly_unlocked])
-        background_tasks.add_task(
-            send_telegram_message,
-            body.user_id,
-            f"🏅 解锁新徽章：{titles}\n去「LeafPass」看看你的绿色档案吧。",
-        )
-        background_tasks.add_task(
-            send_monitor_message,
-            f"🏅 徽章解锁\nuser: {body.user_id}\nbadges: {', '.join([x['code'] for x in newly_unlocked])}\n来源：/api/complete",
-        )
+BATCH_MAX_ITEMS = 50
+OFFLINE_GRACE_SECONDS = int((os.getenv("GS_OFFLINE_GRACE_HOURS") or "48").strip() or "48") * 3600
+_CLIENT_CLOCK_SKEW_SECONDS = 300
+
+
+def _batch_replay(item, body: dict) -> dict:
+    """回放的是单条打卡（/api/complete）存下的响应时，换成批量条目的格式。"""
+    if "status" in body:
+        return body
+    return {"task_id": item.task_id, "status": "duplicate" if body.get("duplicate") else "completed"}
+
+
+def _single_replay(body: dict) -> dict:
+    """反过来：回放的是批量打卡存下的条目时，换成单条打卡的格式。"""
+    status = body.get("status")
+    if status == "not_found":
+        raise HTTPException(status_code=404, detail="Task not found")
+    if status == "expired":
+        return {"ok": False, "reason": "Offline completion expired"}
+    return {"ok": True, "duplicate": status != "completed", "new_badges": []}
+
+
+def _completion_date_for(client_ts: int | None, now: float, finalized: set[str] = frozenset()) -> str | None:
+    """离线点击按点击当天（报表时区）记账；超过宽限期返回 None，未来时间按现在处理。
+
+    那天的 daily_metrics 已经定稿（日报发出去了）也返回 None：补进去的打卡不会再进日报。
+    """
+    if not client_ts:
+        return get_today_str()
+    ts = client_ts / 1000.0
+    if ts > now + _CLIENT_CLOCK_SKEW_SECONDS:
+        ts = now
+    if now - ts > OFFLINE_GRACE_SECONDS:
+        return None
+    date_str = report_date_for(min(ts, now)).strftime("%Y-%m-%d")
+    return None if date_str in finalized else date_str
+
+
+# 批量打卡（离线队列补发）：一个事务处理多条，统计 / 徽章只算一次
+@router.post("/api/complete/batch")
+def complete_task_batch(
+    body: CompleteBatchRequest,
+    background_tasks: BackgroundTasks,
+    request: Request,
+    auth: dict | None = Depends(_webapp_user),
+    x_gs_lang: str | None = Header(default=None),
+    db: sqlite3.Connection = Depends(get_db),
+):
+    ip = _client_ip(request)
+    _rate_limit_or_429(db, ip=ip, key="api:complete:batch", limit=30)
+    if auth:
+        body.user_id = auth["telegram_id"]
+    if body.user_id is None:
+        return {"ok": False, "reason": "Missing user_id"}
+    if len(body.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Too many items (max {BATCH_MAX_ITEMS})")
+    user_id = int(body.user_id)
+    _rate_limit_or_429(db, ip=ip, key=f"api:complete:user:{user_id}", limit=30)
+
+    locale = _request_lang(request, x_gs_lang, auth)
+    tasks = {int(t["id"]): t for t in list_tasks_catalog(db)}
+    # 和单条打卡共用 Idempotency-Key 的 scope：同一次点击先走单条、再随离线队列补发也只记一次
+    scope = f"api:complete:{user_id}"
+    keys = [normalize_key(item.idempotency_key) for item in body.items]
+    now = time.time()
+    finalized = finalized_metric_dates(db, report_date_for(now - OFFLINE_GRACE_SECONDS).strftime("%Y-%m-%d"))
+    results: list[dict | None] = [None] * len(body.items)
+    completed_titles: list[str] = []
+
+    # 先占住所有 key（共享存储时 begin 自己会 commit），再在一个事务里处理剩下的条目
+    claimed: dict[str, int] = {}
+    try:
+        for i, (item, key) in enumerate(zip(body.items, keys)):
+            if key is None or key in claimed:
+                continue
+            hit = idempotency_store.begin(db, scope, key)
+            if hit is None:
+                claimed[key] = i
+            else:
+                results[i] = {**_batch_replay(item, hit[1]), "idempotency_key": key, "replayed": True}
+
+        for i, (item, key) in enumerate(zip(body.items, keys)):
+            if results[i] is not None:
+                continue
+            if key is not None and claimed[key] != i:
+                continue
+            if int(item.task_id) not in tasks:
+                result = {"task_id": item.task_id, "status": "not_found"}
+            else:
+                date_str = _completion_date_for(item.client_ts, now, finalized)
+                if date_str is None:
+                    result = {"task_id": item.task_id, "status": "expired"}
+                elif record_task_completion(db, user_id, int(item.task_id), lang=locale, date_str=date_str, commit=False):
+                    result = {"task_id": item.task_id, "status": "completed", "date": date_str}
+                    completed_titles.append(tasks[int(item.task_id)]["title"] or "绿色任务")
+                else:
+                    result = {"task_id": item.task_id, "status": "duplicate", "date": date_str}
+            if key is not None:
+                result["idempotency_key"] = key
+            results[i] = result
+        db.commit()
+    except BaseException:
+        for key in claimed:
+            idempotency_store.abort(db, scope, key)
+        raise
+    for key, i in claimed.items():
+        idempotency_store.finish(db, scope, key, results[i])
+    # 同一批里重复的 key：回放第一次的结果
+    for i, key in enumerate(keys):
+        if results[i] is None:
+            results[i] = {**results[claimed[key]], "replayed": True}
+
+    newly_unlocked: list[dict] = []
+    if completed_titles:
+        titles = "、".join(completed_titles)
+        background_tasks.add_task(send_telegram_message, user_id, f"✅ 你已完成绿色任务：{titles}")
         log_system_event(
             db,
             level="info",
-            event="badge_unlocked",
-            message=f"user={body.user_id} badges={','.join([x['code'] for x in newly_unlocked])}",
+            event="task_completed_batch",
+            message=f"user={user_id} count={len(completed_titles)} items={len(body.items)}",
         )
+        try:
+            add_feed_event(db, user_id, "task_completed", f"✅ 完成任务：{titles}")
+        except Exception:
+            pass
+        newly_unlocked = unlock_eligible_badges(db, user_id)
+        if newly_unlocked:
+            background_tasks.add_task(
+                send_telegram_message,
+                user_id,
+                f"🏅 解锁新徽章：{'、'.join([x['title'] for x in newly_unlocked])}\n去「LeafPass」看看你的绿色档案吧。",
+            )
+            log_system_event(
+                db,
+                level="info",
+                event="badge_unlocked",
+                message=f"user={user_id} badges={','.join([x['code'] for x in newly_unlocked])}",
+            )
 
-    return {"ok": True, "duplicate": False, "new_badges": newly_unlocked}
+    return {
+        "ok": True,
+        "results": results,
+        "new_badges": newly_unlocked,
+        "stats": calculate_stats(db, user_id),
+    }
 
 
 @router.post("/api/challenges/join")
 def api_join_challenge(
     request: Request,
     body: dict,
-    x_telegram_init_data: str | None = Header(default=None),
+    auth: dict | None = Depends(_webapp_user),
+    idempotency_key: str | None = Header(default=None),
     db: sqlite3.Connection = Depends(get_db),
 ):
     ip = _client_ip(request)
     _rate_limit_or_429(db, ip=ip, key="api:challenges:join", limit=30)
     user_id = int(body.get("user_id") or 0)
     challenge_id = int(body.get("challenge_id") or 0)
-    if x_telegram_init_data:
-        u = parse_telegram_user_from_init_data(x_telegram_init_data)
-        user_id = int(u["telegram_id"])
-    elif REQUIRE_TG_INIT_DATA:
-        raise HTTPException(status_code=401, detail="Missing X-Telegram-Init-Data")
+    if auth:
+        user_id = auth["telegram_id"]
     if not user_id or not challenge_id:
         raise HTTPException(status_code=400, detail="Missing user_id/challenge_id")
-    join_challenge(db, challenge_id, user_id)
-    try:
-        add_feed_event(db, user_id, "challenge_joined", f"🎯 加入挑战：{challenge_id}")
-    except Exception:
-        pass
-    return {"ok": True}
+    with idempotent(db, f"api:challenges:join:{user_id}", idempotency_key) as idem:
+        if idem.replay is not None:
+            return idem.replay
+        join_challenge(db, challenge_id, user_id)
+        try:
+            add_feed_event(db, user_id, "challenge_joined", f"🎯 加入挑战：{challenge_id}")
+        except Exception:
+            pass
+        return idem.done({"ok": True})
 
 
 @router.get("/api/challenges/{challenge_id}/leaderboard")
@@ -665,69 +833,77 @@ def api_challenge_leaderboard(
 def api_feed_like(
     request: Request,
     body: dict,
-    x_telegram_init_data: str | None = Header(default=None),
+    auth: dict | None = Depends(_webapp_user),
+    idempotency_key: str | None = Header(default=None),
     db: sqlite3.Connection = Depends(get_db),
 ):
     _rate_limit_or_429(db, ip=_client_ip(request), key="api:feed:like", limit=120)
     user_id = int(body.get("user_id") or 0)
     feed_id = int(body.get("feed_id") or 0)
-    if x_telegram_init_data:
-        u = parse_telegram_user_from_init_data(x_telegram_init_data)
-        user_id = int(u["telegram_id"])
-    elif REQUIRE_TG_INIT_DATA:
-        raise HTTPException(status_code=401, detail="Missing X-Telegram-Init-Data")
+    if auth:
+        user_id = auth["telegram_id"]
     if not user_id or not feed_id:
         raise HTTPException(status_code=400, detail="Missing user_id/feed_id")
-    like_feed(db, feed_id, user_id)
-    return {"ok": True}
+    with idempotent(db, f"api:feed:like:{user_id}", idempotency_key) as idem:
+        if idem.replay is not None:
+            return idem.replay
+        like_feed(db, feed_id, user_id)
+        return idem.done({"ok": True})
 
 
 @router.post("/api/feed/comment")
 def api_feed_comment(
     request: Request,
     body: dict,
-    x_telegram_init_data: str | None = Header(default=None),
+    auth: dict | None = Depends(_webapp_user),
+    idempotency_key: str | None = Header(default=None),
     db: sqlite3.Connection = Depends(get_db),
 ):
     _rate_limit_or_429(db, ip=_client_ip(request), key="api:feed:comment", limit=60)
     user_id = int(body.get("user_id") or 0)
     feed_id = int(body.get("feed_id") or 0)
     text = (body.get("text") or "").strip()
-    if x_telegram_init_data:
-        u = parse_telegram_user_from_init_data(x_telegram_init_data)
-        user_id = int(u["telegram_id"])
-    elif REQUIRE_TG_INIT_DATA:
-        raise HTTPException(status_code=401, detail="Missing X-Telegram-Init-Data")
+    if auth:
+        user_id = auth["telegram_id"]
     if not user_id or not feed_id or not text:
         raise HTTPException(status_code=400, detail="Missing user_id/feed_id/text")
-    comment_feed(db, feed_id, user_id, text)
-    return {"ok": True}
+    with idempotent(db, f"api:feed:comment:{user_id}", idempotency_key) as idem:
+        if idem.replay is not None:
+            return idem.replay
+        comment_feed(db, feed_id, user_id, text)
+        return idem.done({"ok": True})
 
 
 @router.post("/api/rewards/redeem")
 def api_redeem_reward(
     request: Request,
     body: dict,
-    x_telegram_init_data: str | None = Header(default=None),
+    auth: dict | None = Depends(_webapp_user),
+    idempotency_key: str | None = Header(default=None),
     db: sqlite3.Connection = Depends(get_db),
 ):
     _rate_limit_or_429(db, ip=_client_ip(request), key="api:rewards:redeem", limit=20)
     user_id = int(body.get("user_id") or 0)
     reward_id = int(body.get("reward_id") or 0)
     note = (body.get("note") or "").strip()
-    if x_telegram_init_data:
-        u = parse_telegram_user_from_init_data(x_telegram_init_data)
-        user_id = int(u["telegram_id"])
-    elif REQUIRE_TG_INIT_DATA:
-        raise HTTPException(status_code=401, detail="Missing X-Telegram-Init-Data")
+    if auth:
+        user_id = auth["telegram_id"]
     if not user_id or not reward_id:
         raise HTTPException(status_code=400, detail="Missing user_id/reward_id")
-    rid = create_redemption(db, reward_id, user_id, note=note)
-    try:
-        add_feed_event(db, user_id, "reward_redeem", f"🎁 提交兑换申请：reward={reward_id}")
-    except Exception:
-        pass
-    return {"ok": True, "id": rid}
+    with idempotent(db, f"api:rewards:redeem:{user_id}", idempotency_key) as idem:
+        if idem.replay is not None:
+            return idem.replay
+        try:
+            rid = create_redemption(db, reward_id, user_id, note=note)
+        except LookupError:
+            raise HTTPException(status_code=404, detail="Reward not found")
+        except InsufficientPoints:
+            raise HTTPException(status_code=409, detail="Insufficient points")
+        try:
+            add_feed_event(db, user_id, "reward_redeem", f"🎁 提交兑换申请：reward={reward_id}")
+        except Exception:
+            pass
+        return idem.done({"ok": True, "id": rid})
 
 
 @router.get("/api/admin/logs")
@@ -749,8 +925,9 @@ def admin_list_tasks(
 ):
     _rate_limit_or_429(db, ip=_client_ip(request), key="admin:tasks", limit=120)
     c = db.cursor()
+    c.row_factory = None
     c.execute("SELECT id, title, points, i18n_json FROM tasks ORDER BY id ASC;")
-    return {"tasks": [dict(r) for r in c.fetchall()]}
+    return {"tasks": fetch_dicts(c)}
 
 
 @router.post("/api/admin/tasks")
@@ -767,6 +944,7 @@ def admin_create_task(
         return {"ok": False, "reason": "Missing title"}
     c = db.cursor()
     c.execute("INSERT INTO tasks (title, points) VALUES (?, ?);", (title, points))
+    bump_cache_version(db, "tasks")
     db.commit()
     return {"ok": True, "task_id": c.lastrowid}
 
@@ -784,6 +962,7 @@ def admin_update_task(
     points = int(body.get("points") or 0)
     c = db.cursor()
     c.execute("UPDATE tasks SET title = ?, points = ? WHERE id = ?;", (title, points, task_id))
+    bump_cache_version(db, "tasks")
     db.commit()
     return {"ok": True}
 
@@ -798,6 +977,7 @@ def admin_delete_task(
     _rate_limit_or_429(db, ip=_client_ip(request), key="admin:tasks:write", limit=60)
     c = db.cursor()
     c.execute("DELETE FROM tasks WHERE id = ?;", (task_id,))
+    bump_cache_version(db, "tasks")
     db.commit()
     return {"ok": True}
 
@@ -811,6 +991,7 @@ def admin_list_users(
 ):
     _rate_limit_or_429(db, ip=_client_ip(request), key="admin:users", limit=120)
     c = db.cursor()
+    c.row_factory = None
     c.execute(
         """
         SELECT u.id, u.name, u.created_at,
@@ -825,7 +1006,7 @@ def admin_list_users(
         """,
         (int(limit),),
     )
-    return {"users": [dict(r) for r in c.fetchall()]}
+    return {"users": fetch_dicts(c)}
 
 
 @router.get("/api/admin/users/{user_id}")
@@ -843,7 +1024,14 @@ def admin_user_detail(
         return {"ok": False, "reason": "User not found"}
     stats = calculate_stats(db, user_id)
     badges = list_user_badges(db, user_id)
-    return {"ok": True, "user": dict(u), "stats": stats, "badges": badges}
+    return {
+        "ok": True,
+        "user": dict(u),
+        "stats": stats,
+        "badges": badges,
+        "points": get_balance(db, user_id),
+        "ledger": list_points_ledger(db, user_id, limit=50),
+    }
 
 
 @router.get("/api/admin/badges")
@@ -854,6 +1042,7 @@ def admin_list_badges(
 ):
     _rate_limit_or_429(db, ip=_client_ip(request), key="admin:badges", limit=120)
     c = db.cursor()
+    c.row_factory = None
     c.execute(
         """
         SELECT b.code, b.title, b.description, b.rule_type, b.threshold,
@@ -862,7 +1051,7 @@ def admin_list_badges(
         ORDER BY b.id ASC;
         """
     )
-    return {"badges": [dict(r) for r in c.fetchall()]}
+    return {"badges": fetch_dicts(c)}
 
 
 @router.get("/api/admin/challenges")
@@ -873,6 +1062,7 @@ def admin_list_challenges(
 ):
     _rate_limit_or_429(db, ip=_client_ip(request), key="admin:challenges", limit=120)
     c = db.cursor()
+    c.row_factory = None
     c.execute(
         """
         SELECT id, code, title, description, start_date, end_date, status, created_at
@@ -880,7 +1070,7 @@ def admin_list_challenges(
         ORDER BY id DESC;
         """
     )
-    challenges = [dict(r) for r in c.fetchall()]
+    challenges = fetch_dicts(c)
     for ch in challenges:
         c.execute(
             """
@@ -892,9 +1082,9 @@ def admin_list_challenges(
             """,
             (int(ch["id"]),),
         )
-        ch["tasks"] = [dict(r) for r in c.fetchall()]
+        ch["tasks"] = fetch_dicts(c)
         c.execute("SELECT COUNT(*) AS cnt FROM challenge_participants WHERE challenge_id = ?;", (int(ch["id"]),))
-        ch["participants"] = c.fetchone()["cnt"] or 0
+        ch["participants"] = c.fetchone()[0] or 0
     return {"challenges": challenges}
 
 
@@ -922,6 +1112,7 @@ def admin_create_challenge(
         """,
         (code, title, description, start_date, end_date, status, datetime.utcnow().isoformat()),
     )
+    bump_cache_version(db, "challenges")
     db.commit()
     return {"ok": True, "id": c.lastrowid}
 
@@ -941,11 +1132,11 @@ def admin_set_challenge_tasks(
     ids = [int(x) for x in task_ids if str(x).strip().isdigit()]
     c = db.cursor()
     c.execute("DELETE FROM challenge_tasks WHERE challenge_id = ?;", (int(challenge_id),))
-    for tid in ids:
-        c.execute(
-            "INSERT OR IGNORE INTO challenge_tasks (challenge_id, task_id) VALUES (?, ?);",
-            (int(challenge_id), int(tid)),
-        )
+    c.executemany(
+        "INSERT INTO challenge_tasks (challenge_id, task_id) VALUES (?, ?) ON CONFLICT DO NOTHING;",
+        [(int(challenge_id), int(tid)) for tid in ids],
+    )
+    bump_cache_version(db, "challenges")
     db.commit()
     return {"ok": True}
 
@@ -958,6 +1149,7 @@ def admin_list_rewards(
 ):
     _rate_limit_or_429(db, ip=_client_ip(request), key="admin:rewards", limit=120)
     c = db.cursor()
+    c.row_factory = None
     c.execute(
         """
         SELECT id, code, title, description, cost_points, status, created_at
@@ -965,7 +1157,7 @@ def admin_list_rewards(
         ORDER BY id DESC;
         """
     )
-    return {"rewards": [dict(r) for r in c.fetchall()]}
+    return {"rewards": fetch_dicts(c)}
 
 
 @router.post("/api/admin/rewards")
@@ -991,6 +1183,7 @@ def admin_create_reward(
         """,
         (code, title, description, int(cost_points), status, datetime.utcnow().isoformat()),
     )
+    bump_cache_version(db, "rewards")
     db.commit()
     return {"ok": True, "id": c.lastrowid}
 
@@ -1004,6 +1197,7 @@ def admin_list_redemptions(
 ):
     _rate_limit_or_429(db, ip=_client_ip(request), key="admin:redemptions", limit=120)
     c = db.cursor()
+    c.row_factory = None
     c.execute(
         """
         SELECT rr.id, rr.status, rr.note, rr.created_at,
@@ -1017,7 +1211,7 @@ def admin_list_redemptions(
         """,
         (int(limit),),
     )
-    return {"redemptions": [dict(r) for r in c.fetchall()]}
+    return {"redemptions": fetch_dicts(c)}
 
 
 @router.post("/api/admin/redemptions/{redemption_id}")
@@ -1033,15 +1227,76 @@ def admin_update_redemption(
     note = (body.get("note") or "").strip()
     if status not in {"pending", "approved", "rejected"}:
         raise HTTPException(status_code=400, detail="Invalid status")
-    c = db.cursor()
-    c.execute(
-        "UPDATE reward_redemptions SET status = ?, note = ? WHERE id = ?;",
-        (status, note[:255], int(redemption_id)),
-    )
-    db.commit()
+    try:
+        update_redemption_status(db, int(redemption_id), status, note)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Redemption not found")
+    except RedemptionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     return {"ok": True}
 
 
+_CATALOG_MAX_BYTES = 5 * 1024 * 1024
+
+
+@router.post("/api/admin/catalog/{kind}/import")
+async def admin_import_catalog(
+    kind: str,
+    request: Request,
+    format: str | None = None,
+    dry_run: bool = False,
+    delete_missing: bool = False,
+    _auth: None = Depends(admin_auth),
+):
+    """批量导入目录（NDJSON / CSV）。dry_run=1 只返回 diff；delete_missing=1 删除文件里没有的条目。"""
+    raw = await request.body()
+    if len(raw) > _CATALOG_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Catalog too large")
+    ctype = (request.headers.get("content-type") or "").lower()
+    fmt = (format or ("csv" if "csv" in ctype else "ndjson")).lower()
+
+    def run() -> dict:
+        gen = get_db()
+        db = next(gen)
+        try:
+            _rate_limit_or_429(db, ip=_client_ip(request), key="admin:catalog:write", limit=20)
+            summary = catalog_service.import_catalog(
+                db, kind, raw, fmt=fmt, dry_run=dry_run, delete_missing=delete_missing
+            )
+            if not dry_run and (summary["created"] or summary["updated"] or summary["deleted"]):
+                log_system_event(
+                    db,
+                    level="info",
+                    event="catalog_import",
+                    message=f"kind={kind} created={summary['created']} updated={summary['updated']} deleted={summary['deleted']}",
+                )
+            return summary
+        finally:
+            gen.close()
+
+    try:
+        return await run_in_threadpool(run)
+    except catalog_service.CatalogError as e:
+        raise HTTPException(status_code=400, detail={"errors": e.errors[:100]})
+
+
+@router.get("/api/admin/catalog/{kind}/export")
+def admin_export_catalog(
+    kind: str,
+    request: Request,
+    format: str = "ndjson",
+    db: sqlite3.Connection = Depends(get_db),
+    _auth: None = Depends(admin_auth),
+):
+    """导出目录，列与导入格式一致。"""
+    _rate_limit_or_429(db, ip=_client_ip(request), key="admin:catalog:read", limit=60)
+    try:
+        header, rows = catalog_service.export_catalog_rows(db, kind)
+    except catalog_service.CatalogError as e:
+        raise HTTPException(status_code=400, detail={"errors": e.errors})
+    return export_service.export_response(header, [rows], fmt=format, filename=f"greensphere_{kind}")
+
+
 # 管理侧：每日统计
 @router.get("/api/admin/daily-stats")
 def daily_stats(
@@ -1050,47 +1305,169 @@ def daily_stats(
     _auth: None = Depends(admin_auth),
 ):
     _rate_limit_or_429(db, ip=_client_ip(request), key="admin:daily_stats", limit=120)
-    c = db.cursor()
     today = get_today_str()
 
-    # 今日活跃用户数
-    c.execute(
-        """
-        SELECT COUNT(DISTINCT user_id) AS cnt
-        FROM user_task_logs
-        WHERE date = ?;
-        """,
-        (today,),
-    )
-    active_today = c.fetchone()["cnt"] or 0
+    # 读预聚合行；当天还没有任何写入时按原始表建一行（未定稿，夜间任务再定稿）
+    m = get_daily_metrics(db, today)
+    if m is None:
+        m = finalize_daily_metrics(db, today, finalized=False)
 
-    # 总用户数
-    c.execute("SELECT COUNT(*) AS cnt FROM users;")
-    total_users = c.fetchone()["cnt"] or 0
+    return {
+        "date": today,
+        "active_today": m["active_users"],
+        "new_today": m["new_users"],
+        "completions_today": m["completions"],
+        "points_today": m["points"],
+        "total_users": m["total_users"],
+    }
 
-    # 今日新用户（按 created_at 日期粗略统计）
-    c.execute(
-        """
-        SELECT COUNT(*) AS cnt FROM users
-        WHERE DATE(created_at) = DATE('now');
-        """
-    )
-    new_today = c.fetchone()["cnt"] or 0
 
-    # 今日任务完成次数
-    c.execute(
-        """
-        SELECT COUNT(*) AS cnt FROM user_task_logs
-        WHERE date = ?;
-        """,
-        (today,),
-    )
-    completions_today = c.fetchone()["cnt"] or 0
+@router.get("/api/admin/daily-metrics")
+def admin_daily_metrics(
+    request: Request,
+    start: str | None = None,
+    end: str | None = None,
+    breakdown: bool = False,
+    db: sqlite3.Connection = Depends(get_db),
+    _auth: None = Depends(admin_auth),
+):
+    """历史每日指标（给后台图表用），默认最近 30 天，最多 366 天。"""
+    _rate_limit_or_429(db, ip=_client_ip(request), key="admin:daily_metrics", limit=120)
+    try:
+        end_d = datetime.strptime(end, "%Y-%m-%d").date() if end else datetime.strptime(get_today_str(), "%Y-%m-%d").date()
+        start_d = datetime.strptime(start, "%Y-%m-%d").date() if start else end_d - timedelta(days=29)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start/end must be YYYY-MM-DD")
+    if start_d > end_d or (end_d - start_d).days > 365:
+        raise HTTPException(status_code=400, detail="invalid date range")
+    return {
+        "start": start_d.isoformat(),
+        "end": end_d.isoformat(),
+        "items": list_daily_metrics(db, start_d.isoformat(), end_d.isoformat(), include_breakdown=breakdown),
+    }
+
 
+@router.post("/api/admin/daily-metrics/rebuild")
+def admin_rebuild_daily_metrics(
+    request: Request,
+    start: str,
+    end: str,
+    db: sqlite3.Connection = Depends(get_db),
+    _auth: None = Depends(admin_auth),
+):
+    """用原始表重算一段日期（历史回填 / 修正）。"""
+    _rate_limit_or_429(db, ip=_client_ip(request), key="admin:daily_metrics_rebuild", limit=10)
+    try:
+        start_d = datetime.strptime(start, "%Y-%m-%d").date()
+        end_d = datetime.strptime(end, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start/end must be YYYY-MM-DD")
+    if start_d > end_d or (end_d - start_d).days > 365:
+        raise HTTPException(status_code=400, detail="invalid date range")
+    today = get_today_str()
+    d = start_d
+    days = 0
+    while d <= end_d:
+        # 当天（及以后）还会有写入，只重算不定稿
+        finalize_daily_metrics(db, d.isoformat(), finalized=d.isoformat() < today)
+        d += timedelta(days=1)
+        days += 1
+    log_system_event(db, level="info", event="daily_metrics_rebuild", message=f"start={start_d} end={end_d} days={days}")
+    return {"ok": True, "days": days}
+
+
+def _parse_end_date(end: str | None):
+    if not end:
+        return datetime.strptime(get_today_str(), "%Y-%m-%d").date()
+    try:
+        return datetime.strptime(end, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="end must be YYYY-MM-DD")
+
+
+@router.get("/api/admin/analytics/active")
+def admin_analytics_active(
+    request: Request,
+    end: str | None = None,
+    days: int = 30,
+    db: sqlite3.Connection = Depends(get_db),
+    _auth: None = Depends(admin_auth),
+):
+    """DAU / WAU / MAU 与黏性（基于活跃位图）。"""
+    _rate_limit_or_429(db, ip=_client_ip(request), key="admin:analytics", limit=60)
+    if days < 1 or days > 366:
+        raise HTTPException(status_code=400, detail="days must be 1..366")
+    end_d = _parse_end_date(end)
+    return {"items": analytics_service.active_counts(db, end_d - timedelta(days=days - 1), end_d)}
+
+
+@router.get("/api/admin/analytics/cohorts")
+def admin_analytics_cohorts(
+    request: Request,
+    end: str | None = None,
+    period: str = "week",
+    periods: int = 8,
+    db: sqlite3.Connection = Depends(get_db),
+    _auth: None = Depends(admin_auth),
+):
+    """按首次打卡周/日分组的留存矩阵。"""
+    _rate_limit_or_429(db, ip=_client_ip(request), key="admin:analytics", limit=60)
+    if period not in {"week", "day"}:
+        raise HTTPException(status_code=400, detail="period must be week or day")
+    if periods < 1 or periods > (52 if period == "week" else 90):
+        raise HTTPException(status_code=400, detail="periods out of range")
     return {
-        "date": today,
-        "active_today": active_today,
-        "new_today": new_today,
-        "completions_today": completions_today,
-        "total_users": total_users,
+        "period": period,
+        "items": analytics_service.cohort_retention(db, _parse_end_date(end), period=period, periods=periods),
     }
+
+
+@router.get("/api/admin/analytics/streaks")
+def admin_analytics_streaks(
+    request: Request,
+    end: str | None = None,
+    window: int = 90,
+    db: sqlite3.Connection = Depends(get_db),
+    _auth: None = Depends(admin_auth),
+):
+    """当前连续天数 / 窗口内最长连续天数分布。"""
+    _rate_limit_or_429(db, ip=_client_ip(request), key="admin:analytics", limit=60)
+    if window < 1 or window > 366:
+        raise HTTPException(status_code=400, detail="window must be 1..366")
+    return analytics_service.streak_distribution(db, _parse_end_date(end), window=window)
+
+
+@router.post("/api/admin/analytics/rebuild")
+def admin_analytics_rebuild(
+    request: Request,
+    db: sqlite3.Connection = Depends(get_db),
+    _auth: None = Depends(admin_auth),
+):
+    """从 user_task_logs（统一存储阶段还有 Quest 参与日）全量重建活跃位图。"""
+    _rate_limit_or_429(db, ip=_client_ip(request), key="admin:analytics_rebuild", limit=5)
+    users = user_repository.rebuild_behavior_activity(db)
+    log_system_event(db, level="info", event="analytics_rebuild", message=f"users={users}")
+    return {"ok": True, "users": users}
+
+
+@router.get("/api/admin/export/task_logs")
+def admin_export_task_logs(
+    request: Request,
+    format: str = "csv",
+    start: str | None = None,
+    end: str | None = None,
+    gzip: bool = False,
+    db: sqlite3.Connection = Depends(get_db),
+    _auth: None = Depends(admin_auth),
+):
+    """全量打卡日志导出（所有用户，流式）。"""
+    _rate_limit_or_429(db, ip=_client_ip(request), key="admin:export", limit=10)
+    start_d, end_d = export_service.parse_date_range(start, end)
+    sql, params = _task_log_export_query(None, start_d, end_d)
+    return export_service.export_response(
+        ["user_id", "task_id", "date", "title", "points", "lang", "created_at"],
+        export_service.iter_sqlite_rows(sql, params),
+        fmt=format,
+        filename="greensphere_task_logs",
+        gzip=gzip,
+    )
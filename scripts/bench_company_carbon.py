@@ -0,0 +1,180 @@
+"""企业碳账本汇总：原始记录现算 vs company_carbon_monthly 月汇总。
+
+  python scripts/bench_company_carbon.py --companies 10000 --years 10
+
+临时 SQLite 库里造 companies 家企业、每家 years 年的月度排放（每月一条，部分记录跨月）和每季度一笔抵消，然后计时：
+- rebuild：rebuild_company_rollups 全量重算
+- 单个企业按季度汇总：拉原始记录按天摊 vs 查月汇总
+- 所有企业按年汇总：全表扫原始记录 vs 月汇总 GROUP BY
+- 某一年各企业 net 排名前 100
+- create_emission 增量维护的额外开销
+- list_emissions（company_id 过滤 + period_end 倒序 limit 200）的查询计划
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def _timed(fn, rounds: int = 1):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        out = fn()
+    return (time.perf_counter() - t0) / rounds * 1000, out
+
+
+def _seed(db, n_companies: int, years: int) -> tuple[int, int]:
+    from sqlalchemy import insert
+
+    from app.models.company_carbon import Company, CompanyEmission, CompanyOffset
+    from app.services.company_carbon_service import next_month
+
+    rnd = random.Random(7)
+    first = date(date.today().year - years, 1, 1)
+    db.execute(insert(Company), [{"name": f"company-{i:05d}", "industry": "bench"} for i in range(n_companies)])
+    n_em = n_off = 0
+    batch_em, batch_off = [], []
+    for cid in range(1, n_companies + 1):
+        m = first
+        for k in range(years * 12):
+            nm = next_month(m)
+            # 每 6 个月有一条报告跨到下个月中旬，制造重叠
+            end = nm + timedelta(days=14) if k % 6 == 5 else nm - timedelta(days=1)
+            batch_em.append(
+                {
+                    "company_id": cid,
+                    "period_start": m,
+                    "period_end": end,
+                    "scope1_tco2e": rnd.uniform(5, 50),
+                    "scope2_tco2e": rnd.uniform(5, 50),
+                    "scope3_tco2e": rnd.uniform(10, 200),
+                }
+            )
+            if k % 3 == 2:
+                batch_off.append({"company_id": cid, "purchased_at": m + timedelta(days=9), "amount_tco2e": rnd.uniform(10, 100)})
+            m = nm
+        if len(batch_em) >= 50000:
+            db.execute(insert(CompanyEmission), batch_em)
+            db.execute(insert(CompanyOffset), batch_off)
+            n_em += len(batch_em)
+            n_off += len(batch_off)
+            batch_em, batch_off = [], []
+    if batch_em:
+        db.execute(insert(CompanyEmission), batch_em)
+        db.execute(insert(CompanyOffset), batch_off)
+        n_em += len(batch_em)
+        n_off += len(batch_off)
+    db.commit()
+    return n_em, n_off
+
+
+def _raw_periods(db, company_id, granularity: str) -> dict:
+    """不用汇总表：拉原始记录，按天摊到月再合并到期间。"""
+    from sqlalchemy import select
+
+    from app.models.company_carbon import CompanyEmission, CompanyOffset
+    from app.services.company_carbon_service import month_start, period_of, prorate_by_month
+
+    out: dict[str, list[float]] = {}
+    q = select(
+        CompanyEmission.period_start,
+        CompanyEmission.period_end,
+        CompanyEmission.scope1_tco2e,
+        CompanyEmission.scope2_tco2e,
+        CompanyEmission.scope3_tco2e,
+    )
+    if company_id is not None:
+        q = q.where(CompanyEmission.company_id == company_id)
+    for start, end, s1, s2, s3 in db.execute(q):
+        for m, f in prorate_by_month(start, end):
+            b = out.setdefault(period_of(m, granularity)[0], [0.0, 0.0])
+            b[0] += ((s1 or 0) + (s2 or 0) + (s3 or 0)) * f
+    q = select(CompanyOffset.purchased_at, CompanyOffset.amount_tco2e)
+    if company_id is not None:
+        q = q.where(CompanyOffset.company_id == company_id)
+    for purchased_at, amount in db.execute(q):
+        out.setdefault(period_of(month_start(purchased_at), granularity)[0], [0.0, 0.0])[1] += amount
+    return {k: v[0] - v[1] for k, v in out.items()}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--companies", type=int, default=10000)
+    ap.add_argument("--years", type=int, default=10)
+    ap.add_argument("--rounds", type=int, default=20)
+    args = ap.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="gs_bench_carbon_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(data_dir, 'greensphere.db')}"
+
+    from sqlalchemy import text
+
+    from app.core.database import Base, SessionLocal, engine
+    from app.models.company_carbon import CompanyEmission
+    from app.services import company_carbon_service as svc
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        t0 = time.perf_counter()
+        n_em, n_off = _seed(db, args.companies, args.years)
+        print(f"seed     {n_em} emissions, {n_off} offsets in {time.perf_counter() - t0:.1f}s")
+
+        t0 = time.perf_counter()
+        rows = svc.rebuild_company_rollups(db)
+        print(f"rebuild  {rows} monthly rows in {time.perf_counter() - t0:.1f}s")
+
+        cid = args.companies // 2
+        raw_ms, raw = _timed(lambda: _raw_periods(db, cid, "quarter"), args.rounds)
+        roll_ms, roll = _timed(lambda: svc.carbon_periods(db, company_id=cid, granularity="quarter"), args.rounds)
+        assert all(abs(raw[p["period"]] - p["net_tco2e"]) < 1e-6 for p in roll["periods"])
+        print(f"company  quarterly  raw {raw_ms:8.2f}ms   rollup {roll_ms:8.2f}ms   {raw_ms / roll_ms:.1f}x")
+
+        raw_ms, raw = _timed(lambda: _raw_periods(db, None, "year"))
+        roll_ms, roll = _timed(lambda: svc.carbon_periods(db, granularity="year"))
+        assert all(abs(raw[p["period"]] - p["net_tco2e"]) < 1e-3 * max(1.0, abs(p["net_tco2e"])) for p in roll["periods"])
+        print(f"all      yearly     raw {raw_ms:8.1f}ms   rollup {roll_ms:8.1f}ms   {raw_ms / roll_ms:.1f}x")
+
+        year = date.today().year - 1
+        start, end = date(year, 1, 1), date(year, 12, 31)
+        roll_ms, top = _timed(lambda: svc.carbon_by_company(db, start=start, end=end, limit=100), 3)
+        print(f"top100   {year} net     rollup {roll_ms:8.1f}ms   (#1 company {top[0]['company_id']})")
+
+        def add_one() -> None:
+            e = CompanyEmission(
+                company_id=cid, period_start=date(year, 2, 10), period_end=date(year, 5, 20), scope1_tco2e=1.0
+            )
+            db.add(e)
+            db.flush()
+            svc.apply_emission(db, e)
+            db.commit()
+
+        def add_one_raw() -> None:
+            db.add(CompanyEmission(company_id=cid, period_start=date(year, 2, 10), period_end=date(year, 5, 20), scope1_tco2e=1.0))
+            db.commit()
+
+        raw_ms, _ = _timed(add_one_raw, args.rounds)
+        roll_ms, _ = _timed(add_one, args.rounds)
+        print(f"insert   emission   plain {raw_ms:7.2f}ms   +rollup {roll_ms:7.2f}ms")
+
+        sql = (
+            "EXPLAIN QUERY PLAN SELECT * FROM company_emissions WHERE company_id = :cid "
+            "ORDER BY period_end DESC, id DESC LIMIT 200"
+        )
+        plan = " | ".join(str(r[-1]) for r in db.execute(text(sql), {"cid": cid}))
+        print(f"plan     list_emissions: {plan}")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,122 @@
+"""/api/tasks（WebApp 首页）缓存效果：每次现拼 / 本进程整包缓存命中 / If-None-Match 304，以及打卡后的重算。
+
+  python scripts/bench_dashboard.py --users 200 --days 60 --requests 300
+
+临时库里造 users 个用户、每人 days 天的打卡记录，然后用 TestClient 计时：
+- cold：每次请求前清空整包缓存和全局部分（相当于没有这层缓存，目录缓存仍在）
+- warm：同一用户反复拉（整包命中，只查一次版本号）
+- 304 ：带上次的 ETag 拉
+- after write：每次先打卡再拉（版本变了，重算该用户那部分，全局部分仍命中）
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def _seed(n_users: int, n_days: int) -> None:
+    from gs_db import get_db
+
+    gen = get_db()
+    db = next(gen)
+    try:
+        task_ids = [r[0] for r in db.execute("SELECT id FROM tasks ORDER BY id;").fetchall()]
+        today = date.today()
+        db.executemany(
+            "INSERT INTO users (id, name, created_at) VALUES (?, ?, datetime('now')) ON CONFLICT DO NOTHING;",
+            [(1000 + u, f"user{u}") for u in range(n_users)],
+        )
+        rows = []
+        for u in range(n_users):
+            for d in range(n_days):
+                day = (today - timedelta(days=d)).isoformat()
+                for t in task_ids[: 1 + (u + d) % len(task_ids)]:
+                    rows.append((1000 + u, t, day, day + "T08:00:00"))
+        db.executemany(
+            "INSERT INTO user_task_logs (user_id, task_id, date, created_at) VALUES (?, ?, ?, ?) ON CONFLICT DO NOTHING;",
+            rows,
+        )
+        db.commit()
+    finally:
+        gen.close()
+
+
+def _timed(fn, n: int) -> tuple[float, float]:
+    lat = []
+    for i in range(n):
+        t0 = time.perf_counter()
+        fn(i)
+        lat.append((time.perf_counter() - t0) * 1000)
+    lat.sort()
+    return lat[len(lat) // 2], lat[int(len(lat) * 0.99) - 1]
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--days", type=int, default=60)
+    ap.add_argument("--requests", type=int, default=300)
+    args = ap.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="gs_bench_dashboard_")
+    os.environ["GS_BEHAVIOR_DB_PATH"] = os.path.join(data_dir, "behavior.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(data_dir, 'greensphere.db')}"
+    os.environ["GS_COORD_DIR"] = os.path.join(data_dir, "coord")
+    os.environ["GS_SCHEDULER_ENABLED"] = "0"
+
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    import gs_dashboard
+    from gs_dashboard import dashboard_cache
+
+    with TestClient(app) as client:
+        _seed(args.users, args.days)
+
+        def get(i: int, **headers):
+            # 换着 X-Forwarded-For 避开限流
+            headers["X-Forwarded-For"] = f"10.1.{i // 200}.{i % 200}"
+            return client.get("/api/tasks", params={"user_id": 1000 + i % args.users}, headers=headers)
+
+        def cold(i: int) -> None:
+            dashboard_cache.clear()
+            gs_dashboard._sections.clear()
+            get(i).raise_for_status()
+
+        etags = {}
+
+        def warm(i: int) -> None:
+            get(i).raise_for_status()
+
+        def not_modified(i: int) -> None:
+            assert get(i, **{"If-None-Match": etags[i % args.users]}).status_code == 304
+
+        task_ids = [t["id"] for t in get(0).json()["tasks"]]
+
+        def after_write(i: int) -> None:
+            uid = 1000 + i % args.users
+            client.post(
+                "/api/complete",
+                json={"user_id": uid, "task_id": task_ids[(i // args.users) % len(task_ids)]},
+                headers={"X-Forwarded-For": f"10.2.{i // 200}.{i % 200}"},
+            )
+            get(i).raise_for_status()
+
+        for name, fn in (("cold", cold), ("warm", warm), ("304", not_modified), ("after write", after_write)):
+            if name == "warm":
+                for u in range(args.users):
+                    etags[u] = get(u).headers["etag"]
+            p50, p99 = _timed(fn, args.requests)
+            print(f"{name:<12} p50={p50:7.2f}ms  p99={p99:7.2f}ms")
+        print("cache", dashboard_cache.stats())
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,161 @@
+"""/api/tasks 序列化耗时：jsonable_encoder + 标准库 json（原来的路径）对比 FastJSONResponse（orjson / 标准库兜底）。
+
+  python scripts/bench_json.py --tasks 60 --rewards 40 --challenges 30 --rounds 2000
+
+先在临时库里造数据，用 TestClient 拿一份真实的 /api/tasks 载荷，再分别计时：
+- 序列化：同一份载荷在各条路径下 render 成 bytes 的耗时
+- 取行：dict(sqlite3.Row) 对比 fetch_dicts（tuple + 列名）
+- 端到端：TestClient 请求 /api/tasks 的耗时（包含查库、限流等）
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def _per_call_us(fn, rounds: int) -> float:
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - t0) / rounds * 1e6
+
+
+def _seed(n_tasks: int, n_rewards: int, n_challenges: int, n_feed: int) -> None:
+    from gs_db import get_db
+
+    gen = get_db()
+    db = next(gen)
+    try:
+        i18n = json.dumps({"en": "Task", "zh": "任务", "th": "งาน", "vi": "Nhiệm vụ", "km": "កិច្ចការ"}, ensure_ascii=False)
+        db.executemany(
+            "INSERT INTO tasks (title, points, i18n_json) VALUES (?, ?, ?);",
+            [(f"任务 {i}", 10 + i % 5, i18n) for i in range(n_tasks)],
+        )
+        db.executemany(
+            "INSERT INTO rewards (code, title, description, cost_points, status, created_at) VALUES (?, ?, ?, ?, 'active', datetime('now'));",
+            [(f"bench_reward_{i}", f"Reward {i}", "说明文字 " * 8, 100 + i * 10) for i in range(n_rewards)],
+        )
+        db.executemany(
+            """
+            INSERT INTO challenges (code, title, description, start_date, end_date, status, created_at)
+            VALUES (?, ?, ?, date('now', '-1 day'), date('now', '+5 days'), 'active', datetime('now'));
+            """,
+            [(f"bench_ch_{i}", f"Challenge {i}", "挑战说明 " * 10) for i in range(n_challenges)],
+        )
+        db.executemany(
+            "INSERT INTO users (id, name, created_at) VALUES (?, ?, datetime('now')) ON CONFLICT DO NOTHING;",
+            [(1000 + i, f"user{i}") for i in range(n_feed)],
+        )
+        db.executemany(
+            "INSERT INTO activity_feed (user_id, type, message, meta_json, created_at) VALUES (?, 'complete', ?, ?, datetime('now'));",
+            [(1000 + i, f"user{i} completed a task", json.dumps({"task_id": 1, "points": 10})) for i in range(n_feed)],
+        )
+        db.commit()
+    finally:
+        gen.close()
+
+
+def bench_rows(rounds: int) -> None:
+    from gs_db import fetch_dicts, get_db
+
+    gen = get_db()
+    db = next(gen)
+    try:
+        sql = "SELECT id, code, title, description, cost_points, status, created_at FROM rewards ORDER BY id;"
+
+        def via_row():
+            c = db.cursor()
+            c.execute(sql)
+            return [dict(r) for r in c.fetchall()]
+
+        def via_tuple():
+            c = db.cursor()
+            c.row_factory = None
+            c.execute(sql)
+            return fetch_dicts(c)
+
+        assert via_row() == via_tuple()
+        a = _per_call_us(via_row, rounds)
+        b = _per_call_us(via_tuple, rounds)
+        print(f"rows     dict(Row) {a:8.1f}us   fetch_dicts {b:8.1f}us   {a / b:.2f}x")
+    finally:
+        gen.close()
+
+
+def bench_serialize(payload: dict, rounds: int) -> None:
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    import app.core.responses as responses
+
+    stdlib = JSONResponse(content=None)
+    fast = responses.FastJSONResponse(content=None)
+    size = len(fast.render(payload))
+
+    def before():
+        return stdlib.render(jsonable_encoder(payload))
+
+    def after():
+        return fast.render(payload)
+
+    def after_stdlib():
+        return json.dumps(payload, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+    assert json.loads(before()) == json.loads(after())
+    a = _per_call_us(before, rounds)
+    b = _per_call_us(after, rounds)
+    c = _per_call_us(after_stdlib, rounds)
+    engine = "orjson" if responses.orjson is not None else "json"
+    print(f"payload  {size} bytes")
+    print(f"encode   jsonable_encoder+json {a:8.1f}us   FastJSONResponse({engine}) {b:8.1f}us   {a / b:.1f}x")
+    print(f"         without orjson (stdlib fallback) {c:8.1f}us   {a / c:.1f}x")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tasks", type=int, default=60)
+    ap.add_argument("--rewards", type=int, default=40)
+    ap.add_argument("--challenges", type=int, default=30)
+    ap.add_argument("--feed", type=int, default=20)
+    ap.add_argument("--rounds", type=int, default=2000)
+    ap.add_argument("--requests", type=int, default=300)
+    args = ap.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="gs_bench_json_")
+    os.environ["GS_BEHAVIOR_DB_PATH"] = os.path.join(data_dir, "behavior.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(data_dir, 'greensphere.db')}"
+    os.environ["GS_COORD_DIR"] = os.path.join(data_dir, "coord")
+    os.environ["GS_SCHEDULER_ENABLED"] = "0"
+
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as client:
+        _seed(args.tasks, args.rewards, args.challenges, args.feed)
+        r = client.get("/api/tasks", params={"user_id": 1})
+        r.raise_for_status()
+        payload = r.json()
+        bench_serialize(payload, args.rounds)
+        bench_rows(args.rounds)
+
+        lat = []
+        for i in range(args.requests):
+            # 换着 X-Forwarded-For 避开 /api/tasks 的限流
+            t0 = time.perf_counter()
+            client.get("/api/tasks", params={"user_id": 1}, headers={"X-Forwarded-For": f"10.0.{i // 100}.{i % 100}"})
+            lat.append((time.perf_counter() - t0) * 1000)
+        lat.sort()
+        print(f"request  /api/tasks p50={lat[len(lat) // 2]:.2f}ms p99={lat[int(len(lat) * 0.99) - 1]:.2f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,108 @@
+"""启动耗时：冷导入 app.main 的时间，以及从拉起进程到第一个请求返回 200 的时间。
+
+  python scripts/bench_startup.py --runs 5
+  python scripts/bench_startup.py --importtime          # 额外列出导入最慢的模块（python -X importtime）
+
+每轮都是新进程；数据库放在临时目录，第一轮是空库（要建表、写种子数据），
+之后几轮是已初始化的库（结构版本一致，建表被跳过）——线上重启走的是后一种路径。
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+_IMPORT_SNIPPET = "import time; t0 = time.perf_counter(); import app.main; print(time.perf_counter() - t0)"
+
+
+def _env(data_dir: str) -> dict:
+    env = dict(os.environ)
+    env.update(
+        GS_BEHAVIOR_DB_PATH=os.path.join(data_dir, "behavior.db"),
+        DATABASE_URL=f"sqlite:///{os.path.join(data_dir, 'greensphere.db')}",
+        GS_COORD_DIR=os.path.join(data_dir, "coord"),
+        GS_SCHEDULER_ENABLED="0",
+    )
+    return env
+
+
+def measure_import(env: dict) -> float:
+    out = subprocess.run([sys.executable, "-c", _IMPORT_SNIPPET], env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def measure_first_request(env: dict, port: int, path: str, timeout: float = 60) -> float:
+    """从 Popen 到 path 第一次返回 200 的秒数（包含解释器启动、导入、startup 钩子）。"""
+    cmd = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--no-access-log", "--log-level", "warning",
+    ]
+    url = f"http://127.0.0.1:{port}{path}"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=env)
+    try:
+        while time.perf_counter() - t0 < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited with {proc.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=2) as r:
+                    if r.status == 200:
+                        return time.perf_counter() - t0
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"server not ready after {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def slowest_imports(env: dict, top: int) -> list[tuple[int, str]]:
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], env=env, capture_output=True, text=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        # 只看第一层（app / routes / 第三方包本身），不展开子模块
+        if len(name) - len(name.lstrip()) <= 3:
+            rows.append((int(parts[1]), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def _fmt(xs: list[float]) -> str:
+    return f"min={min(xs) * 1000:.0f}ms median={statistics.median(xs) * 1000:.0f}ms max={max(xs) * 1000:.0f}ms"
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--port", type=int, default=8790)
+    ap.add_argument("--path", default="/api/health")
+    ap.add_argument("--importtime", action="store_true")
+    ap.add_argument("--top", type=int, default=15)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="gs_bench_startup_") as data_dir:
+        env = _env(data_dir)
+        imports = [measure_import(env) for _ in range(max(1, args.runs))]
+        print(f"cold import app.main          {_fmt(imports)}")
+
+        fresh = measure_first_request(env, args.port, args.path)
+        print(f"first request (empty db)      {fresh * 1000:.0f}ms")
+        warm = [measure_first_request(env, args.port, args.path) for _ in range(max(1, args.runs))]
+        print(f"first request (initialized)   {_fmt(warm)}")
+
+        if args.importtime:
+            print("slowest top-level imports (cumulative):")
+            for us, name in slowest_imports(env, args.top):
+                print(f"  {us / 1000:8.1f}ms  {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,96 @@
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from app.models import QuestSubmission
+from app.services import streak_service
+
+
+def reference_streak(db: Session, telegram_id: int, today: date) -> int:
+    # 旧实现：取出全部参与日期再往回走
+    days = {
+        r[0]
+        for r in db.execute(
+            select(QuestSubmission.submit_date).where(QuestSubmission.telegram_id == telegram_id).group_by(QuestSubmission.submit_date)
+        )
+    }
+    streak = 0
+    cur = today
+    while cur in days:
+        streak += 1
+        cur -= timedelta(days=1)
+    return streak
+
+
+def build(db: Session, users: int, years: int, seed: int, today: date) -> None:
+    rnd = random.Random(seed)
+    start = today - timedelta(days=365 * years)
+    rows = []
+    for uid in range(1, users + 1):
+        # 活跃度不同的用户：有的天天来（长 streak），有的隔三差五
+        p = rnd.choice((0.3, 0.7, 0.95, 1.0))
+        tail_gap = rnd.choice((0, 0, 1, 3))
+        d = start
+        while d <= today - timedelta(days=tail_gap):
+            if rnd.random() < p:
+                for q in range(rnd.randint(1, 2)):
+                    rows.append({"telegram_id": uid, "quest_code": f"q{q}", "submit_date": d})
+            d += timedelta(days=1)
+        if len(rows) >= 50_000:
+            db.execute(insert(QuestSubmission), rows)
+            rows = []
+    if rows:
+        db.execute(insert(QuestSubmission), rows)
+    db.commit()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="sqlite://", help="SQLAlchemy URL（默认内存 SQLite；也可指向 MySQL / Postgres 测试库）")
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--years", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    engine = create_engine(args.url)
+    QuestSubmission.__table__.drop(engine, checkfirst=True)
+    QuestSubmission.__table__.create(engine)
+    today = date.today()
+    with Session(engine) as db:
+        t0 = time.perf_counter()
+        build(db, args.users, args.years, args.seed, today)
+        n = db.execute(select(QuestSubmission.id).order_by(QuestSubmission.id.desc()).limit(1)).scalar_one()
+        print(f"build dialect={engine.dialect.name} users={args.users} years={args.years} rows={n} {time.perf_counter() - t0:.2f}s")
+
+        methods = {"reference": lambda uid, d: reference_streak(db, uid, d), "scan": None}
+        methods["scan"] = lambda uid, d: streak_service.current_streak(db, uid, d, method="scan")
+        if streak_service.supports_window(db):
+            methods["window"] = lambda uid, d: streak_service.current_streak(db, uid, d, method="window")
+
+        # 正确性矩阵：每个用户 × 今天 / 昨天 / 很久以前
+        checks = [(uid, d) for uid in range(1, args.users + 1) for d in (today, today - timedelta(days=1), today - timedelta(days=400))]
+        mismatches = 0
+        for uid, d in checks:
+            got = {name: fn(uid, d) for name, fn in methods.items()}
+            if len(set(got.values())) != 1:
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"mismatch user={uid} day={d} {got}")
+        print(f"checked {len(checks)} cases, mismatches={mismatches}")
+
+        for name, fn in methods.items():
+            t0 = time.perf_counter()
+            for uid in range(1, args.users + 1):
+                fn(uid, today)
+            ms = (time.perf_counter() - t0) * 1000 / args.users
+            print(f"{name:<10} {ms:.3f} ms/user")
+    QuestSubmission.__table__.drop(engine)
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
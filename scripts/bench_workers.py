@@ -0,0 +1,139 @@
+"""多 worker 吞吐压测：按不同 worker 数起服务，对同一组接口打满并发，看吞吐是否随 worker 数线性增长。
+
+  python scripts/bench_workers.py --workers 1,2,4 --duration 10
+  python scripts/bench_workers.py --url http://127.0.0.1:8000 --path /api/tasks   # 只压已在跑的服务（完整用户流程见 load_test.py）
+
+默认用 uvicorn --workers 起服务（--server gunicorn 则用 gunicorn.conf.py），行为库 / SQLAlchemy 库放在临时目录。
+理想情况下 N 个 worker 的吞吐约等于 1 个 worker 的 N 倍（N 不超过 CPU 核数）；
+压测客户端本身也占 CPU，核数少的机器上建议把客户端放到另一台机器（--url）。
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+
+async def _worker(client: httpx.AsyncClient, paths: list[str], deadline: float, lat: list[float], errors: list[int]) -> None:
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        t0 = time.perf_counter()
+        try:
+            r = await client.get(path)
+            if r.status_code >= 500:
+                errors[0] += 1
+        except httpx.HTTPError:
+            errors[0] += 1
+            continue
+        lat.append(time.perf_counter() - t0)
+
+
+async def run_load(base_url: str, paths: list[str], concurrency: int, duration: float) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        # 预热：建连接、填进程内缓存
+        await asyncio.gather(*[client.get(p) for p in paths * 4])
+        lat: list[float] = []
+        errors = [0]
+        t0 = time.perf_counter()
+        deadline = t0 + duration
+        await asyncio.gather(*[_worker(client, paths, deadline, lat, errors) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - t0
+    lat.sort()
+
+    def pct(p: float) -> float:
+        return lat[min(len(lat) - 1, int(len(lat) * p))] * 1000 if lat else 0.0
+
+    return {"requests": len(lat), "rps": len(lat) / elapsed, "p50": pct(0.50), "p99": pct(0.99), "errors": errors[0]}
+
+
+def _start_server(server: str, workers: int, port: int, data_dir: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update(
+        GS_BEHAVIOR_DB_PATH=os.path.join(data_dir, "behavior.db"),
+        DATABASE_URL=f"sqlite:///{os.path.join(data_dir, 'greensphere.db')}",
+        GS_COORD_DIR=os.path.join(data_dir, "coord"),
+        GS_NEWS_FETCH_ON_START="0",
+        GS_WORKERS=str(workers),
+        GS_BIND=f"127.0.0.1:{port}",
+    )
+    if server == "gunicorn":
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--access-logfile", "", "app.main:app"]
+    else:
+        cmd = [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers),
+            "--no-access-log", "--log-level", "warning",
+        ]
+    return subprocess.Popen(cmd, env=env)
+
+
+def _wait_ready(base_url: str, timeout: float = 60) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(base_url + "/api/health", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    raise RuntimeError(f"server at {base_url} did not become ready")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="", help="压已在运行的服务，不自己起")
+    ap.add_argument("--workers", default="", help="逗号分隔的 worker 数，默认 1,2,4… 到 CPU 核数")
+    ap.add_argument("--server", choices=("uvicorn", "gunicorn"), default="uvicorn")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--path", action="append", default=[], help="压测的 GET 路径，可重复；默认 /api/health /api/tasks /api/quests")
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--duration", type=float, default=10.0)
+    args = ap.parse_args()
+    paths = args.path or ["/api/health", "/api/tasks", "/api/quests"]
+
+    if args.url:
+        r = asyncio.run(run_load(args.url.rstrip("/"), paths, args.concurrency, args.duration))
+        print(f"{args.url} rps={r['rps']:.0f} p50={r['p50']:.1f}ms p99={r['p99']:.1f}ms errors={r['errors']}")
+        return 0
+
+    cores = os.cpu_count() or 1
+    if args.workers:
+        counts = [int(x) for x in args.workers.split(",") if x.strip()]
+    else:
+        counts, n = [], 1
+        while n <= cores:
+            counts.append(n)
+            n *= 2
+    print(f"cpu cores={cores} server={args.server} concurrency={args.concurrency} paths={paths}")
+    base_rps = None
+    for workers in counts:
+        with tempfile.TemporaryDirectory() as data_dir:
+            base_url = f"http://127.0.0.1:{args.port}"
+            proc = _start_server(args.server, workers, args.port, data_dir)
+            try:
+                _wait_ready(base_url)
+                r = asyncio.run(run_load(base_url, paths, args.concurrency, args.duration))
+            finally:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+        base_rps = base_rps or r["rps"]
+        print(
+            f"workers={workers:<3} rps={r['rps']:8.0f} speedup={r['rps'] / base_rps:4.2f}x "
+            f"efficiency={r['rps'] / base_rps / workers:5.0%} p50={r['p50']:.1f}ms p99={r['p99']:.1f}ms errors={r['errors']}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,117 @@
+"""静态资源构建：给 CSS / JS / SVG 生成带内容哈希的副本，并预压缩成 .gz / .br。
+
+  python scripts/build_static.py              # 构建 static/dist/，并通知运行中的 worker 重新读 manifest
+  python scripts/build_static.py --prune      # 顺带删掉 manifest 里已经不引用的旧哈希文件
+  python scripts/build_static.py --no-publish # 镜像构建时用：不碰 data/coord
+
+产物见 app/core/static_assets.py。brotli 为可选依赖（pip install brotli），没装时只生成 .gz。
+旧的哈希文件默认保留，滚动发布期间还没刷新的页面仍能拿到它引用的 CSS。
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core.static_assets import COMPRESSIBLE_SUFFIXES, DIST_DIR, HASH_LEN, MANIFEST_NAME  # noqa: E402
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# 压缩后至少省下这么多才保留压缩版本
+_MIN_SAVING = 0.05
+
+
+def _write_if_changed(path: Path, data: bytes) -> bool:
+    if path.exists() and path.stat().st_size == len(data) and path.read_bytes() == data:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    return True
+
+
+def _variants(data: bytes, level: int) -> dict[str, bytes]:
+    out = {".gz": gzip.compress(data, compresslevel=level, mtime=0)}
+    if brotli is not None:
+        out[".br"] = brotli.compress(data, quality=11)
+    return {suffix: blob for suffix, blob in out.items() if len(blob) <= len(data) * (1 - _MIN_SAVING)}
+
+
+def build(static_dir: Path, level: int = 9) -> tuple[dict[str, str], list[tuple[str, int, dict[str, int]]]]:
+    dist = static_dir / DIST_DIR
+    manifest: dict[str, str] = {}
+    report = []
+    for src in sorted(static_dir.rglob("*")):
+        if not src.is_file() or src.suffix.lower() not in COMPRESSIBLE_SUFFIXES:
+            continue
+        rel = src.relative_to(static_dir)
+        if rel.parts[0] == DIST_DIR:
+            continue
+        data = src.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LEN]
+        hashed_rel = Path(DIST_DIR) / rel.parent / f"{src.stem}.{digest}{src.suffix}"
+        out = static_dir / hashed_rel
+        _write_if_changed(out, data)
+        sizes = {}
+        for suffix, blob in _variants(data, level).items():
+            _write_if_changed(out.with_name(out.name + suffix), blob)
+            sizes[suffix] = len(blob)
+        manifest[rel.as_posix()] = hashed_rel.as_posix()
+        report.append((rel.as_posix(), len(data), sizes))
+    _write_if_changed(dist / MANIFEST_NAME, (json.dumps(manifest, indent=2, sort_keys=True) + "\n").encode("utf-8"))
+    return manifest, report
+
+
+def prune(static_dir: Path, manifest: dict[str, str]) -> int:
+    keep = set()
+    for hashed in manifest.values():
+        keep.update({hashed, hashed + ".gz", hashed + ".br"})
+    keep.add(f"{DIST_DIR}/{MANIFEST_NAME}")
+    removed = 0
+    for f in (static_dir / DIST_DIR).rglob("*"):
+        if f.is_file() and f.relative_to(static_dir).as_posix() not in keep:
+            f.unlink()
+            removed += 1
+    return removed
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--static-dir", default="static")
+    ap.add_argument("--level", type=int, default=9, help="gzip 压缩级别")
+    ap.add_argument("--prune", action="store_true", help="删除不再被 manifest 引用的哈希文件")
+    ap.add_argument("--no-publish", action="store_true", help="不广播 assets 失效（镜像构建时用）")
+    args = ap.parse_args()
+
+    static_dir = Path(args.static_dir)
+    t0 = time.perf_counter()
+    manifest, report = build(static_dir, level=args.level)
+    total = sum(size for _, size, _ in report)
+    total_gz = sum(sizes.get(".gz", size) for _, size, sizes in report)
+    total_br = sum(sizes.get(".br", sizes.get(".gz", size)) for _, size, sizes in report)
+    for rel, size, sizes in report:
+        parts = " ".join(f"{suffix[1:]}={n}" for suffix, n in sorted(sizes.items()))
+        print(f"{rel:<40} {size:>8} -> {manifest[rel]}  {parts}")
+    print(f"{len(report)} files  raw={total}  gzip={total_gz}  best={total_br}  brotli={'on' if brotli else 'off'}")
+    if args.prune:
+        print(f"pruned {prune(static_dir, manifest)} stale files")
+    if not args.no_publish:
+        from gs_coord import publish
+
+        publish("assets")
+    print(f"done in {time.perf_counter() - t0:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
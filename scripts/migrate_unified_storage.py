@@ -0,0 +1,122 @@
+"""把 SQLAlchemy 侧的 Quest 用户 / 积分 / 参与日合并进行为库（见 app/services/user_repository.py）。
+
+流程：GS_STORAGE_MODE=dual 上线（新数据双写）-> 跑本脚本补历史 -> 核对 -> 切 unified。
+按 point_transactions.id 幂等，dual 阶段可以反复执行；中途中断直接重跑即可。
+"""
+
+import argparse
+import time
+
+from sqlalchemy import func, select
+
+from app.core.database import SessionLocal
+from app.models import PointTransaction, QuestSubmission, TelegramUser
+from app.services import analytics_service
+from app.services.user_repository import REF_QUEST_TX, credit_quest_points, ensure_behavior_user
+from gs_db import get_db, init_gs_db
+
+
+def _batches(session, stmt, batch_size: int):
+    result = session.execute(stmt.execution_options(yield_per=batch_size, stream_results=True))
+    for part in result.partitions(batch_size):
+        yield part
+
+
+def migrate_users(session, conn, batch_size: int, dry_run: bool) -> int:
+    n = 0
+    # 老用户不是今天注册的：沿用 telegram_users.created_at，不累加 daily_metrics
+    stmt = select(TelegramUser.telegram_id, TelegramUser.username, TelegramUser.created_at).order_by(TelegramUser.id)
+    for part in _batches(session, stmt, batch_size):
+        for telegram_id, username, created_at in part:
+            if not dry_run:
+                ensure_behavior_user(conn, int(telegram_id), username, created_at=created_at)
+            n += 1
+        if not dry_run:
+            conn.commit()
+    return n
+
+
+def migrate_points(session, conn, batch_size: int, dry_run: bool) -> tuple[int, int]:
+    seen = credited = 0
+    # 流水的用户不在 telegram_users 里时，用这笔流水的时间当注册时间
+    stmt = (
+        select(
+            PointTransaction.id,
+            PointTransaction.telegram_id,
+            PointTransaction.points,
+            func.coalesce(TelegramUser.created_at, PointTransaction.created_at),
+        )
+        .outerjoin(TelegramUser, TelegramUser.telegram_id == PointTransaction.telegram_id)
+        .order_by(PointTransaction.id)
+    )
+    for part in _batches(session, stmt, batch_size):
+        for tx_id, telegram_id, points, created_at in part:
+            seen += 1
+            if dry_run:
+                c = conn.cursor()
+                c.execute("SELECT 1 FROM points_ledger WHERE ref_type = ? AND ref_id = ? LIMIT 1;", (REF_QUEST_TX, int(tx_id)))
+                credited += c.fetchone() is None
+                continue
+            if credit_quest_points(
+                conn,
+                int(telegram_id),
+                int(points or 0),
+                ref_type=REF_QUEST_TX,
+                ref_id=int(tx_id),
+                day=None,
+                created_at=created_at,
+                commit=False,
+            ):
+                credited += 1
+        if not dry_run:
+            conn.commit()
+    return seen, credited
+
+
+def migrate_activity(session, conn, batch_size: int, dry_run: bool) -> int:
+    # 置位本身幂等，可以重跑；之后重建 user_activity 要走 user_repository.rebuild_behavior_activity（会带上 Quest 参与日）
+    n = 0
+    stmt = (
+        select(QuestSubmission.telegram_id, QuestSubmission.submit_date)
+        .where(QuestSubmission.submit_date.is_not(None))
+        .group_by(QuestSubmission.telegram_id, QuestSubmission.submit_date)
+        .order_by(QuestSubmission.telegram_id)
+    )
+    for part in _batches(session, stmt, batch_size):
+        for telegram_id, submit_date in part:
+            if not dry_run:
+                analytics_service.mark_active(conn, int(telegram_id), submit_date)
+            n += 1
+        if not dry_run:
+            conn.commit()
+    return n
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--batch-size", type=int, default=1000)
+    ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--skip-activity", action="store_true")
+    args = ap.parse_args()
+
+    init_gs_db()
+    gen = get_db()
+    conn = next(gen)
+    session = SessionLocal()
+    try:
+        t0 = time.perf_counter()
+        users = migrate_users(session, conn, args.batch_size, args.dry_run)
+        print(f"users        {users}")
+        seen, credited = migrate_points(session, conn, args.batch_size, args.dry_run)
+        print(f"transactions {seen} (new {credited})")
+        if not args.skip_activity:
+            print(f"active days  {migrate_activity(session, conn, args.batch_size, args.dry_run)}")
+        print(f"{'dry run ' if args.dry_run else ''}done in {time.perf_counter() - t0:.2f}s")
+    finally:
+        session.close()
+        gen.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
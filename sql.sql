@@ -30,7 +30,8 @@ CREATE TABLE `quest_submissions` (
   `submitted_at` datetime DEFAULT CURRENT_TIMESTAMP,
   `submit_date` date GENERATED ALWAYS AS (cast(`submitted_at` as date)) STORED,
   PRIMARY KEY (`id`),
-  UNIQUE KEY `uniq_user_quest_day` (`telegram_id`,`quest_code`,`submit_date`)
+  UNIQUE KEY `uniq_user_quest_day` (`telegram_id`,`quest_code`,`submit_date`),
+  KEY `idx_quest_submissions_user_date` (`telegram_id`,`submit_date`)
 ) ENGINE=MyISAM DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
 
 CREATE TABLE `point_transactions` (
@@ -57,6 +58,9 @@ CREATE TABLE `leafpass_status` (
   `telegram_id` bigint(20) NOT NULL,
   `level` varchar(20) COLLATE utf8mb4_unicode_ci NOT NULL,
   `total_points` int(11) DEFAULT '0',
+  `streak` int(11) DEFAULT '0',
+  `last_active_date` date DEFAULT NULL,
+  `participation_days` int(11) DEFAULT NULL,
   `updated_at` datetime DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (`telegram_id`)
 ) ENGINE=MyISAM DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
\ No newline at end of file
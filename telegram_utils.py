@@ -1,6 +1,5 @@
 # telegram_utils.py
 import os
-import httpx
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -24,6 +23,8 @@ async def send_telegram_message(chat_id: int, text: str) -> None:
         # 没配置 token 时静默跳过
         return
 
+    import httpx  # 发消息时才导入，不拖慢应用启动
+
     try:
         async with httpx.AsyncClient(timeout=5) as client:
             await client.post(
@@ -38,6 +39,8 @@ async def send_telegram_message(chat_id: int, text: str) -> None:
 async def send_monitor_message(text: str) -> None:
     if not (MONITOR_API_BASE and MONITOR_CHAT_ID):
         return
+    import httpx
+
     try:
         async with httpx.AsyncClient(timeout=5) as client:
             await client.post(
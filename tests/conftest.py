@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 测试用的临时数据目录；要在导入 app / gs_db 之前设好环境变量
+_DATA_DIR = tempfile.mkdtemp(prefix="gs_tests_")
+os.environ.setdefault("GS_BEHAVIOR_DB_PATH", os.path.join(_DATA_DIR, "behavior.db"))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DATA_DIR, 'greensphere.db')}")
+os.environ.setdefault("GS_COORD_DIR", os.path.join(_DATA_DIR, "coord"))
+os.environ["GS_SCHEDULER_ENABLED"] = "0"
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
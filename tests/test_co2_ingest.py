@@ -0,0 +1,244 @@
+"""co2_service 增量抓取：用 scripts/fixtures/co2_daily_mlo_sample.txt 当数据源。
+
+样例 90 行（2024-09-01 .. 2024-11-29），其中两行是 -999.99 缺测；回修窗口缩到 10 天，
+让 Range 的尾部只覆盖样例的一小段。
+"""
+
+import os
+from functools import partial
+from pathlib import Path
+
+import httpx
+import pytest
+
+FIXTURE = Path(__file__).resolve().parents[1] / "scripts" / "fixtures" / "co2_daily_mlo_sample.txt"
+SOURCE_URL = "https://gml.example/co2_daily_mlo.txt"
+LAST_MODIFIED = "Mon, 02 Dec 2024 08:00:00 GMT"
+
+
+def _split_fixture() -> tuple[bytes, list[bytes]]:
+    header, rows = [], []
+    for line in FIXTURE.read_bytes().splitlines(keepends=True):
+        (header if line.startswith(b"#") else rows).append(line)
+    return b"".join(header), rows
+
+
+def _revise(line: bytes, delta: float) -> bytes:
+    parts = line.decode().split()
+    return f"{parts[0]} {parts[1]:>2} {parts[2]:>2}  {parts[3]}   {float(parts[4]) + delta:.2f}\n".encode()
+
+
+def _value(line: bytes) -> float:
+    return float(line.split()[4])
+
+
+@pytest.fixture()
+def db(monkeypatch):
+    from app.services import co2_service
+    from gs_db import get_db, init_gs_db
+
+    monkeypatch.setattr(co2_service, "_CO2_REVISION_DAYS", 10)
+    init_gs_db()
+    gen = get_db()
+    conn = next(gen)
+    for table in ("co2_daily", "co2_monthly", "co2_yearly", "co2_fetch_state"):
+        conn.execute(f"DELETE FROM {table};")
+    conn.commit()
+    try:
+        yield conn
+    finally:
+        gen.close()
+
+
+@pytest.fixture()
+def fixture_rows():
+    header, rows = _split_fixture()
+    assert len(rows) == 90
+    # 第一次抓取只有前 60 行（到 10-30，含两行缺测）；之后追加 30 行，
+    # 同时回修 10-26（窗口内）和 09-06（窗口外，不应写入）
+    revised = list(rows)
+    revised[55] = _revise(rows[55], 1.5)
+    revised[5] = _revise(rows[5], -3.0)
+    return header, rows, revised
+
+
+def _daily(conn) -> dict[str, float]:
+    return {r["date"]: r["value"] for r in conn.execute("SELECT date, value FROM co2_daily;").fetchall()}
+
+
+def _assert_after_update(conn, rows, revised) -> None:
+    daily = _daily(conn)
+    assert len(daily) == 88
+    assert daily["2024-10-26"] == pytest.approx(_value(revised[55]))
+    assert daily["2024-09-06"] == pytest.approx(_value(rows[5]))
+    assert daily["2024-11-29"] == pytest.approx(_value(rows[89]))
+    months = {r["month"]: r["days"] for r in conn.execute("SELECT month, days FROM co2_monthly;").fetchall()}
+    assert months == {"2024-09": 29, "2024-10": 30, "2024-11": 29}
+
+
+def test_local_source_reads_tail(db, fixture_rows, tmp_path, monkeypatch):
+    from app.services.co2_service import ingest_co2_history
+
+    header, rows, revised = fixture_rows
+    src = tmp_path / "co2.txt"
+    src.write_bytes(header + b"".join(rows[:60]))
+    monkeypatch.setenv("GS_CO2_SOURCE_URL", str(src))
+
+    assert ingest_co2_history() == {"status": "full", "written": 58, "parsed": 58, "source": str(src)}
+    assert ingest_co2_history()["status"] == "unchanged"
+
+    src.write_bytes(header + b"".join(revised))
+    mtime = src.stat().st_mtime + 5
+    os.utime(src, (mtime, mtime))
+    r = ingest_co2_history()
+    assert (r["status"], r["written"]) == ("partial", 31)
+    assert r["parsed"] < 60
+    _assert_after_update(db, rows, revised)
+
+
+class _Source:
+    """最小的 HTTP 源：If-None-Match / If-Modified-Since / Range / If-Range，越界 Range 回 416。"""
+
+    def __init__(self, body: bytes, etag: str | None) -> None:
+        self.body = body
+        self.etag = etag
+        self.last_modified = LAST_MODIFIED
+        self.ignore_if_range = False
+        self.requests: list[httpx.Request] = []
+
+    def _validators(self) -> dict:
+        out = {"Last-Modified": self.last_modified}
+        if self.etag:
+            out["ETag"] = self.etag
+        return out
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        h = request.headers
+        if self.etag and h.get("if-none-match") == self.etag:
+            return httpx.Response(304, headers=self._validators())
+        if not self.etag and h.get("if-modified-since") == self.last_modified and "range" not in h:
+            return httpx.Response(304, headers=self._validators())
+        if_range = h.get("if-range")
+        fresh = if_range in (self.etag, self.last_modified) or self.ignore_if_range
+        if "range" in h and fresh:
+            start = int(h["range"].removeprefix("bytes=").rstrip("-"))
+            size = len(self.body)
+            if start >= size:
+                return httpx.Response(416, headers={"Content-Range": f"bytes */{size}"})
+            return httpx.Response(
+                206,
+                content=self.body[start:],
+                headers={**self._validators(), "Content-Range": f"bytes {start}-{size - 1}/{size}"},
+            )
+        return httpx.Response(200, content=self.body, headers=self._validators())
+
+
+def _serve(monkeypatch, source: _Source) -> None:
+    monkeypatch.setenv("GS_CO2_SOURCE_URL", SOURCE_URL)
+    monkeypatch.setattr(httpx, "Client", partial(httpx.Client, transport=httpx.MockTransport(source)))
+
+
+def test_http_changed_etag_refetches_full(db, fixture_rows, monkeypatch):
+    from app.services.co2_service import _tail_start, ingest_co2_history
+
+    header, rows, revised = fixture_rows
+    first = header + b"".join(rows[:60])
+    src = _Source(first, '"v1"')
+    _serve(monkeypatch, src)
+    assert ingest_co2_history()["written"] == 58
+    assert ingest_co2_history()["status"] == "unchanged"
+
+    # 文件变了、ETag 跟着变：If-Range 对不上，服务器回 200 全量，仍只写窗口内新增 / 回修的行
+    src.body, src.etag = header + b"".join(revised), '"v2"'
+    r = ingest_co2_history()
+    req = src.requests[-1]
+    assert req.headers["if-range"] == '"v1"'
+    assert req.headers["range"] == f"bytes={_tail_start(len(first))}-"
+    assert (r["status"], r["written"], r["parsed"]) == ("full", 31, 88)
+    _assert_after_update(db, rows, revised)
+
+
+def test_http_if_range_by_last_modified_returns_tail(db, fixture_rows, monkeypatch):
+    from app.services.co2_service import ingest_co2_history
+
+    header, rows, revised = fixture_rows
+    # 只有 Last-Modified（秒级），同一秒内追加：If-Range 用日期，拿到 206 尾部
+    src = _Source(header + b"".join(rows[:60]), None)
+    _serve(monkeypatch, src)
+    ingest_co2_history()
+    src.body = header + b"".join(revised)
+    r = ingest_co2_history()
+    assert src.requests[-1].headers["if-range"] == LAST_MODIFIED
+    assert (r["status"], r["written"]) == ("partial", 31)
+    assert r["parsed"] < 60
+    _assert_after_update(db, rows, revised)
+    state = db.execute("SELECT content_length FROM co2_fetch_state;").fetchone()
+    assert state["content_length"] == len(src.body)
+
+
+def test_http_weak_etag_uses_last_modified(db, fixture_rows, monkeypatch):
+    from app.services.co2_service import ingest_co2_history
+
+    header, rows, revised = fixture_rows
+    src = _Source(header + b"".join(rows[:60]), 'W/"v1"')
+    _serve(monkeypatch, src)
+    ingest_co2_history()
+    src.body, src.etag = header + b"".join(revised), 'W/"v2"'
+    ingest_co2_history()
+    assert src.requests[-1].headers["if-range"] == LAST_MODIFIED
+
+
+def test_http_416_refetches_full(db, fixture_rows, monkeypatch):
+    from app.services.co2_service import ingest_co2_history
+
+    header, rows, _ = fixture_rows
+    src = _Source(header + b"".join(rows), None)
+    _serve(monkeypatch, src)
+    ingest_co2_history()
+    # 源被截短（Last-Modified 却没变）：Range 越界 -> 416 -> 不带条件全量重取
+    src.body = header + b"".join(rows[:5])
+    before = len(src.requests)
+    r = ingest_co2_history()
+    retry = src.requests[before:]
+    assert len(retry) == 2 and "range" in retry[0].headers
+    assert "range" not in retry[1].headers and "if-modified-since" not in retry[1].headers
+    assert r["status"] == "full"
+    state = db.execute("SELECT content_length FROM co2_fetch_state;").fetchone()
+    assert state["content_length"] == len(src.body)
+
+
+def test_http_206_with_new_validator_refetches_full(db, fixture_rows, monkeypatch):
+    from app.services.co2_service import ingest_co2_history
+
+    header, rows, revised = fixture_rows
+    src = _Source(header + b"".join(rows[:60]), '"v1"')
+    _serve(monkeypatch, src)
+    ingest_co2_history()
+    # 服务器不理 If-Range，照样回 206 但 ETag 已变：不能信这段尾部
+    src.body, src.etag, src.ignore_if_range = header + b"".join(revised), '"v2"', True
+    before = len(src.requests)
+    r = ingest_co2_history()
+    assert len(src.requests) - before == 2
+    assert (r["status"], r["written"]) == ("full", 31)
+    _assert_after_update(db, rows, revised)
+
+
+def test_trend_etag_follows_revisions_of_older_points(db, fixture_rows, tmp_path, monkeypatch):
+    from app.services import co2_service
+
+    header, rows, revised = fixture_rows
+    src = tmp_path / "co2.txt"
+    src.write_bytes(header + b"".join(rows[:60]))
+    monkeypatch.setenv("GS_CO2_SOURCE_URL", str(src))
+    co2_service.update_co2_db()
+    before = co2_service.get_trend_svg(30).etag
+
+    # 另一个 worker 回修了区间中间的一个点（最新点和点数都没变）
+    co2_service.upsert_points_to_db(db, [("2024-10-15", 500.0)], "test")
+    db.commit()
+    assert co2_service.get_trend_svg(30).etag == before  # 检查间隔内继续用缓存
+    monkeypatch.setattr(co2_service, "_trend_checked_at", float("-inf"))
+    after = co2_service.get_trend_svg(30)
+    assert after.etag != before
+    assert b"500.00" in after.svg
@@ -0,0 +1,144 @@
+"""批量打卡和单条打卡共用 Idempotency-Key（scope api:complete:{user_id}）。"""
+
+import time
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as c:
+        yield c
+
+
+def _task_ids(client, user_id: int) -> list[int]:
+    client.post("/api/init_user", json={"telegram_id": user_id}, headers=_ip(user_id))
+    return [t["id"] for t in client.get("/api/tasks", params={"user_id": user_id}, headers=_ip(user_id)).json()["tasks"]]
+
+
+def _ip(user_id: int) -> dict:
+    return {"X-Forwarded-For": f"10.7.{user_id // 250}.{user_id % 250}"}
+
+
+def _logs(user_id: int) -> int:
+    from gs_db import get_db
+
+    gen = get_db()
+    db = next(gen)
+    try:
+        return db.execute("SELECT COUNT(*) FROM user_task_logs WHERE user_id = ?;", (user_id,)).fetchone()[0]
+    finally:
+        gen.close()
+
+
+def test_batch_replays_and_dedups_keys(client):
+    uid = 801
+    t = _task_ids(client, uid)
+    now = int(time.time() * 1000)
+    items = [
+        {"task_id": t[0], "client_ts": now, "idempotency_key": "b-1"},
+        {"task_id": t[1], "client_ts": now, "idempotency_key": "b-2"},
+        {"task_id": t[1], "client_ts": now, "idempotency_key": "b-2"},
+        {"task_id": 99999, "idempotency_key": "b-3"},
+    ]
+    r = client.post("/api/complete/batch", json={"user_id": uid, "items": items}, headers=_ip(uid))
+    assert r.status_code == 200, r.text
+    results = r.json()["results"]
+    assert [x["status"] for x in results] == ["completed", "completed", "completed", "not_found"]
+    assert results[2]["replayed"] and "replayed" not in results[1]
+    assert _logs(uid) == 2
+
+    again = client.post("/api/complete/batch", json={"user_id": uid, "items": items[:2]}, headers=_ip(uid)).json()
+    assert [(x["status"], x["replayed"]) for x in again["results"]] == [("completed", True), ("completed", True)]
+    assert _logs(uid) == 2
+
+
+def test_single_and_batch_share_keys(client):
+    uid = 802
+    t = _task_ids(client, uid)
+    single = client.post(
+        "/api/complete", json={"user_id": uid, "task_id": t[0]}, headers={**_ip(uid), "Idempotency-Key": "s-1"}
+    )
+    assert single.json()["duplicate"] is False
+
+    # 同一次点击又随离线队列补发
+    r = client.post(
+        "/api/complete/batch",
+        json={"user_id": uid, "items": [{"task_id": t[0], "idempotency_key": "s-1"}]},
+        headers=_ip(uid),
+    ).json()
+    assert r["results"] == [{"task_id": t[0], "status": "completed", "idempotency_key": "s-1", "replayed": True}]
+
+    client.post(
+        "/api/complete/batch",
+        json={"user_id": uid, "items": [{"task_id": t[1], "idempotency_key": "q-1"}]},
+        headers=_ip(uid),
+    )
+    replay = client.post(
+        "/api/complete", json={"user_id": uid, "task_id": t[1]}, headers={**_ip(uid), "Idempotency-Key": "q-1"}
+    )
+    assert replay.headers.get("idempotent-replayed") == "true"
+    # 批量存下的条目回放成单条打卡的格式
+    assert replay.json() == {"ok": True, "duplicate": False, "new_badges": []}
+    assert _logs(uid) == 2
+
+    client.post(
+        "/api/complete/batch",
+        json={"user_id": uid, "items": [{"task_id": 99999, "idempotency_key": "q-2"}]},
+        headers=_ip(uid),
+    )
+    missing = client.post(
+        "/api/complete", json={"user_id": uid, "task_id": t[2]}, headers={**_ip(uid), "Idempotency-Key": "q-2"}
+    )
+    assert missing.status_code == 404
+    assert _logs(uid) == 2
+
+
+def test_batch_rejects_oversized_key_before_writing(client):
+    uid = 803
+    t = _task_ids(client, uid)
+    items = [{"task_id": t[0], "idempotency_key": "ok"}, {"task_id": t[1], "idempotency_key": "x" * 200}]
+    r = client.post("/api/complete/batch", json={"user_id": uid, "items": items}, headers=_ip(uid))
+    assert r.status_code == 400
+    assert _logs(uid) == 0
+    r = client.post("/api/complete/batch", json={"user_id": uid, "items": items[:1]}, headers=_ip(uid))
+    assert r.json()["results"][0]["status"] == "completed"
+
+
+def test_backdated_items_use_report_day_and_skip_finalized_days(client, monkeypatch):
+    from datetime import datetime, timedelta, timezone
+
+    from gs_db import get_db
+    from models import finalize_daily_metrics
+
+    uid = 804
+    t = _task_ids(client, uid)
+    monkeypatch.setenv("GS_DAILY_REPORT_TZ_OFFSET_HOURS", "14")
+    now = datetime.now(timezone.utc)
+    local_today = (now + timedelta(hours=14)).date()
+    # 报表时区的昨天中午（UTC+14 下和服务器本地日期多半不是同一天）
+    yesterday_start = datetime.combine(local_today - timedelta(days=1), datetime.min.time(), timezone(timedelta(hours=14)))
+    ts = int((yesterday_start + timedelta(hours=12)).timestamp() * 1000)
+
+    gen = get_db()
+    db = next(gen)
+    try:
+        db.execute("DELETE FROM daily_metrics WHERE date = ?;", ((local_today - timedelta(days=1)).isoformat(),))
+        db.commit()
+        r = client.post(
+            "/api/complete/batch", json={"user_id": uid, "items": [{"task_id": t[0], "client_ts": ts}]}, headers=_ip(uid)
+        ).json()
+        assert r["results"][0] == {"task_id": t[0], "status": "completed", "date": (local_today - timedelta(days=1)).isoformat()}
+
+        finalize_daily_metrics(db, (local_today - timedelta(days=1)).isoformat())
+        r = client.post(
+            "/api/complete/batch", json={"user_id": uid, "items": [{"task_id": t[1], "client_ts": ts}]}, headers=_ip(uid)
+        ).json()
+        assert r["results"][0]["status"] == "expired"
+        assert _logs(uid) == 1
+    finally:
+        gen.close()
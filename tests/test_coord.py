@@ -0,0 +1,53 @@
+"""gs_coord：代数广播和每进程一条的协调库连接。"""
+
+import multiprocessing
+import os
+
+import pytest
+
+import gs_coord
+
+
+@pytest.fixture()
+def coord(tmp_path, monkeypatch):
+    monkeypatch.setenv("GS_COORD_DIR", str(tmp_path))
+    monkeypatch.setenv("GS_COORD_POLL_SECONDS", "0")
+    monkeypatch.setattr(gs_coord, "_generations", {})
+    return tmp_path
+
+
+def _publish_in_child(topic: str, out) -> None:
+    out.put((os.getpid(), gs_coord.publish(topic)))
+
+
+def test_connection_is_reused_per_process(coord):
+    gs_coord.generation("catalog")
+    with gs_coord._coord_db() as first:
+        pass
+    for _ in range(3):
+        gs_coord.publish("catalog")
+        gs_coord.generation("catalog")
+    with gs_coord._coord_db() as again:
+        assert again is first
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_publish_from_forked_worker_invalidates_cache(coord):
+    calls = []
+
+    @gs_coord.cached_until("catalog")
+    def load() -> int:
+        calls.append(1)
+        return len(calls)
+
+    assert load() == 1 and load() == 1
+    ctx = multiprocessing.get_context("fork")
+    out = ctx.Queue()
+    # 子进程继承了父进程的连接对象，但必须自己重新打开
+    p = ctx.Process(target=_publish_in_child, args=("catalog", out))
+    p.start()
+    pid, gen = out.get(timeout=10)
+    p.join(10)
+    assert p.exitcode == 0 and pid != os.getpid()
+    assert gen == gs_coord.generation("catalog") == 1
+    assert load() == 2
@@ -0,0 +1,82 @@
+"""每日指标：当天的行不能被定稿；写入、定稿和 users.created_at 都按报表时区划分日期。"""
+
+import pytest
+
+from models import _local_day_bounds_utc
+
+
+@pytest.fixture(scope="module")
+def client():
+    from fastapi.testclient import TestClient
+
+    import app.middleware.admin_auth as admin_auth
+    from app.main import app
+
+    mp = pytest.MonkeyPatch()
+    mp.setattr(admin_auth, "ADMIN_API_KEY", "")
+    mp.delenv("ADMIN_API_KEY", raising=False)
+    with TestClient(app) as c:
+        yield c
+    mp.undo()
+
+
+@pytest.mark.parametrize(
+    ("offset", "bounds"),
+    [
+        ("7", ("2026-03-09 17:00:00", "2026-03-10 17:00:00")),
+        ("0", ("2026-03-10 00:00:00", "2026-03-11 00:00:00")),
+        ("-5", ("2026-03-10 05:00:00", "2026-03-11 05:00:00")),
+        ("", ("2026-03-09 17:00:00", "2026-03-10 17:00:00")),
+    ],
+)
+def test_day_bounds_follow_report_offset(monkeypatch, offset, bounds):
+    monkeypatch.setenv("GS_DAILY_REPORT_TZ_OFFSET_HOURS", offset)
+    assert _local_day_bounds_utc("2026-03-10") == bounds
+
+
+@pytest.mark.parametrize("offset", [14, -12])
+def test_write_and_report_days_share_report_offset(monkeypatch, offset):
+    from datetime import datetime, timedelta, timezone
+
+    from app.jobs.daily_reporter import _report_date_str
+    from models import get_today_str
+
+    monkeypatch.setenv("GS_DAILY_REPORT_TZ_OFFSET_HOURS", str(offset))
+    today = (datetime.now(timezone.utc) + timedelta(hours=offset)).date()
+    # 写路径累加的那一行和夜间定稿的那一行按同一个“今天”算：定稿的永远是前一天
+    assert get_today_str() == today.isoformat()
+    assert _report_date_str() == (today - timedelta(days=1)).isoformat()
+
+
+def test_daily_stats_does_not_finalize_today(client):
+    from datetime import date, timedelta
+
+    from gs_db import get_db
+    from models import get_today_str
+
+    today = get_today_str()
+    start = (date.fromisoformat(today) - timedelta(days=3)).isoformat()
+    gen = get_db()
+    db = next(gen)
+    try:
+        db.execute("DELETE FROM daily_metrics WHERE date = ?;", (today,))
+        db.commit()
+        r = client.get("/api/admin/daily-stats", headers={"X-Forwarded-For": "10.6.0.1"})
+        assert r.status_code == 200, r.text
+        assert db.execute("SELECT finalized FROM daily_metrics WHERE date = ?;", (today,)).fetchone()[0] == 0
+
+        client.post("/api/init_user", json={"telegram_id": 901}, headers={"X-Forwarded-For": "10.6.0.2"})
+        after = client.get("/api/admin/daily-stats", headers={"X-Forwarded-For": "10.6.0.1"}).json()
+        assert after["new_today"] == r.json()["new_today"] + 1
+
+        r = client.post(
+            "/api/admin/daily-metrics/rebuild",
+            params={"start": start, "end": today},
+            headers={"X-Forwarded-For": "10.6.0.3"},
+        )
+        assert r.status_code == 200, r.text
+        rows = dict(db.execute("SELECT date, finalized FROM daily_metrics WHERE date >= ?;", (start,)).fetchall())
+        assert rows[today] == 0
+        assert len(rows) == 4 and all(v == 1 for d, v in rows.items() if d < today)
+    finally:
+        gen.close()
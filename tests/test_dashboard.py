@@ -0,0 +1,52 @@
+"""/api/tasks 的 ETag：别人的动态不让首页 304 失效，动态流按时间桶刷新。"""
+
+import time
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as c:
+        yield c
+
+
+def _ip(user_id: int) -> dict:
+    return {"X-Forwarded-For": f"10.8.{user_id // 250}.{user_id % 250}"}
+
+
+def test_feed_activity_keeps_dashboard_etag(client, monkeypatch):
+    import gs_dashboard
+
+    monkeypatch.setattr(gs_dashboard, "feed_bucket", lambda now=None: 1)
+    viewer, other = 811, 812
+    for uid in (viewer, other):
+        client.post("/api/init_user", json={"telegram_id": uid}, headers=_ip(uid))
+    etag = client.get("/api/tasks", params={"user_id": viewer}, headers=_ip(viewer)).headers["etag"]
+
+    # 别人打卡会写一条动态（bump feed）
+    task_id = client.get("/api/tasks", params={"user_id": other}, headers=_ip(other)).json()["tasks"][0]["id"]
+    r = client.post("/api/complete", json={"user_id": other, "task_id": task_id}, headers=_ip(other))
+    assert r.json()["duplicate"] is False
+    again = client.get("/api/tasks", params={"user_id": viewer}, headers={**_ip(viewer), "If-None-Match": etag})
+    assert again.status_code == 304
+    # 自己的写入改了 user 版本，重拼时拿到最新动态
+    own = client.get("/api/tasks", params={"user_id": other}, headers=_ip(other)).json()
+    assert own["feed"][0]["user_id"] == other
+
+    monkeypatch.setattr(gs_dashboard, "feed_bucket", lambda now=None: 2)
+    fresh = client.get("/api/tasks", params={"user_id": viewer}, headers={**_ip(viewer), "If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.json()["feed"][0]["user_id"] == other
+
+
+def test_feed_bucket_rolls_over():
+    from gs_dashboard import FEED_TTL_SECONDS, feed_bucket
+
+    now = time.time()
+    assert feed_bucket(now) == feed_bucket(now - now % FEED_TTL_SECONDS)
+    assert feed_bucket(now + FEED_TTL_SECONDS) == feed_bucket(now) + 1
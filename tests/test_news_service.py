@@ -0,0 +1,67 @@
+"""news_service._fetch_feed：流式解析，内存不随 feed 大小增长。"""
+
+import asyncio
+import tracemalloc
+
+import httpx
+
+from app.services.news_service import _fetch_feed
+
+HEAD = b'<?xml version="1.0"?><rss version="2.0"><channel><title>t</title>'
+TAIL = b"</channel></rss>"
+
+
+def _item(i: int, *, link: bool = True) -> bytes:
+    body = f"<title>item {i}</title><description>{'x' * 200}</description>"
+    if link:
+        body += f"<link>https://example.org/{i}</link><pubDate>Mon, 02 Dec 2024 08:00:00 GMT</pubDate>"
+    return f"<item>{body}</item>".encode()
+
+
+def _feed(n: int, *, link_every: int):
+    async def stream():
+        yield HEAD
+        batch = []
+        for i in range(n):
+            batch.append(_item(i, link=i % link_every == 0))
+            if len(batch) == 200:
+                yield b"".join(batch)
+                batch = []
+        yield b"".join(batch) + TAIL
+
+    return stream
+
+
+def _fetch(stream, *, max_items: int = 50):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=stream(), headers={"ETag": '"f1"'})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await _fetch_feed(
+                client, asyncio.Semaphore(1), "https://feeds.example/rss", {}, timeout=60, max_items=max_items
+            )
+
+    return asyncio.run(run())
+
+
+def test_parses_items_and_validators():
+    res = _fetch(_feed(30, link_every=3))
+    assert res.error is None and res.status == 200
+    assert [x.url for x in res.items] == [f"https://example.org/{i}" for i in range(0, 30, 3)]
+    assert res.items[0].published_at == "2024-12-02T08:00:00+00:00"
+    assert res.etag == '"f1"'
+
+
+def test_memory_stays_bounded_on_large_feed():
+    # 大部分 item 没有 link（不计入 max_items），整个 feed 都要读完
+    stream = _feed(60_000, link_every=10_000)
+    tracemalloc.start()
+    try:
+        res = _fetch(stream)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert res.error is None and len(res.items) == 6
+    # 摘掉的话峰值约 0.4MB 且不随 item 数变；只 clear 不摘，6 万个空 item 仍挂在 channel 上（约 5MB）
+    assert peak < 1536 * 1024, peak
@@ -0,0 +1,25 @@
+"""调度线程自身的异常记进 system_logs（带 traceback），不再只 print。"""
+
+import json
+
+
+def test_worker_errors_go_to_system_logs():
+    from app.jobs.scheduler import _log_worker_error
+    from gs_db import get_db, init_gs_db
+
+    init_gs_db()
+    try:
+        raise RuntimeError("tick boom")
+    except RuntimeError as e:
+        _log_worker_error("scheduler_tick_error", e)
+
+    gen = get_db()
+    db = next(gen)
+    try:
+        row = db.execute(
+            "SELECT level, message, meta_json FROM system_logs WHERE event = 'scheduler_tick_error' ORDER BY id DESC LIMIT 1;"
+        ).fetchone()
+    finally:
+        gen.close()
+    assert row[0] == "error" and row[1] == "tick boom"
+    assert "RuntimeError: tick boom" in json.loads(row[2])["traceback"]
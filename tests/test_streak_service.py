@@ -0,0 +1,160 @@
+"""streak_service：window / scan 和旧的全量回走结果一致。
+
+默认只跑内存 SQLite。要连 MySQL / Postgres 测试库：
+  GS_TEST_DB_URLS="mysql+pymysql://u:p@localhost/test,postgresql+psycopg://u:p@localhost/test" python -m pytest tests/test_streak_service.py
+只读写本测试用的 telegram_id；quest_submissions 表不存在时建、跑完删掉。
+"""
+
+import os
+import random
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import create_engine, delete, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from app.models import QuestSubmission
+from app.services import streak_service
+
+TODAY = date(2026, 3, 10)
+BASE_ID = 9_400_000
+
+URLS = ["sqlite://"] + [u.strip() for u in (os.getenv("GS_TEST_DB_URLS") or "").split(",") if u.strip()]
+
+
+def reference_streak(db: Session, telegram_id: int, today: date) -> int:
+    # 旧实现：取出全部参与日期再往回走
+    days = {
+        r[0]
+        for r in db.execute(
+            select(QuestSubmission.submit_date).where(QuestSubmission.telegram_id == telegram_id).group_by(QuestSubmission.submit_date)
+        )
+    }
+    streak = 0
+    cur = today
+    while cur in days:
+        streak += 1
+        cur -= timedelta(days=1)
+    return streak
+
+
+def _days(*offsets: int) -> list[date]:
+    return [TODAY - timedelta(days=o) for o in offsets]
+
+
+CASES = {
+    "none": ([], 0),
+    "only_today": (_days(0), 1),
+    "only_yesterday": (_days(1), 0),
+    "missing_today": (_days(1, 2, 3, 4), 0),
+    "gap": (_days(0, 1, 3, 4, 5), 2),
+    "gap_at_batch_edge": (_days(*range(streak_service.SCAN_BATCH), *range(streak_service.SCAN_BATCH + 1, 100)), streak_service.SCAN_BATCH),
+    "long": (_days(*range(150)), 150),
+    "future_ignored": (_days(-2, -1, 0, 1), 2),
+}
+
+
+@pytest.fixture(scope="module", params=URLS, ids=lambda u: u.split(":", 1)[0])
+def db(request):
+    engine = create_engine(request.param)
+    table = QuestSubmission.__table__
+    created = not inspect(engine).has_table(table.name)
+    table.create(engine, checkfirst=True)
+    ids = delete(QuestSubmission).where(QuestSubmission.telegram_id.between(BASE_ID, BASE_ID + 9_999))
+    with Session(engine) as s:
+        s.execute(ids)
+        rows = []
+        for i, (days, _) in enumerate(CASES.values()):
+            for d in days:
+                # 同一天多条提交只算一天
+                rows += [{"telegram_id": BASE_ID + i, "quest_code": q, "submit_date": d} for q in ("a", "b")]
+        rnd = random.Random(41)
+        for uid in range(BASE_ID + 1000, BASE_ID + 1040):
+            p = rnd.choice((0.3, 0.8, 1.0))
+            rows += [
+                {"telegram_id": uid, "quest_code": "a", "submit_date": d}
+                for d in _days(*range(-3, 200))
+                if rnd.random() < p
+            ]
+        s.execute(insert(QuestSubmission), rows)
+        s.commit()
+        yield s
+        s.execute(ids)
+        s.commit()
+    if created:
+        table.drop(engine)
+    engine.dispose()
+
+
+def _methods(db: Session) -> list[str]:
+    return ["window", "scan"] if streak_service.supports_window(db) else ["scan"]
+
+
+@pytest.mark.parametrize("case", list(CASES))
+def test_known_cases(db, case):
+    expected = CASES[case][1]
+    uid = BASE_ID + list(CASES).index(case)
+    assert reference_streak(db, uid, TODAY) == expected
+    for method in _methods(db):
+        assert streak_service.current_streak(db, uid, TODAY, method=method) == expected, method
+
+
+def test_scan_small_batches(db):
+    uid = BASE_ID + list(CASES).index("gap")
+    for batch in (1, 2, 3):
+        assert streak_service.streak_scan(db, uid, TODAY, batch=batch) == 2
+
+
+def test_random_histories_match_reference(db):
+    checked = 0
+    for uid in range(BASE_ID + 1000, BASE_ID + 1040):
+        for day in (TODAY, TODAY - timedelta(days=1), TODAY - timedelta(days=37), TODAY - timedelta(days=400)):
+            expected = reference_streak(db, uid, day)
+            for method in _methods(db):
+                assert streak_service.current_streak(db, uid, day, method=method) == expected, (uid, day, method)
+            checked += 1
+    assert checked == 160
+
+
+def test_window_used_on_sqlite_by_default():
+    engine = create_engine("sqlite://")
+    with Session(engine) as s:
+        assert streak_service.supports_window(s)
+
+
+def _old_quest_submissions(engine, rows: int = 1) -> None:
+    # 升级前的表：没有连续天数索引，也没有每日唯一约束
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE quest_submissions (id INTEGER PRIMARY KEY, telegram_id BIGINT NOT NULL, "
+            "quest_code VARCHAR(50) NOT NULL, submitted_at DATETIME, submit_date DATE)"
+        )
+        for _ in range(rows):
+            conn.exec_driver_sql(
+                "INSERT INTO quest_submissions (telegram_id, quest_code, submit_date) VALUES (1, 'a', '2026-03-10')"
+            )
+
+
+def test_schema_upgrade_adds_streak_index():
+    from app.services.user_repository import ensure_leafpass_schema
+
+    engine = create_engine("sqlite://")
+    _old_quest_submissions(engine)
+    ensure_leafpass_schema(engine)
+    names = {ix["name"]: ix["unique"] for ix in inspect(engine).get_indexes("quest_submissions")}
+    assert names["idx_quest_submissions_user_date"] == 0
+    assert names["uniq_user_quest_day"] == 1
+    # 再跑一次什么都不补
+    from app.core.database import add_missing_indexes
+
+    assert add_missing_indexes(engine, "quest_submissions") == []
+
+
+def test_schema_upgrade_skips_unique_index_on_duplicates():
+    from app.core.database import add_missing_indexes
+
+    engine = create_engine("sqlite://")
+    _old_quest_submissions(engine, rows=2)
+    with pytest.warns(UserWarning, match="uniq_user_quest_day"):
+        added = add_missing_indexes(engine, "quest_submissions")
+    assert "idx_quest_submissions_user_date" in added and "uniq_user_quest_day" not in added
@@ -0,0 +1,146 @@
+"""统一存储：迁移 / 双写补进行为库的老用户不算当日新增。"""
+
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+LEGACY_ID = 9_500_001
+SIGNUP_ID = 9_500_010
+CREATED = datetime(2025, 5, 1, 8, 30, 0)
+
+
+@pytest.fixture(scope="module")
+def stores():
+    import app.models  # noqa: F401  注册表结构
+    from app.core.database import Base, SessionLocal, engine
+    from gs_db import get_db, init_gs_db
+
+    Base.metadata.create_all(engine)
+    init_gs_db()
+    gen = get_db()
+    conn = next(gen)
+    session = SessionLocal()
+    try:
+        yield session, conn
+    finally:
+        session.close()
+        gen.close()
+
+
+def _new_users_today(conn) -> int:
+    from models import get_today_str
+
+    row = conn.execute("SELECT new_users FROM daily_metrics WHERE date = ?;", (get_today_str(),)).fetchone()
+    return int(row[0]) if row else 0
+
+
+def _created_at(conn, user_id: int):
+    row = conn.execute("SELECT created_at FROM users WHERE id = ?;", (user_id,)).fetchone()
+    return row[0] if row else None
+
+
+def test_migration_adopts_legacy_users(stores):
+    from app.models import PointTransaction, TelegramUser
+    from scripts.migrate_unified_storage import migrate_points, migrate_users
+
+    session, conn = stores
+    session.add(TelegramUser(telegram_id=LEGACY_ID, username="old", created_at=CREATED))
+    session.add(PointTransaction(telegram_id=LEGACY_ID, points=10, source="quest:x"))
+    # 不在 telegram_users 里的流水用户：注册时间取这笔流水的时间
+    session.add(PointTransaction(telegram_id=LEGACY_ID + 1, points=5, source="quest:x", created_at=CREATED))
+    session.commit()
+
+    before = _new_users_today(conn)
+    migrate_users(session, conn, 100, dry_run=False)
+    migrate_points(session, conn, 100, dry_run=False)
+    assert _new_users_today(conn) == before
+    assert _created_at(conn, LEGACY_ID) == "2025-05-01 08:30:00"
+    assert _created_at(conn, LEGACY_ID + 1) == "2025-05-01 08:30:00"
+
+
+def test_dual_mode_counts_only_real_signups(stores, monkeypatch):
+    from app.models import TelegramUser
+    from app.services.user_repository import record_quest_completion
+
+    session, conn = stores
+    monkeypatch.setenv("GS_STORAGE_MODE", "dual")
+    session.add(TelegramUser(telegram_id=LEGACY_ID + 2, username="old", created_at=CREATED))
+    session.commit()
+    quest = SimpleNamespace(code="dual-signup", points=3)
+
+    before = _new_users_today(conn)
+    assert record_quest_completion(session, LEGACY_ID + 2, quest)
+    assert _new_users_today(conn) == before
+    assert _created_at(conn, LEGACY_ID + 2) == "2025-05-01 08:30:00"
+
+    assert record_quest_completion(session, SIGNUP_ID, quest)
+    assert _new_users_today(conn) == before + 1
+
+
+def _ledger(conn, ref_type: str, ref_id: int):
+    return conn.execute(
+        "SELECT user_id, delta FROM points_ledger WHERE ref_type = ? AND ref_id = ?;", (ref_type, ref_id)
+    ).fetchall()
+
+
+@pytest.mark.parametrize("mode", ["dual", "unified"])
+def test_reconcile_replays_missing_behavior_credits(stores, monkeypatch, mode):
+    from datetime import date
+
+    from app.models import PointTransaction, Quest, QuestSubmission
+    from app.services import analytics_service
+    from app.services.user_repository import (
+        REF_QUEST_SUBMISSION,
+        REF_QUEST_TX,
+        credit_quest_points,
+        reconcile_behavior_credits,
+    )
+
+    session, conn = stores
+    monkeypatch.setenv("GS_STORAGE_MODE", mode)
+    uid = LEGACY_ID + (20 if mode == "dual" else 30)
+    code = f"reconcile-{mode}"
+    day = date(2026, 3, 2)
+    # 模拟 SQLAlchemy 侧 commit 成功、行为库 commit 失败留下的缺口
+    session.add(Quest(code=code, title=code, points=7))
+    if mode == "unified":
+        # 切换前的提交按 quest_tx 记过账，不能再按 quest_submission 补一遍
+        old = QuestSubmission(telegram_id=uid, quest_code=code, submitted_at=datetime(2026, 3, 1, 9), submit_date=date(2026, 3, 1))
+        first = QuestSubmission(telegram_id=uid + 1, quest_code=code, submitted_at=datetime(2026, 3, 1, 10), submit_date=date(2026, 3, 1))
+        session.add_all([old, first])
+        session.commit()
+        credit_quest_points(conn, uid + 1, 7, ref_type=REF_QUEST_SUBMISSION, ref_id=first.id, day=first.submit_date)
+    sub = QuestSubmission(telegram_id=uid, quest_code=code, submitted_at=datetime(2026, 3, 2, 9), submit_date=day)
+    session.add(sub)
+    tx = PointTransaction(telegram_id=uid, points=7, source=f"quest:{code}")
+    session.add(tx)
+    session.commit()
+    ref = (REF_QUEST_TX, tx.id) if mode == "dual" else (REF_QUEST_SUBMISSION, sub.id)
+
+    assert _ledger(conn, *ref) == []
+    assert reconcile_behavior_credits(session) >= 1
+    assert [tuple(r) for r in _ledger(conn, *ref)] == [(uid, 7)]
+    assert reconcile_behavior_credits(session) == 0
+    assert analytics_service.user_streak(conn, uid, day) == (1, 1)
+    if mode == "unified":
+        assert _ledger(conn, REF_QUEST_SUBMISSION, old.id) == []
+
+
+def test_rebuild_activity_keeps_quest_days(stores, monkeypatch):
+    from datetime import date
+
+    from app.models import QuestSubmission
+    from app.services import analytics_service
+    from app.services.user_repository import rebuild_behavior_activity
+
+    session, conn = stores
+    monkeypatch.setenv("GS_STORAGE_MODE", "unified")
+    uid = LEGACY_ID + 40
+    session.add(QuestSubmission(telegram_id=uid, quest_code="rebuild", submitted_at=datetime(2026, 3, 9, 9), submit_date=date(2026, 3, 9)))
+    session.commit()
+    conn.execute("INSERT INTO user_task_logs (user_id, task_id, date, created_at) VALUES (?, 1, '2026-03-10', '');", (uid,))
+    conn.commit()
+
+    assert rebuild_behavior_activity(conn) >= 1
+    assert analytics_service.user_streak(conn, uid, date(2026, 3, 10)) == (2, 2)